@@ -0,0 +1,196 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Iterator, Optional
+
+
+DEFAULT_CACHE_DIR = pathlib.Path(os.getenv("CODEPILOT_CACHE_DIR", pathlib.Path.cwd() / ".codepilot_cache"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so trivially different submissions share a cache entry."""
+    return " ".join(prompt.split())
+
+
+class ResponseCache:
+    """Content-addressed cache for structured LLM outputs (stored as JSON strings).
+
+    Two tiers: an in-memory LRU in front of a SQLite table that evicts entries
+    older than `ttl` seconds and keeps its total size under `max_bytes` by
+    dropping the least recently used rows. `get_or_compute` collapses concurrent
+    calls for the same key into a single computation (single-flight).
+    """
+
+    def __init__(self, path: Optional[pathlib.Path] = None, memory_entries: int = 256,
+                 max_bytes: int = 64 * 1024 * 1024, ttl: float = 7 * 24 * 3600):
+        self.path = pathlib.Path(path) if path else DEFAULT_CACHE_DIR / "responses.db"
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._db_ready = False
+
+    @staticmethod
+    def key(kind: str, prompt: str, model: str, version: str) -> str:
+        payload = json.dumps([kind, version, model, normalize_prompt(prompt)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # -------------------------------
+    # Lookup / store
+    # -------------------------------
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                if now - hit[1] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    return hit[0]
+                del self._memory[key]
+
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                value, created = row
+                if now - created > self.ttl:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    return None
+                conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logging.warning(f"Response cache lookup failed, continuing without it: {e}")
+            return None
+        self._remember(key, value, created)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        self._remember(key, value, now)
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value.encode("utf-8")), now, now),
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logging.warning(f"Response cache write failed, keeping the entry in memory only: {e}")
+
+    def get_or_compute(self, key: str, compute: Callable[[], str]) -> str:
+        """Return the cached value, or compute it once even if many callers ask at the same time."""
+        cached = self.get(key)
+        if cached is not None:
+            logging.info(f"Response cache hit for {key[:12]}")
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def aget_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """Async variant of `get_or_compute`; single-flight also spans threads and event loops."""
+        cached = await asyncio.to_thread(self.get, key)
+        if cached is not None:
+            logging.info(f"Response cache hit for {key[:12]}")
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            value = await compute()
+            await asyncio.to_thread(self.put, key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    # -------------------------------
+    # Internals
+    # -------------------------------
+    def _remember(self, key: str, value: str, created: float) -> None:
+        with self._lock:
+            self._memory[key] = (value, created)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._db_ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._db_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_accessed ON responses (accessed)")
+            self._db_ready = True
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if total - freed <= self.max_bytes:
+                break
+            stale.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        with self._lock:
+            for (key,) in stale:
+                self._memory.pop(key, None)
@@ -0,0 +1,151 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+from typing import Any, AsyncIterator, Optional, Sequence
+
+from agent.cache import DEFAULT_CACHE_DIR
+from agent.scheduler import build_task_graph
+from agent.states import CoderState
+
+
+CHECKPOINT_PATH = pathlib.Path(os.getenv("CODEPILOT_CHECKPOINT_DB", DEFAULT_CACHE_DIR / "checkpoints.db"))
+
+
+# -------------------------------
+# Checkpointer
+# -------------------------------
+# ThreadedSqliteSaver is defined on first use: langgraph's checkpoint modules are
+# slow to import, and only compiling or resuming a graph needs them.
+@functools.lru_cache(maxsize=None)
+def _saver_class() -> type:
+    from langchain_core.runnables import RunnableConfig
+    from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    class ThreadedSqliteSaver(SqliteSaver):
+        """SqliteSaver whose async methods run the sync ones in a worker thread.
+
+        AsyncSqliteSaver ties its connection to one event loop, but compiled graphs
+        are pooled across runs and Streamlit starts a new loop for every run, so
+        a single thread-safe sqlite3 connection is shared instead.
+        """
+
+        async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+            return await asyncio.to_thread(self.get_tuple, config)
+
+        async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+                        before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+            items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+            for item in items:
+                yield item
+
+        async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                       new_versions: ChannelVersions) -> RunnableConfig:
+            return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                              task_path: str = "") -> None:
+            await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id: str) -> None:
+            await asyncio.to_thread(self.delete_thread, thread_id)
+
+        def recent_runs(self, limit: int = 20) -> list[str]:
+            """Run ids (thread ids) with checkpoints, most recently updated first."""
+            with self.cursor(transaction=False) as cur:
+                cur.execute(_RECENT_RUNS_SQL, (limit,))
+                return [row[0] for row in cur.fetchall()]
+
+    ThreadedSqliteSaver.__qualname__ = "ThreadedSqliteSaver"
+    return ThreadedSqliteSaver
+
+
+def __getattr__(name: str):
+    if name == "ThreadedSqliteSaver":
+        return _saver_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+_RECENT_RUNS_SQL = (
+    "SELECT thread_id FROM checkpoints WHERE checkpoint_ns = '' "
+    "GROUP BY thread_id ORDER BY MAX(checkpoint_id) DESC LIMIT ?"
+)
+
+_savers: dict[pathlib.Path, Any] = {}
+_savers_lock = threading.Lock()
+
+
+def get_checkpointer(path: pathlib.Path = CHECKPOINT_PATH) -> "ThreadedSqliteSaver":
+    """Process-wide checkpointer for the database at `path`."""
+    path = pathlib.Path(path)
+    with _savers_lock:
+        saver = _savers.get(path)
+        if saver is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            saver = _savers[path] = _saver_class()(sqlite3.connect(path, check_same_thread=False))
+        return saver
+
+
+def recent_runs(limit: int = 20, path: pathlib.Path = CHECKPOINT_PATH) -> list[str]:
+    """Like `get_checkpointer(path).recent_runs()`, without loading langgraph."""
+    path = pathlib.Path(path)
+    with _savers_lock:
+        saver = _savers.get(path)
+    if saver is not None:
+        return saver.recent_runs(limit)
+    if not path.exists():
+        return []
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute(_RECENT_RUNS_SQL, (limit,))]
+    except sqlite3.OperationalError:
+        return []  # no checkpoint was ever written
+    finally:
+        conn.close()
+
+
+def run_config(run_id: str, **config: Any) -> dict:
+    """Graph config that checkpoints (and resumes) under `run_id`."""
+    return {**config, "configurable": {**config.get("configurable", {}), "thread_id": run_id}}
+
+
+# -------------------------------
+# Written-file verification
+# -------------------------------
+def file_digest(path: pathlib.Path) -> Optional[str]:
+    try:
+        return hashlib.sha256(pathlib.Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def verify_written_files(coder_state: CoderState, root: pathlib.Path) -> list[str]:
+    """Un-complete the steps of files that changed or vanished since they were written.
+
+    Returns the affected paths; those steps run again when the coder resumes.
+    """
+    root = pathlib.Path(root)
+    damaged = [
+        path for path, digest in coder_state.file_hashes.items()
+        if file_digest(root / path) != digest
+    ]
+    if not damaged:
+        return []
+    steps = coder_state.task_plan.implementation_steps
+    redo = {
+        i for node in build_task_graph(coder_state.task_plan).values()
+        if node.filepath in damaged for i in node.steps
+    }
+    coder_state.completed_steps = [i for i in coder_state.completed_steps if i not in redo]
+    coder_state.current_step_idx = next(
+        (i for i in range(len(steps)) if i not in coder_state.completed_steps), len(steps)
+    )
+    for path in damaged:
+        del coder_state.file_hashes[path]
+    logging.info(f"Files changed since they were written, redoing their tasks: {', '.join(damaged)}")
+    return damaged
@@ -0,0 +1,218 @@
+import hashlib
+import logging
+import os
+import pathlib
+import threading
+import time
+import zlib
+from typing import Iterator, Optional
+
+from sqlalchemy import event, func, insert, text
+from sqlalchemy.engine import Engine
+from sqlmodel import Field, Session, SQLModel, UniqueConstraint, create_engine, select
+
+from agent.manifest import get_manifest
+
+
+DATABASE_PATH = pathlib.Path(os.getenv("CODEPILOT_DATABASE", pathlib.Path.cwd() / "projects.db"))
+
+# Rows sent per executemany / IN (...) query; stays under SQLite's variable limit.
+_BATCH = 500
+
+
+# -------------------------------
+# Tables
+# -------------------------------
+class Project(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str
+    prompt: str
+    created_at: float = Field(default_factory=time.time, index=True)
+
+
+class ProjectFile(SQLModel, table=True):
+    """Legacy layout: raw content per row. Rows are moved into blobs by `init_db`."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project_id: int = Field(foreign_key="project.id", index=True)
+    path: str
+    content: str
+
+
+class Blob(SQLModel, table=True):
+    """A file body stored once, zlib-compressed, keyed by the SHA-256 of the raw bytes."""
+    hash: str = Field(primary_key=True)
+    size: int
+    data: bytes
+
+
+class ProjectEntry(SQLModel, table=True):
+    """One file of a project: its path and the blob holding its content."""
+    __table_args__ = (UniqueConstraint("project_id", "path"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    project_id: int = Field(foreign_key="project.id", index=True)
+    path: str
+    blob_hash: str = Field(foreign_key="blob.hash", index=True)
+
+
+# -------------------------------
+# Engine
+# -------------------------------
+def _sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cur = dbapi_connection.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA foreign_keys=ON")
+    cur.close()
+
+
+_engines: dict[pathlib.Path, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(path: pathlib.Path = DATABASE_PATH) -> Engine:
+    """Engine for the projects database at `path`, with its schema up to date."""
+    path = pathlib.Path(path).resolve()
+    with _engines_lock:
+        engine = _engines.get(path)
+        if engine is None:
+            engine = create_engine(f"sqlite:///{path}")
+            event.listen(engine, "connect", _sqlite_pragmas)
+            init_db(engine)
+            _engines[path] = engine
+        return engine
+
+
+def init_db(engine: Engine) -> None:
+    """Create missing tables and indexes, and move legacy `projectfile` rows into blobs."""
+    with engine.begin() as conn:
+        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(project)"))}
+        if columns and "created_at" not in columns:
+            conn.execute(text("ALTER TABLE project ADD COLUMN created_at FLOAT NOT NULL DEFAULT 0"))
+    SQLModel.metadata.create_all(engine)
+    # create_all skips tables that already exist, including their indexes.
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+    with Session(engine) as session:
+        legacy = session.exec(select(func.count()).select_from(ProjectFile)).one()
+        if not legacy:
+            return
+        by_project: dict[int, dict[str, bytes]] = {}
+        for row in session.exec(select(ProjectFile)):
+            by_project.setdefault(row.project_id, {})[row.path] = row.content.encode("utf-8")
+        for project_id, files in by_project.items():
+            _insert_files(session, project_id, files)
+        session.execute(ProjectFile.__table__.delete())
+        session.commit()
+    logging.info(f"Moved {legacy} legacy project file row(s) into compressed blobs")
+
+
+# -------------------------------
+# Saving
+# -------------------------------
+def _insert_files(session: Session, project_id: int, files: dict[str, bytes]) -> None:
+    """Insert entries and any blobs not stored yet, without committing."""
+    hashes = {path: hashlib.sha256(data).hexdigest() for path, data in files.items()}
+    wanted = list(dict.fromkeys(hashes.values()))
+    known: set[str] = set()
+    for i in range(0, len(wanted), _BATCH):
+        chunk = wanted[i:i + _BATCH]
+        known.update(session.exec(select(Blob.hash).where(Blob.hash.in_(chunk))))
+
+    # Only content we have never seen is compressed.
+    new_blobs = {}
+    for path, digest in hashes.items():
+        if digest not in known and digest not in new_blobs:
+            data = files[path]
+            new_blobs[digest] = {"hash": digest, "size": len(data), "data": zlib.compress(data, 6)}
+    blob_rows = list(new_blobs.values())
+    entry_rows = [{"project_id": project_id, "path": path, "blob_hash": digest} for path, digest in hashes.items()]
+    for i in range(0, len(blob_rows), _BATCH):
+        session.execute(insert(Blob).prefix_with("OR IGNORE"), blob_rows[i:i + _BATCH])
+    for i in range(0, len(entry_rows), _BATCH):
+        session.execute(insert(ProjectEntry), entry_rows[i:i + _BATCH])
+
+
+def save_project(name: str, prompt: str, root: pathlib.Path, engine: Optional[Engine] = None) -> int:
+    """Store every file of the project folder at `root` in one transaction; returns the project id."""
+    root = pathlib.Path(root)
+    files = {}
+    for rel in get_manifest(root).list():
+        try:
+            files[rel] = (root / rel).read_bytes()
+        except OSError as e:
+            logging.warning(f"Skipping {rel} while saving project: {e}")
+
+    with Session(engine or get_engine()) as session:
+        project = Project(name=name, prompt=prompt)
+        session.add(project)
+        session.flush()
+        _insert_files(session, project.id, files)
+        session.commit()
+        logging.info(f"Saved project {name!r} ({len(files)} files) as #{project.id}")
+        return project.id
+
+
+# -------------------------------
+# Loading
+# -------------------------------
+def list_projects(limit: int = 50, offset: int = 0, engine: Optional[Engine] = None) -> list[Project]:
+    """Most recent projects first; file contents are not loaded."""
+    with Session(engine or get_engine()) as session:
+        stmt = select(Project).order_by(Project.created_at.desc(), Project.id.desc()).offset(offset).limit(limit)
+        return list(session.exec(stmt))
+
+
+def list_project_files(project_id: int, engine: Optional[Engine] = None) -> list[tuple[str, int]]:
+    """(path, size) of each file of a project, without reading the contents."""
+    with Session(engine or get_engine()) as session:
+        stmt = (
+            select(ProjectEntry.path, Blob.size)
+            .join(Blob, Blob.hash == ProjectEntry.blob_hash)
+            .where(ProjectEntry.project_id == project_id)
+            .order_by(ProjectEntry.path)
+        )
+        return [tuple(row) for row in session.exec(stmt)]
+
+
+def iter_project_files(project_id: int, engine: Optional[Engine] = None) -> Iterator[tuple[str, bytes]]:
+    """Yield (path, content) one file at a time, decompressing lazily."""
+    with Session(engine or get_engine()) as session:
+        stmt = (
+            select(ProjectEntry.path, Blob.data)
+            .join(Blob, Blob.hash == ProjectEntry.blob_hash)
+            .where(ProjectEntry.project_id == project_id)
+            .order_by(ProjectEntry.path)
+            .execution_options(yield_per=32)
+        )
+        for path, data in session.exec(stmt):
+            yield path, zlib.decompress(data)
+
+
+def restore_project(project_id: int, dest: pathlib.Path, engine: Optional[Engine] = None) -> int:
+    """Write a stored project's files under `dest`; returns the number of files."""
+    dest = pathlib.Path(dest).resolve()
+    count = 0
+    for rel, data in iter_project_files(project_id, engine):
+        p = (dest / rel).resolve()
+        if not p.is_relative_to(dest):
+            raise ValueError(f"Stored path escapes the destination folder: {rel}")
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_bytes(data)
+        count += 1
+    return count
+
+
+def delete_project(project_id: int, engine: Optional[Engine] = None) -> None:
+    """Remove a project and the blobs no other project uses."""
+    with Session(engine or get_engine()) as session:
+        hashes = list(session.exec(select(ProjectEntry.blob_hash).where(ProjectEntry.project_id == project_id)))
+        session.execute(ProjectEntry.__table__.delete().where(ProjectEntry.project_id == project_id))
+        session.execute(Project.__table__.delete().where(Project.id == project_id))
+        for i in range(0, len(hashes), _BATCH):
+            chunk = hashes[i:i + _BATCH]
+            still_used = select(ProjectEntry.blob_hash).where(ProjectEntry.blob_hash.in_(chunk))
+            session.execute(Blob.__table__.delete().where(Blob.hash.in_(chunk), Blob.hash.not_in(still_used)))
+        session.commit()
@@ -0,0 +1,304 @@
+import contextlib
+import errno
+import fcntl
+import functools
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import platform
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+import venv
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+from agent.cache import DEFAULT_CACHE_DIR
+from agent.executor import CommandResult, notify_command
+
+
+# -------------------------------
+# Dependency install cache
+# -------------------------------
+# Bare `npm install` / `pip install -r requirements.txt` commands are served
+# from installed trees keyed by a hash of the manifest and lockfile:
+#
+#   <cache>/node/<key>/node_modules   cloned into the project
+#   <cache>/python/<key>/venv         site-packages cloned into a fresh project .venv
+#   <cache>/npm-cache, <cache>/wheels package caches used on a miss
+#
+# A project never shares writable files with the cached tree. Its files are
+# reflinks where the filesystem supports them (copy-on-write extents), else
+# read-only hardlinks -- write_file breaks the link before writing, and package
+# managers replace files rather than edit them -- and plain copies only when the
+# cache and the projects are on different filesystems. As with the object
+# store, running as root defeats the read-only bit; a tool that edits a linked
+# file in place then changes the cache.
+#
+# The directory can be pre-seeded (e.g. `python -m agent.depcache <project>...`)
+# and used with CODEPILOT_DEP_OFFLINE=1 where there is no network.
+
+DEP_CACHE_DIR = pathlib.Path(os.getenv("CODEPILOT_DEP_CACHE", DEFAULT_CACHE_DIR / "deps"))
+DEP_CACHE_ENABLED = os.getenv("CODEPILOT_DEP_CACHE_ENABLED", "1") == "1"
+OFFLINE = os.getenv("CODEPILOT_DEP_OFFLINE", "0") == "1"
+# Installs that populate the cache get at least this long, whatever the tool call asked for.
+INSTALL_TIMEOUT_S = float(os.getenv("CODEPILOT_DEP_INSTALL_TIMEOUT", "900"))
+
+_NODE_INSTALL = re.compile(r"\s*(?:npm\s+(?:install|i|ci)|yarn(?:\s+install)?|pnpm\s+(?:install|i))\s*")
+_PIP_INSTALL = re.compile(r"\s*(?:python3?\s+-m\s+)?pip3?\s+install\s+-r\s+requirements\.txt\s*")
+_NODE_LOCKFILES = ("package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml")
+
+Runner = Callable[[str, str, float, Optional[dict]], CommandResult]
+
+
+@dataclass
+class InstallPlan:
+    kind: str  # "node" or "python"
+    key: str
+    cwd: pathlib.Path
+    cmd: str
+
+    @property
+    def entry(self) -> pathlib.Path:
+        return DEP_CACHE_DIR / self.kind / self.key
+
+
+@functools.lru_cache(maxsize=None)
+def _node_version() -> str:
+    try:
+        return subprocess.run(["node", "--version"], capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return "none"
+
+
+def _digest(*parts: bytes) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()[:32]
+
+
+def plan_install(cmd: str, cwd: pathlib.Path) -> Optional[InstallPlan]:
+    """The cache entry for `cmd` if it is a bare dependency install of the project at `cwd`."""
+    if not DEP_CACHE_ENABLED:
+        return None
+    cwd = pathlib.Path(cwd)
+    env = f"{platform.system()}-{platform.machine()}".encode()
+    if _NODE_INSTALL.fullmatch(cmd) and (cwd / "package.json").is_file():
+        manager = cmd.split()[0].encode()
+        lockfiles = [(cwd / name).read_bytes() if (cwd / name).is_file() else b"" for name in _NODE_LOCKFILES]
+        key = _digest(env, _node_version().encode(), manager, (cwd / "package.json").read_bytes(), *lockfiles)
+        return InstallPlan("node", key, cwd, cmd)
+    if _PIP_INSTALL.fullmatch(cmd) and (cwd / "requirements.txt").is_file():
+        version = f"{sys.implementation.name}-{sys.version_info.major}.{sys.version_info.minor}".encode()
+        key = _digest(env, version, (cwd / "requirements.txt").read_bytes())
+        return InstallPlan("python", key, cwd, cmd)
+    return None
+
+
+# -------------------------------
+# Copying
+# -------------------------------
+_FICLONE = 0x40049409  # linux/fs.h
+# What clone and link fail with where the filesystem (or the pair of them) cannot do it.
+_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY}
+
+
+def _clone(src: str, dst: str) -> None:
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+    shutil.copystat(src, dst)
+
+
+def _link_read_only(src: str, dst: str) -> None:
+    mode = os.stat(src).st_mode
+    if mode & 0o222:
+        os.chmod(src, mode & ~0o222)  # entries filled by older versions were writable
+    os.link(src, dst)
+
+
+def copy_tree(src: pathlib.Path, dst: pathlib.Path) -> str:
+    """Recreate `src` at `dst` so neither side sees the other's edits; returns "clone", "link" or "copy"."""
+    methods = [("clone", _clone), ("link", _link_read_only), ("copy", shutil.copy2)]
+
+    def copy_file(s: str, d: str) -> None:
+        while True:
+            try:
+                return methods[0][1](s, d)
+            except OSError as e:
+                if len(methods) == 1 or e.errno not in _UNSUPPORTED:
+                    raise
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(d)
+                methods.pop(0)  # the rest of the tree is on the same filesystems
+
+    shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True, copy_function=copy_file)
+    return methods[0][0]
+
+
+def _remove(target: pathlib.Path) -> None:
+    if target.is_symlink() or target.is_file():
+        target.unlink()
+    elif target.exists():
+        shutil.rmtree(target)
+
+
+def _site_packages(venv_dir: pathlib.Path) -> pathlib.Path:
+    return venv_dir / "lib" / f"python{sys.version_info.major}.{sys.version_info.minor}" / "site-packages"
+
+
+@contextlib.contextmanager
+def _locked(entry: pathlib.Path) -> Iterator[None]:
+    """Serialize installs of one cache entry across threads and processes."""
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    with open(entry.with_name(entry.name + ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _is_complete(entry: pathlib.Path) -> bool:
+    return (entry / "meta.json").is_file()
+
+
+def _mark_complete(plan: InstallPlan, seconds: float) -> None:
+    meta = {"kind": plan.kind, "cmd": plan.cmd, "created": time.time(), "install_s": round(seconds, 2)}
+    (plan.entry / "meta.json").write_text(json.dumps(meta))
+
+
+def package_env() -> Optional[dict]:
+    """Point npm and pip at the cache's package stores, offline if configured."""
+    if not DEP_CACHE_ENABLED:
+        return None
+    env = dict(os.environ)
+    env["npm_config_cache"] = str(DEP_CACHE_DIR / "npm-cache")
+    env["npm_config_prefer_offline"] = "true"
+    env["PIP_CACHE_DIR"] = str(DEP_CACHE_DIR / "pip-cache")
+    wheels = DEP_CACHE_DIR / "wheels"
+    if wheels.is_dir():
+        env["PIP_FIND_LINKS"] = str(wheels)
+    if OFFLINE:
+        env["npm_config_offline"] = "true"
+        env["PIP_NO_INDEX"] = "1"
+    return env
+
+
+def _result(cmd: str, message: str, started: float, returncode: int = 0) -> CommandResult:
+    result = CommandResult(
+        cmd=cmd, returncode=returncode, stdout=message if returncode == 0 else "",
+        stderr="" if returncode == 0 else message, duration_s=round(time.monotonic() - started, 4), cached=True,
+    )
+    notify_command(result)
+    return result
+
+
+# -------------------------------
+# Materializing
+# -------------------------------
+def _restore_node(plan: InstallPlan) -> None:
+    target = plan.cwd / "node_modules"
+    _remove(target)
+    method = copy_tree(plan.entry / "node_modules", target)
+    logging.info(f"Restored node_modules of {plan.cwd.name} from {plan.key} ({method})")
+    for name in _NODE_LOCKFILES:
+        cached = plan.entry / name
+        if cached.is_file() and not (plan.cwd / name).exists():
+            shutil.copy2(cached, plan.cwd / name)
+
+
+def _restore_python(plan: InstallPlan) -> None:
+    """Create the project's own .venv and clone the cached packages and scripts into it.
+
+    A venv embeds its path, so rather than copying the cached one, a fresh one is
+    created in place and the console scripts are re-pointed at its interpreter.
+    """
+    target = plan.cwd / ".venv"
+    cached = plan.entry / "venv"
+    _remove(target)
+    venv.EnvBuilder(with_pip=False, symlinks=os.name != "nt").create(target)
+    method = copy_tree(_site_packages(cached), _site_packages(target))
+    logging.info(f"Restored site-packages of {plan.cwd.name} from {plan.key} ({method})")
+    old_prefix, new_prefix = str(cached).encode(), str(target).encode()
+    for script in (cached / "bin").iterdir():
+        dst = target / "bin" / script.name
+        if dst.exists() or dst.is_symlink() or script.is_symlink() or not script.is_file():
+            continue  # the interpreter and activate scripts of the new venv
+        data = script.read_bytes()
+        if data.startswith(b"#!"):
+            # the interpreter is on the shebang line, or on the exec line pip writes for paths with spaces
+            head = data.split(b"\n", 3)
+            data = b"\n".join([line.replace(old_prefix, new_prefix) for line in head[:3]] + head[3:])
+        dst.write_bytes(data)
+        shutil.copymode(script, dst)
+
+
+def _install_node(plan: InstallPlan, run: Runner, timeout: float) -> CommandResult:
+    result = run(plan.cmd, str(plan.cwd), timeout, package_env())
+    if result.returncode == 0 and (plan.cwd / "node_modules").is_dir():
+        shutil.rmtree(plan.entry, ignore_errors=True)
+        plan.entry.mkdir(parents=True)
+        copy_tree(plan.cwd / "node_modules", plan.entry / "node_modules")
+        for name in _NODE_LOCKFILES:
+            if (plan.cwd / name).is_file():
+                shutil.copy2(plan.cwd / name, plan.entry / name)
+        _mark_complete(plan, result.duration_s)
+    return result
+
+
+def _install_python(plan: InstallPlan, run: Runner, timeout: float) -> CommandResult:
+    shutil.rmtree(plan.entry, ignore_errors=True)
+    plan.entry.mkdir(parents=True)
+    venv_dir = plan.entry / "venv"
+    python, requirements = venv_dir / "bin" / "python", plan.cwd / "requirements.txt"
+    result = run(
+        f"{shlex.quote(sys.executable)} -m venv {shlex.quote(str(venv_dir))} && "
+        f"{shlex.quote(str(python))} -m pip install -r {shlex.quote(str(requirements))}",
+        str(plan.cwd), timeout, package_env(),
+    )
+    if result.returncode == 0:
+        _mark_complete(plan, result.duration_s)
+        _restore_python(plan)
+        result.stdout += f"\nInstalled into {plan.cwd / '.venv'}; run the project with .venv/bin/python."
+    else:
+        shutil.rmtree(plan.entry, ignore_errors=True)
+    return result
+
+
+def run_with_cache(cmd: str, cwd: str, timeout: float, run: Runner) -> CommandResult:
+    """Run `cmd` through `run`, serving dependency installs from the cache when possible."""
+    plan = plan_install(cmd, pathlib.Path(cwd))
+    if plan is None:
+        return run(cmd, cwd, timeout, package_env())
+
+    started = time.monotonic()
+    restore = _restore_node if plan.kind == "node" else _restore_python
+    with _locked(plan.entry):
+        if _is_complete(plan.entry):
+            restore(plan)
+            logging.info(f"Dependency cache hit for {plan.kind} {plan.key}")
+            return _result(cmd, f"Restored {plan.kind} dependencies from the local cache ({plan.key}).", started)
+        if OFFLINE and plan.kind == "python" and not (DEP_CACHE_DIR / "wheels").is_dir():
+            return _result(cmd, f"Offline and {plan.kind} dependencies {plan.key} are not cached.", started, 1)
+        logging.info(f"Dependency cache miss for {plan.kind} {plan.key}, installing")
+        install = _install_node if plan.kind == "node" else _install_python
+        return install(plan, run, max(timeout, INSTALL_TIMEOUT_S))
+
+
+if __name__ == "__main__":
+    # Pre-seed the cache: python -m agent.depcache <project_dir> [...]
+    from agent.executor import run_command
+
+    logging.basicConfig(level=logging.INFO)
+    for project in sys.argv[1:]:
+        for command in ("npm install", "pip install -r requirements.txt"):
+            if plan_install(command, pathlib.Path(project)):
+                outcome = run_with_cache(command, project, 1800, run_command)
+                print(f"{project}: {command} -> {outcome.returncode}")
@@ -0,0 +1,198 @@
+import asyncio
+import contextvars
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+# Commands run at the same time across all runs; more are queued.
+MAX_CONCURRENT_COMMANDS = int(os.getenv("CODEPILOT_CMD_CONCURRENCY", "4"))
+# Bytes of stdout/stderr kept from the start and from the end of each stream.
+OUTPUT_HEAD_BYTES = int(os.getenv("CODEPILOT_CMD_HEAD_BYTES", str(16 * 1024)))
+OUTPUT_TAIL_BYTES = int(os.getenv("CODEPILOT_CMD_TAIL_BYTES", str(16 * 1024)))
+# Seconds between SIGTERM and SIGKILL when a command times out.
+KILL_GRACE_S = 2.0
+
+_POSIX = os.name == "posix"
+
+
+@dataclass
+class CommandResult:
+    cmd: str
+    returncode: int
+    stdout: str
+    stderr: str
+    duration_s: float
+    timed_out: bool = False
+    truncated_bytes: int = 0
+    cpu_user_s: Optional[float] = None
+    cpu_system_s: Optional[float] = None
+    max_rss_kb: Optional[int] = None
+    cached: bool = False  # served from the dependency cache without running
+
+
+# -------------------------------
+# Output capture
+# -------------------------------
+class BoundedOutput:
+    """Keeps the first `head` and last `tail` bytes of a stream, dropping the middle."""
+
+    def __init__(self, head: int = OUTPUT_HEAD_BYTES, tail: int = OUTPUT_TAIL_BYTES):
+        self.head_limit = head
+        self.tail_limit = tail
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+
+    def write(self, chunk: bytes) -> None:
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if not chunk:
+            return
+        self.tail += chunk
+        overflow = len(self.tail) - self.tail_limit
+        if overflow > 0:
+            del self.tail[:overflow]
+            self.dropped += overflow
+
+    def text(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail.decode("utf-8", errors="replace")
+        if self.dropped:
+            return f"{head}\n... [{self.dropped} bytes omitted] ...\n{tail}"
+        return head + tail
+
+
+def _pump(pipe, out: BoundedOutput) -> None:
+    with pipe:
+        for chunk in iter(lambda: pipe.read1(64 * 1024), b""):
+            out.write(chunk)
+
+
+# -------------------------------
+# Execution
+# -------------------------------
+def _kill_group(proc: subprocess.Popen, sig: int) -> None:
+    try:
+        if _POSIX:
+            os.killpg(proc.pid, sig)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _wait(proc: subprocess.Popen, timeout: float):
+    """Wait for `proc`, killing its whole process group on timeout. Returns (timed_out, rusage)."""
+    if not _POSIX:
+        try:
+            proc.wait(timeout)
+            return False, None
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            return True, None
+
+    done = threading.Event()
+    status: dict = {}
+
+    def reap() -> None:
+        # wait4 reaps the child and reports its (and its waited-for children's) resource usage
+        _, code, rusage = os.wait4(proc.pid, 0)
+        status["code"], status["rusage"] = code, rusage
+        done.set()
+
+    threading.Thread(target=reap, daemon=True).start()
+    timed_out = not done.wait(timeout)
+    if timed_out:
+        _kill_group(proc, signal.SIGTERM)
+        if not done.wait(KILL_GRACE_S):
+            _kill_group(proc, signal.SIGKILL)
+            done.wait()
+    proc.returncode = os.waitstatus_to_exitcode(status["code"])
+    return timed_out, status["rusage"]
+
+
+def run_command(cmd: str, cwd: str, timeout: float = 30, env: Optional[dict] = None) -> CommandResult:
+    """Run a shell command in its own process group with bounded output capture."""
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        cmd, shell=True, cwd=cwd, env=env,
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        start_new_session=_POSIX,
+    )
+    stdout, stderr = BoundedOutput(), BoundedOutput()
+    readers = [
+        threading.Thread(target=_pump, args=(proc.stdout, stdout), daemon=True),
+        threading.Thread(target=_pump, args=(proc.stderr, stderr), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+    try:
+        timed_out, rusage = _wait(proc, timeout)
+    finally:
+        # background jobs the command left behind would keep the pipes open
+        _kill_group(proc, signal.SIGKILL)
+    for reader in readers:
+        reader.join(KILL_GRACE_S)
+
+    result = CommandResult(
+        cmd=cmd,
+        returncode=proc.returncode,
+        stdout=stdout.text(),
+        stderr=stderr.text() + (f"\n[timed out after {timeout}s]" if timed_out else ""),
+        duration_s=round(time.monotonic() - started, 4),
+        timed_out=timed_out,
+        truncated_bytes=stdout.dropped + stderr.dropped,
+    )
+    if rusage is not None:
+        result.cpu_user_s = round(rusage.ru_utime, 4)
+        result.cpu_system_s = round(rusage.ru_stime, 4)
+        result.max_rss_kb = rusage.ru_maxrss  # kilobytes on Linux
+    notify_command(result)
+    return result
+
+
+# The pool's size is the concurrency limit; it is separate from asyncio's
+# default executor so long builds do not starve other to_thread() calls.
+_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_COMMANDS, thread_name_prefix="codepilot-cmd")
+
+
+def submit_command(cmd: str, cwd: str, timeout: float = 30, env: Optional[dict] = None) -> CommandResult:
+    """Run a command on the shared pool, blocking the calling thread until it finishes."""
+    return _pool.submit(contextvars.copy_context().run, run_command, cmd, cwd, timeout, env).result()
+
+
+async def arun_command(cmd: str, cwd: str, timeout: float = 30, env: Optional[dict] = None) -> CommandResult:
+    """Run a command on the shared pool without blocking the event loop."""
+    future = _pool.submit(contextvars.copy_context().run, run_command, cmd, cwd, timeout, env)
+    return await asyncio.wrap_future(future)
+
+
+# -------------------------------
+# Command listeners
+# -------------------------------
+# Called with each CommandResult, e.g. to record CPU and memory use in metrics.
+CommandListener = Callable[[CommandResult], None]
+_command_listeners: list[CommandListener] = []
+
+
+def add_command_listener(listener: CommandListener) -> None:
+    if listener not in _command_listeners:
+        _command_listeners.append(listener)
+
+
+def notify_command(result: CommandResult) -> None:
+    for listener in _command_listeners:
+        try:
+            listener(result)
+        except Exception:
+            logging.exception(f"Command listener {listener!r} failed")
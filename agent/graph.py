@@ -106,52 +106,84 @@
 
 
 
+import asyncio
+import contextlib
+import functools
+import json
 import logging
+import os
 import pathlib
-import subprocess
 import datetime
 import uuid
-from typing import Tuple
 
-from langchain_groq.chat_models import ChatGroq
-from langchain.agents import create_agent
+from typing import Optional
 
-from agent.tools import write_file, read_file, get_current_directory, list_files, safe_path_for_project
-
-from langgraph.constants import END
-from langgraph.graph import StateGraph
-from agent import tools
+from agent import retention, tools
 from agent.prompts import *
 from agent.states import *
+from agent.scheduler import IncrementalTaskGraph, TaskNode, build_task_graph, dependency_files, ready_nodes
+from agent.streaming import replay, stream_structured
+from agent.symbols import pack_context
+from agent.pool import ResourcePool, api_key_fingerprint
+from agent.cache import ResponseCache
+from agent.objects import DEDUP_ENABLED, get_object_store, store_for
+from agent.manifest import get_manifest
+from agent.validation import MAX_VALIDATION_ROUNDS, VALIDATION_ENABLED, validate_files
 
-
-# -------------------------------
-# Setup logging
-# -------------------------------
-logging.basicConfig(level=logging.INFO)
+# langchain, langgraph, the Groq client, httpx and numpy are imported where they
+# are first needed (building an LLM or compiling the graph), so importing this
+# module stays cheap for the UI and CLI.
 
 
 # -------------------------------
 # Project folder management
 # -------------------------------
-BASE_PROJECTS_DIR = pathlib.Path.cwd() / "generated_projects"
-BASE_PROJECTS_DIR.mkdir(parents=True, exist_ok=True)
-PROJECT_ROOT: pathlib.Path = None  # will be set each run
+BASE_PROJECTS_DIR = pathlib.Path.cwd() / "generated_projects"  # created by init_project_root
 
 
 def init_project_root(app_name: str = "project") -> str:
-    """Create a unique folder for each generated project."""
-    global PROJECT_ROOT
+    """Create a unique folder for each generated project.
 
+    The folder also becomes the project root of the caller's context; pass it as
+    `project_root` in the graph input so every node and tool of the run uses it.
+    """
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     safe_name = "".join(c if c.isalnum() else "_" for c in app_name)[:30] or "project"
-    PROJECT_ROOT = BASE_PROJECTS_DIR / f"{safe_name}_{timestamp}_{uuid.uuid4().hex[:6]}"
-    PROJECT_ROOT.mkdir(parents=True, exist_ok=True)
-    
-    tools.set_project_root(PROJECT_ROOT)
+    project_root = BASE_PROJECTS_DIR / f"{safe_name}_{timestamp}_{uuid.uuid4().hex[:6]}"
+    project_root.mkdir(parents=True, exist_ok=True)
+    if DEDUP_ENABLED:
+        # files written into the folder become hardlinks into the shared blob store
+        get_object_store(BASE_PROJECTS_DIR)
+
+    tools.set_project_root(project_root)
+    retention.start_sweeper(BASE_PROJECTS_DIR)
+    retention.touch(project_root)
+
+    logging.info(f"Initialized new project folder at {project_root}")
+    return str(project_root)
+
+
+def _in_project(node):
+    """Run an async graph node with the tools bound to the run's `project_root`,
+    which is kept from eviction by the retention sweeper meanwhile.
+
+    When a metrics recorder is active, the node's wall time is recorded too.
+    """
+    scope = node.__name__.removesuffix("_agent")
+
+    @functools.wraps(node)
+    async def wrapper(state: dict) -> dict:
+        from agent import metrics
 
-    logging.info(f"Initialized new project folder at {PROJECT_ROOT}")
-    return str(PROJECT_ROOT)
+        root = state.get("project_root")
+        recorder = metrics.current_recorder()
+        with tools.project_context(root) if root else contextlib.nullcontext(), \
+                retention.lease(root) if root else contextlib.nullcontext():
+            if recorder is None:
+                return await node(state)
+            async with recorder.span(scope):
+                return await node(state)
+    return wrapper
 
 
 # def safe_path_for_project(path: str) -> pathlib.Path:
@@ -210,81 +242,440 @@ def init_project_root(app_name: str = "project") -> str:
 #     return res.returncode, res.stdout, res.stderr
 
 
+# Token budget for dependency signatures included in each coder prompt.
+CONTEXT_BUDGET_TOKENS = int(os.getenv("CODEPILOT_CONTEXT_BUDGET", "1500"))
+
+# Maximum number of files the coder implements concurrently.
+DEFAULT_MAX_WORKERS = int(os.getenv("CODEPILOT_MAX_WORKERS", "4"))
+# Overlap planner, architect and coder instead of running them one after another.
+DEFAULT_PIPELINED = os.getenv("CODEPILOT_PIPELINED", "0") == "1"
+DEFAULT_MODEL = "openai/gpt-oss-120b"
+
+# Warm clients and compiled graphs are shared across runs, keyed by API key and model.
+POOL_IDLE_TTL = float(os.getenv("CODEPILOT_POOL_IDLE_TTL", "900"))
+_llm_pool = ResourcePool("llm", idle_ttl=POOL_IDLE_TTL)
+_agent_pool = ResourcePool("agent", idle_ttl=POOL_IDLE_TTL)
+
+# Planner/architect outputs keyed on prompt, model and PROMPT_VERSION.
+response_cache = ResponseCache()
+
+
 # -------------------------------
 # LLM Setup
 # -------------------------------
-def get_llm(api_key: str):
-    """Return ChatGroq LLM instance using provided API key."""
-    return ChatGroq(model="openai/gpt-oss-120b", groq_api_key=api_key)
+def get_llm(api_key: str, model: str = DEFAULT_MODEL):
+    """Return a pooled, rate-limited ChatGroq for the API key, reusing its HTTP connections."""
+    fingerprint = api_key_fingerprint(api_key)
+
+    def create():
+        import httpx
+        from agent.ratelimit import LoopLocalTransport, RateLimitedChatGroq, get_limiter
+
+        limits = httpx.Limits(max_connections=64, max_keepalive_connections=16, keepalive_expiry=120)
+        limiter = get_limiter(fingerprint)
+        return RateLimitedChatGroq(
+            model=model,
+            groq_api_key=api_key,
+            # the limiter learns the key's budgets from the x-ratelimit-* headers of every response
+            http_client=httpx.Client(limits=limits, event_hooks={"response": [limiter.on_response]}),
+            # each run has its own event loop; async connections are pooled per loop
+            http_async_client=httpx.AsyncClient(
+                transport=LoopLocalTransport(limits=limits), event_hooks={"response": [limiter.aon_response]}
+            ),
+            # retries happen in the limiter, which knows about retry-after and the other runs
+            max_retries=0,
+            limiter=limiter,
+        )
+    return _llm_pool.get((fingerprint, model), create)
 
 
 # -------------------------------
 # Build LangGraph Agent
 # -------------------------------
-def build_agent(api_key: str):
-    """Build and return the LangGraph workflow."""
-    llm = get_llm(api_key)
-    shared_tools = [read_file, write_file, list_files, get_current_directory]
+def build_agent(api_key: str, max_workers: int = DEFAULT_MAX_WORKERS, model: str = DEFAULT_MODEL,
+                pipelined: bool = DEFAULT_PIPELINED):
+    """Return the compiled LangGraph workflow, reusing a pooled one when available.
+
+    The workflow checkpoints after every node, so it must be run with a
+    `run_config(run_id)` and an interrupted run can be continued with `prepare_resume`.
+    """
+    from agent.checkpoint import get_checkpointer
+
+    key = (api_key_fingerprint(api_key), model, max_workers, pipelined)
+    return _agent_pool.get(
+        key, lambda: compile_agent(get_llm(api_key, model), max_workers, model,
+                                   checkpointer=get_checkpointer(), pipelined=pipelined)
+    )
+
 
-    def planner_agent(state: dict) -> dict:
+def compile_agent(llm, max_workers: int = DEFAULT_MAX_WORKERS, model: str = DEFAULT_MODEL, checkpointer=None,
+                  pipelined: bool = False):
+    """Build and compile the LangGraph workflow around any LangChain chat model.
+
+    `model` only namespaces the response cache; tests and benchmarks pass a
+    stand-in `llm` here instead of going through the pooled ChatGroq.
+    With `pipelined`, a single "pipeline" node replaces planner and architect
+    and starts coding files while the plan is still being generated.
+    """
+    from langchain.agents import create_agent
+    from langgraph.constants import END
+    from langgraph.graph import StateGraph
+
+    from agent import metrics
+    from agent.checkpoint import file_digest
+    from agent.retrieval import REFERENCE_MAX_CHARS, RETRIEVAL_ENABLED, get_index
+
+    read_file = tools.read_file
+    shared_tools = [read_file, tools.write_file, tools.edit_file, tools.apply_patch, tools.list_files,
+                    tools.get_current_directory, tools.run_cmd]
+    # The coder's inner ReAct loops are not checkpointed; the graph resumes per task.
+    react_agent = create_agent(llm, shared_tools, checkpointer=False)
+
+    async def structured(schema, kind: str, prompt: str, use_cache: bool):
+        """Invoke the LLM for `schema`, going through the response cache when enabled."""
+        async def compute() -> str:
+            resp = await llm.with_structured_output(schema).ainvoke(prompt)
+            if resp is None:
+                raise ValueError(f"{kind.capitalize()} did not return a valid response.")
+            return resp.model_dump_json()
+
+        if not use_cache:
+            return schema.model_validate_json(await compute())
+        key = ResponseCache.key(kind, prompt, model, PROMPT_VERSION)
+        return schema.model_validate_json(await response_cache.aget_or_compute(key, compute))
+
+    async def reused_plan(state: dict) -> Optional[Plan]:
+        """The plan of a near-duplicate past prompt, when reuse is allowed."""
+        if not (RETRIEVAL_ENABLED and state.get("use_cache", True)):
+            return None
+        return await asyncio.to_thread(get_index().similar_plan, state["user_prompt"])
+
+    async def planner_agent(state: dict) -> dict:
         user_prompt = state["user_prompt"]
-        resp = llm.with_structured_output(Plan).invoke(planner_prompt(user_prompt))
+        resp = await reused_plan(state)
         if resp is None:
-            raise ValueError("Planner did not return a valid response.")
+            resp = await structured(Plan, "planner", planner_prompt(user_prompt), state.get("use_cache", True))
         return {"plan": resp}
 
-    def architect_agent(state: dict) -> dict:
+    async def architect_agent(state: dict) -> dict:
         plan: Plan = state["plan"]
-        resp = llm.with_structured_output(TaskPlan).invoke(architect_prompt(plan=plan.model_dump_json()))
-        if resp is None:
-            raise ValueError("Architect did not return a valid response.")
+        resp = await structured(TaskPlan, "architect", architect_prompt(plan=plan.model_dump_json()), state.get("use_cache", True))
         resp.plan = plan
         return {"task_plan": resp}
 
-    def coder_agent(state: dict) -> dict:
-        coder_state: CoderState = state.get("coder_state") or CoderState(task_plan=state["task_plan"], current_step_idx=0)
-        steps = coder_state.task_plan.implementation_steps
-
-        if coder_state.current_step_idx >= len(steps):
-            return {"coder_state": coder_state, "status": "DONE"}
-
-        current_task = steps[coder_state.current_step_idx]
-        existing_content = read_file.run(current_task.filepath)
+    async def implement(batch: list[ImplementationTask], filepath: str, dep_files: list[str], prompt: str) -> None:
+        """Implement one or more consecutive tasks on `filepath` with a single coder call."""
+        current_task = batch[0]
+        existing_content = await asyncio.to_thread(read_file.run, current_task.filepath)
+        reference = None
+        if RETRIEVAL_ENABLED and not existing_content:
+            reference = await asyncio.to_thread(
+                get_index().reference_file, prompt, filepath, " ".join(t.task_description for t in batch),
+                tools.get_project_root().name,
+            )
         system_prompt = coder_system_prompt()
+        context = await asyncio.to_thread(
+            pack_context, tools.get_project_root(), filepath, dep_files, CONTEXT_BUDGET_TOKENS
+        )
 
+        reference_hint = ""
+        if reference is not None:
+            reference_hint = (
+                "A similar file from a past project, as a starting point (adapt names and features to this task):\n"
+                f"--- {reference.path} ---\n{reference.text[:REFERENCE_MAX_CHARS]}\n--- end ---\n"
+            )
+        if existing_content:
+            save_hint = "The file already exists: change it with edit_file(path, edits) rather than rewriting it."
+        else:
+            save_hint = "Use write_file(path, content) to save your changes."
+        if len(batch) == 1:
+            task_text = f"Task: {current_task.task_description}\n"
+        else:
+            task_text = "Tasks (implement all of them, in this order, in one pass over the file):\n" + "".join(
+                f"{n}. {task.task_description}\n" for n, task in enumerate(batch, 1)
+            )
         user_prompt = (
-            f"Task: {current_task.task_description}\n"
+            f"{task_text}"
             f"File: {current_task.filepath}\n"
             f"Existing content:\n{existing_content}\n"
-            "Use write_file(path, content) to save your changes."
+            f"Symbols defined by the files this task depends on:\n{context or '(none yet)'}\n"
+            f"{reference_hint}"
+            f"{save_hint}"
         )
 
-        react_agent = create_agent(llm, shared_tools)
-        react_agent.invoke({
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ]
-        })
+        scope = f"coder:{filepath}"
+        recorder = metrics.current_recorder()
+        with metrics.task_scope(scope):
+            async with recorder.span(scope) if recorder else contextlib.nullcontext():
+                await react_agent.ainvoke(
+                    {
+                        "messages": [
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": user_prompt},
+                        ]
+                    },
+                    {"metadata": {metrics.SCOPE_METADATA_KEY: scope}},
+                )
+
+    async def remember_project(state: dict, coder_state: CoderState) -> None:
+        """Add a finished run's prompt, plan and files to the similarity index."""
+        root = tools.get_project_root()
+        plan = state.get("plan") or getattr(coder_state.task_plan, "plan", None)
+        try:
+            await asyncio.to_thread(
+                get_index().add_project, root.name, root, state["user_prompt"], plan if isinstance(plan, Plan) else None
+            )
+        except Exception as e:
+            logging.warning(f"Could not index {root.name} for reuse: {e}")
+
+    async def finish_project(state: dict, coder_state: CoderState) -> None:
+        """Index a finished project and link its files into the shared object store."""
+        if RETRIEVAL_ENABLED:
+            await remember_project(state, coder_state)
+        root = tools.get_project_root().resolve()
+        store = store_for(root)
+        if store is not None:
+            files = await asyncio.to_thread(get_manifest(root).list)
+            linked = await asyncio.to_thread(store.link_tree, root, files)
+            logging.info(f"Linked {linked} file(s) of {root.name} into the object store")
+
+    async def coder_agent(state: dict) -> dict:
+        """Implement every task whose dependencies are done, in parallel across files."""
+        coder_state: CoderState = state.get("coder_state") or CoderState(task_plan=state["task_plan"], current_step_idx=0)
+        steps = coder_state.task_plan.implementation_steps
+        completed = set(coder_state.completed_steps)
 
-        coder_state.current_step_idx += 1
+        if len(completed) >= len(steps):
+            if not VALIDATION_ENABLED:
+                await finish_project(state, coder_state)
+            return {"coder_state": coder_state, "status": "DONE"}
+
+        nodes = build_task_graph(coder_state.task_plan)
+        ready = ready_nodes(nodes, completed)
+        logging.info(f"Coding {sum(len(n.steps) for n in ready)} task(s) in {len(ready)} call(s): {', '.join(n.filepath for n in ready)}")
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+        root = tools.get_project_root()
+
+        async def run(node: TaskNode) -> None:
+            async with semaphore:
+                # steps finished before a resume are not redone with the rest of their node
+                batch = [steps[i] for i in node.steps if i not in completed]
+                await implement(batch, node.filepath, dependency_files(nodes, node), state["user_prompt"])
+            coder_state.file_hashes[node.filepath] = await asyncio.to_thread(file_digest, root / node.filepath)
+            completed.update(node.steps)
+
+        results = await asyncio.gather(*(run(node) for node in ready), return_exceptions=True)
+
+        coder_state.completed_steps = sorted(completed)
+        coder_state.current_step_idx = next((i for i in range(len(steps)) if i not in completed), len(steps))
+        failed = [(node, r) for node, r in zip(ready, results) if isinstance(r, BaseException)]
+        if failed:
+            # Keep the finished tasks in the checkpoint and stop; the run can be resumed from here.
+            for node, error in failed:
+                logging.error(f"Task for {node.filepath} failed: {error!r}")
+            error = "; ".join(f"{node.filepath}: {type(e).__name__}: {e}" for node, e in failed)
+            return {"coder_state": coder_state, "status": "FAILED", "error": error}
         return {"coder_state": coder_state}
 
+    async def validate_agent(state: dict) -> dict:
+        """Statically check the written files and queue a fix task for each failing one."""
+        coder_state: CoderState = state["coder_state"]
+        root = tools.get_project_root()
+        files = await asyncio.to_thread(get_manifest(root).list)
+        issues = await validate_files(str(root), files)
+        rounds = state.get("validation_rounds", 0)
+
+        if issues and rounds < MAX_VALIDATION_ROUNDS:
+            logging.info(f"Validation round {rounds + 1}: re-coding {', '.join(issues)}")
+            for filepath, problems in issues.items():
+                coder_state.task_plan.implementation_steps.append(ImplementationTask(
+                    filepath=filepath,
+                    task_description=(
+                        "Fix these problems found by static validation, changing only what is needed:\n"
+                        + "\n".join(f"- {problem}" for problem in problems)
+                    ),
+                ))
+            coder_state.current_step_idx = next(
+                i for i in range(len(coder_state.task_plan.implementation_steps)) if i not in set(coder_state.completed_steps)
+            )
+            return {"coder_state": coder_state, "status": "FIXING", "validation_rounds": rounds + 1, "validation": issues}
+
+        for filepath, problems in issues.items():
+            logging.warning(f"{filepath} still fails validation: {'; '.join(problems)}")
+        await finish_project(state, coder_state)
+        return {"status": "DONE", "validation": issues}
+
+    async def streamed(schema, kind: str, prompt: str, field: str, on_item, use_cache: bool):
+        """Like `structured`, but hands each element of `field` to `on_item` as soon as it is generated."""
+        key = ResponseCache.key(kind, prompt, model, PROMPT_VERSION)
+        cached = await asyncio.to_thread(response_cache.get, key) if use_cache else None
+        if cached is not None:
+            resp = schema.model_validate_json(cached)
+            replay(resp, field, on_item)
+            return resp
+        resp = await stream_structured(llm, schema, prompt, field, on_item)
+        if use_cache:
+            await asyncio.to_thread(response_cache.put, key, resp.model_dump_json())
+        return resp
+
+    async def pipeline_agent(state: dict) -> dict:
+        """Planner, architect and coder overlapped: each file of the streamed plan gets its
+        own architect call, and each task is coded as soon as its dependencies are done."""
+        use_cache = state.get("use_cache", True)
+        dag = IncrementalTaskGraph()
+        file_hashes: dict[str, str] = {}
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+        progress = asyncio.Event()
+        architects: list[asyncio.Task] = []
+        coders: dict[asyncio.Task, list[int]] = {}
+        failures: list[tuple[str, BaseException]] = []
+        root = tools.get_project_root()
+
+        async def architect_file(filepath: str, plan_so_far: str) -> None:
+            def on_task(task: ImplementationTask, _) -> None:
+                task.filepath = filepath
+                dag.add_task(task)
+                progress.set()
+
+            try:
+                await streamed(TaskPlan, "architect-file", architect_file_prompt(plan_so_far, filepath),
+                               "implementation_steps", on_task, use_cache)
+            finally:
+                dag.close_file(filepath)
+                progress.set()
+
+        def on_file(file: File, partial: dict) -> None:
+            known = len(dag.files)
+            filepath = dag.add_file(file.path)
+            if len(dag.files) == known:
+                return  # listed twice
+            plan_so_far = json.dumps({**partial, "files": partial.get("files", [])[:len(dag.files)]})
+            architects.append(asyncio.create_task(architect_file(filepath, plan_so_far)))
+
+        async def code(batch: list[int]) -> None:
+            filepath = dag.steps[batch[0]].filepath
+            async with semaphore:
+                await implement([dag.steps[i] for i in batch], filepath, dag.dependency_files(batch[0]), state["user_prompt"])
+            file_hashes[filepath] = await asyncio.to_thread(file_digest, root / filepath)
+            for idx in batch:
+                dag.complete(idx)
+
+        async def plan_files() -> Plan:
+            reused = await reused_plan(state)
+            if reused is not None:
+                replay(reused, "files", on_file)
+                return reused
+            return await streamed(Plan, "planner", planner_prompt(state["user_prompt"]), "files", on_file, use_cache)
+
+        planner = asyncio.create_task(plan_files())
+        planner.add_done_callback(lambda _: progress.set())
+        try:
+            while True:
+                for task in [t for t in coders if t.done()]:
+                    if task.exception() is not None:
+                        failures.append((dag.steps[coders[task][0]].filepath, task.exception()))
+                    del coders[task]
+                producers = [planner, *architects]
+                if not failures and not any(t.done() and t.exception() for t in producers):
+                    for batch in dag.ready():
+                        dag.started.update(batch)
+                        task = asyncio.create_task(code(batch))
+                        task.add_done_callback(lambda _: progress.set())
+                        coders[task] = batch
+                if not coders and all(t.done() for t in producers):
+                    break
+                await progress.wait()
+                progress.clear()
+        finally:
+            for task in [planner, *architects, *coders]:
+                task.cancel()
+
+        plan = planner.result()
+        for a in architects:
+            a.result()  # the task plan is incomplete without every file's tasks
+        task_plan, order = dag.ordered()
+        task_plan.plan = plan
+        position = {old: new for new, old in enumerate(order)}
+        completed = {position[i] for i in dag.completed}
+        coder_state = CoderState(
+            task_plan=task_plan, completed_steps=sorted(completed), file_hashes=file_hashes,
+            current_step_idx=next((i for i in range(len(order)) if i not in completed), len(order)),
+        )
+        update = {"plan": plan, "task_plan": task_plan, "coder_state": coder_state}
+        if failures:
+            for filepath, error in failures:
+                logging.error(f"Task for {filepath} failed: {error!r}")
+            error = "; ".join(f"{filepath}: {type(e).__name__}: {e}" for filepath, e in failures)
+            return {**update, "status": "FAILED", "error": error}
+        return update
+
     # -------------------------------
     # Build LangGraph flow
     # -------------------------------
-    graph = StateGraph(dict)
-    graph.add_node("planner", planner_agent)
-    graph.add_node("architect", architect_agent)
-    graph.add_node("coder", coder_agent)
-
-    graph.add_edge("planner", "architect")
-    graph.add_edge("architect", "coder")
-    graph.add_conditional_edges(
-        "coder",
-        lambda s: "END" if s.get("status") == "DONE" else "coder",
-        {"END": END, "coder": "coder"}
-    )
-    graph.set_entry_point("planner")
+    graph = StateGraph(GraphState)
+    graph.add_node("coder", _in_project(coder_agent))
+    if pipelined:
+        graph.add_node("pipeline", _in_project(pipeline_agent))
+        graph.add_conditional_edges(
+            "pipeline",
+            lambda s: "END" if s.get("status") == "FAILED" else "coder",
+            {"END": END, "coder": "coder"}
+        )
+        graph.set_entry_point("pipeline")
+    else:
+        graph.add_node("planner", _in_project(planner_agent))
+        graph.add_node("architect", _in_project(architect_agent))
+        graph.add_edge("planner", "architect")
+        graph.add_edge("architect", "coder")
+        graph.set_entry_point("planner")
+    if VALIDATION_ENABLED:
+        graph.add_node("validate", _in_project(validate_agent))
+        graph.add_conditional_edges(
+            "validate",
+            lambda s: "coder" if s.get("status") == "FIXING" else "END",
+            {"END": END, "coder": "coder"}
+        )
+        graph.add_conditional_edges(
+            "coder",
+            lambda s: {"DONE": "validate", "FAILED": "END"}.get(s.get("status"), "coder"),
+            {"END": END, "coder": "coder", "validate": "validate"}
+        )
+    else:
+        graph.add_conditional_edges(
+            "coder",
+            lambda s: "END" if s.get("status") in ("DONE", "FAILED") else "coder",
+            {"END": END, "coder": "coder"}
+        )
+
+    # Nodes are async: run the graph with `ainvoke` / `astream`.
+    return graph.compile(checkpointer=checkpointer)
+
 
-    return graph.compile()
+# -------------------------------
+# Resuming runs
+# -------------------------------
+async def prepare_resume(agent, config: dict) -> Optional[dict]:
+    """Get a checkpointed run ready to continue with `agent.astream(None, config)`.
+
+    Files written by completed coder tasks are checked against their recorded
+    hashes; tasks whose files changed or disappeared are queued again. Returns
+    the run's latest state, or None when the run already finished.
+    """
+    from agent.checkpoint import verify_written_files
+
+    snapshot = await agent.aget_state(config)
+    values = snapshot.values
+    if not values:
+        raise KeyError(f"No checkpoint found for run {config['configurable']['thread_id']!r}")
+    if values.get("status") == "DONE":
+        return None
+
+    coder_state: Optional[CoderState] = values.get("coder_state")
+    if coder_state is not None:
+        await asyncio.to_thread(verify_written_files, coder_state, values["project_root"])
+        # Re-enter the coder even if the last attempt ended with status FAILED.
+        as_node = "pipeline" if "pipeline" in agent.nodes else "architect"
+        await agent.aupdate_state(config, {"coder_state": coder_state, "status": "RESUMED", "error": ""}, as_node=as_node)
+        values = {**values, "coder_state": coder_state, "status": "RESUMED", "error": ""}
+    logging.info(f"Resuming run {config['configurable']['thread_id']}")
+    return values
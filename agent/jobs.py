@@ -0,0 +1,482 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import pathlib
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+from agent.cache import DEFAULT_CACHE_DIR
+
+
+# -------------------------------
+# Job queue
+# -------------------------------
+# Generations are queued as jobs in a SQLite database and run by worker processes
+# (`python -m agent.jobs`), so a run neither occupies a UI script thread nor is
+# lost when the page that started it reloads. Workers claim jobs atomically and
+# heartbeat while running; a job whose worker died is queued again and resumes
+# from its checkpoint. Anything that shares the database and the working
+# directory can serve the queue.
+
+JOBS_PATH = pathlib.Path(os.getenv("CODEPILOT_JOBS_DB", DEFAULT_CACHE_DIR / "jobs.db"))
+JOBS_ENABLED = os.getenv("CODEPILOT_JOBS", "1") == "1"
+# Worker processes the UI starts itself; 0 when workers are run separately.
+JOB_WORKERS = int(os.getenv("CODEPILOT_JOB_WORKERS", "2"))
+POLL_INTERVAL_S = float(os.getenv("CODEPILOT_JOB_POLL", "1"))
+HEARTBEAT_S = float(os.getenv("CODEPILOT_JOB_HEARTBEAT", "10"))
+# A running job whose worker sent no heartbeat for this long is taken over.
+STALE_AFTER_S = float(os.getenv("CODEPILOT_JOB_STALE", "120"))
+MAX_ATTEMPTS = int(os.getenv("CODEPILOT_JOB_ATTEMPTS", "2"))
+# API keys of jobs no worker has touched for this long are deleted and the jobs failed.
+KEY_TTL_S = float(os.getenv("CODEPILOT_JOB_KEY_TTL", "3600"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_COLUMNS = (
+    "id, status, request, created_at, started_at, finished_at, heartbeat_at, "
+    "worker, attempts, run_id, progress, result, error"
+)
+
+
+@dataclass
+class Job:
+    id: str
+    status: str
+    request: dict  # prompt, project_name, resume, use_cache, max_workers, pipelined, recursion_limit, record_metrics
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    heartbeat_at: Optional[float]
+    worker: Optional[str]
+    attempts: int
+    run_id: Optional[str]  # checkpoint thread id and project folder name, once known
+    progress: dict
+    result: Optional[dict]
+    error: Optional[str]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "Job":
+        (id, status, request, created_at, started_at, finished_at, heartbeat_at,
+         worker, attempts, run_id, progress, result, error) = row
+        return cls(id, status, json.loads(request), created_at, started_at, finished_at, heartbeat_at,
+                   worker, attempts, run_id, json.loads(progress or "{}"), json.loads(result) if result else None, error)
+
+
+_ready: set[pathlib.Path] = set()
+_ready_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _connect(path: pathlib.Path = JOBS_PATH) -> Iterator[sqlite3.Connection]:
+    path = pathlib.Path(path)
+    with _ready_lock:
+        ready = path in _ready
+        if not ready:
+            path.parent.mkdir(parents=True, exist_ok=True)
+    if not ready:
+        # the queue holds API keys: only the owner may read it (SQLite gives -wal/-shm the same mode)
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(path, 0o600)
+    conn = sqlite3.connect(path, timeout=30)
+    if not ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, api_key TEXT,"
+            " created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat_at REAL,"
+            " worker TEXT, attempts INTEGER NOT NULL DEFAULT 0, run_id TEXT,"
+            " progress TEXT, result TEXT, error TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, created_at)")
+        with _ready_lock:
+            _ready.add(path)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def submit(prompt: str, api_key: Optional[str] = None, project_name: str = "project", *,
+           resume: Optional[str] = None, path: pathlib.Path = JOBS_PATH, **options: Any) -> str:
+    """Queue a generation (or, with `resume`, the continuation of a run) and return its job id.
+
+    `options` are passed to the worker: use_cache, max_workers, pipelined,
+    recursion_limit and record_metrics. Without an `api_key` the worker uses
+    its own GROQ_API_KEY. A given key is deleted once the job finishes, or
+    after KEY_TTL_S without a worker making progress on it.
+    """
+    job_id = uuid.uuid4().hex[:12]
+    request = {"prompt": prompt, "project_name": project_name, "resume": resume, **options}
+    with _connect(path) as conn:
+        _expire_keys(conn, time.time())
+        conn.execute(
+            "INSERT INTO jobs (id, status, request, api_key, created_at, run_id) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, json.dumps(request), api_key or None, time.time(), resume),
+        )
+    logging.info(f"Queued job {job_id}")
+    return job_id
+
+
+def get(job_id: str, path: pathlib.Path = JOBS_PATH) -> Optional[Job]:
+    with _connect(path) as conn:
+        _expire_keys(conn, time.time())
+        row = conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return Job.from_row(row) if row else None
+
+
+def list_jobs(limit: int = 20, path: pathlib.Path = JOBS_PATH) -> list[Job]:
+    """Most recently submitted jobs first."""
+    with _connect(path) as conn:
+        rows = conn.execute(f"SELECT {_COLUMNS} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    return [Job.from_row(row) for row in rows]
+
+
+def queue_position(job_id: str, path: pathlib.Path = JOBS_PATH) -> int:
+    """Queued jobs ahead of `job_id` (0 when it is next or no longer queued)."""
+    with _connect(path) as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < "
+            "(SELECT created_at FROM jobs WHERE id = ? AND status = ?)",
+            (QUEUED, job_id, QUEUED),
+        ).fetchone()[0]
+
+
+def _expire_keys(conn: sqlite3.Connection, now: float) -> None:
+    """Fail queued jobs holding an API key that no worker took up within KEY_TTL_S, deleting the key."""
+    for (job_id,) in conn.execute(
+        "UPDATE jobs SET status = ?, finished_at = ?, api_key = NULL, error = ? "
+        "WHERE status = ? AND api_key IS NOT NULL AND COALESCE(heartbeat_at, created_at) < ? RETURNING id",
+        (FAILED, now, f"No worker picked this job up within {KEY_TTL_S:.0f}s; its API key was deleted. "
+                      f"Submit it again once workers are running.", QUEUED, now - KEY_TTL_S),
+    ).fetchall():
+        logging.warning(f"Job {job_id} expired unclaimed")
+
+
+def _requeue_stale(conn: sqlite3.Connection, now: float) -> None:
+    """Queue again (or, after MAX_ATTEMPTS, fail) running jobs whose worker stopped heartbeating."""
+    stale = now - STALE_AFTER_S
+    conn.execute(
+        "UPDATE jobs SET status = ?, finished_at = ?, api_key = NULL, error = ? "
+        "WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+        (FAILED, now, "The worker running this job stopped responding.", RUNNING, stale, MAX_ATTEMPTS),
+    )
+    for (job_id,) in conn.execute(
+        "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat_at < ? RETURNING id",
+        (QUEUED, RUNNING, stale),
+    ).fetchall():
+        logging.warning(f"Job {job_id} lost its worker; queued again")
+
+
+def claim(worker: str, path: pathlib.Path = JOBS_PATH) -> Optional[tuple[Job, Optional[str]]]:
+    """Take the oldest queued job for `worker`. Returns it with its API key, or None."""
+    now = time.time()
+    with _connect(path) as conn:
+        _requeue_stale(conn, now)
+        _expire_keys(conn, now)
+        row = conn.execute(
+            f"UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1 "
+            f"WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1) "
+            f"RETURNING {_COLUMNS}, api_key",
+            (RUNNING, worker, now, now, QUEUED),
+        ).fetchone()
+    if row is None:
+        return None
+    return Job.from_row(row[:-1]), row[-1]
+
+
+def heartbeat(job_id: str, progress: Optional[dict] = None, run_id: Optional[str] = None,
+              path: pathlib.Path = JOBS_PATH) -> None:
+    with _connect(path) as conn:
+        conn.execute(
+            "UPDATE jobs SET heartbeat_at = ?, progress = COALESCE(?, progress), run_id = COALESCE(?, run_id) "
+            "WHERE id = ?",
+            (time.time(), json.dumps(progress) if progress is not None else None, run_id, job_id),
+        )
+
+
+def finish(job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None,
+           path: pathlib.Path = JOBS_PATH) -> None:
+    with _connect(path) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ?, api_key = NULL WHERE id = ?",
+            (status, time.time(), json.dumps(result, default=_jsonable) if result is not None else None,
+             error, job_id),
+        )
+
+
+def release(job_id: str, path: pathlib.Path = JOBS_PATH) -> None:
+    """Put a job a worker is giving up on (e.g. when stopped) back in the queue."""
+    with _connect(path) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker = NULL, attempts = MAX(attempts - 1, 0) WHERE id = ? AND status = ?",
+            (QUEUED, job_id, RUNNING),
+        )
+
+
+def _jsonable(value: Any) -> Any:
+    return value.model_dump() if hasattr(value, "model_dump") else str(value)
+
+
+# -------------------------------
+# Running jobs
+# -------------------------------
+def file_progress(task_plan, completed: set[int]) -> list[tuple[str, int, int]]:
+    """(path, tasks done, tasks) per file of a task plan, in plan order."""
+    by_file: dict[str, list[int]] = {}
+    for idx, task in enumerate(task_plan.implementation_steps):
+        by_file.setdefault(task.filepath, []).append(idx)
+    return [(path, sum(1 for i in idxs if i in completed), len(idxs)) for path, idxs in by_file.items()]
+
+
+class _Progress:
+    """Mirrors a run's state into the job row: the plan, per-file task counts and throughput."""
+
+    _STAGES = {
+        "planner": "🏗️ Breaking the plan into tasks...",
+        "architect": "💻 Writing code...",
+        "pipeline": "💻 Writing code...",
+        "coder": "💻 Writing code...",
+    }
+
+    def __init__(self, job_id: str, path: pathlib.Path):
+        self.job_id, self.path = job_id, path
+        self.data: dict = {"stage": "🪄 Generating your project..."}
+        self.chars, self.started, self.written = 0, time.monotonic(), 0.0
+
+    def update(self, node: Optional[str], state: dict) -> None:
+        if node == "validate" and state.get("status") == "FIXING":
+            self.data["stage"] = f"🔧 Fixing {len(state['validation'])} file(s) that failed validation..."
+        elif node in self._STAGES:
+            self.data["stage"] = self._STAGES[node]
+        if state.get("plan"):
+            self.data["plan"] = state["plan"].model_dump()
+        coder_state = state.get("coder_state")
+        if coder_state is not None:
+            self.data["files"] = file_progress(coder_state.task_plan, set(coder_state.completed_steps))
+        elif state.get("task_plan"):
+            self.data["files"] = file_progress(state["task_plan"], set())
+
+    def add_chars(self, chars: int) -> None:
+        self.chars += chars
+        self.data["tokens"] = self.chars // 4
+        self.data["tok_s"] = round(self.data["tokens"] / max(time.monotonic() - self.started, 1e-6))
+
+    async def write(self, force: bool = True) -> None:
+        now = time.monotonic()
+        if force or now - self.written >= POLL_INTERVAL_S:
+            self.written = now
+            await asyncio.to_thread(heartbeat, self.job_id, dict(self.data), path=self.path)
+
+
+def chunk_chars(message) -> int:
+    """Characters of content and tool-call arguments in a streamed message chunk."""
+    content = message.content if isinstance(message.content, str) else str(message.content or "")
+    tool_args = sum(len(c.get("args") or "") for c in getattr(message, "tool_call_chunks", None) or [])
+    return len(content) + tool_args
+
+
+async def _heartbeat_forever(job_id: str, path: pathlib.Path) -> None:
+    while True:
+        await asyncio.sleep(HEARTBEAT_S)
+        await asyncio.to_thread(heartbeat, job_id, path=path)
+
+
+async def _start_or_resume(agent, job: Job, path: pathlib.Path) -> tuple[str, Optional[dict], dict]:
+    """Run id, graph inputs (None to continue a checkpoint) and starting state of a job."""
+    from agent.checkpoint import run_config
+    from agent.graph import init_project_root, prepare_resume
+
+    request = job.request
+    if job.run_id:  # a resume request, or a job taken over from a worker that died
+        try:
+            state = await prepare_resume(agent, run_config(job.run_id))
+            if state is None:  # finished before the job could record it
+                state = (await agent.aget_state(run_config(job.run_id))).values
+            return job.run_id, None, state
+        except KeyError:
+            if request.get("resume"):
+                raise
+            # the previous attempt died before its first checkpoint: start over
+
+    project_root = init_project_root(request.get("project_name") or "project")
+    run_id = pathlib.Path(project_root).name
+    await asyncio.to_thread(heartbeat, job.id, run_id=run_id, path=path)
+    inputs = {"user_prompt": request["prompt"], "project_root": project_root,
+              "use_cache": request.get("use_cache", True)}
+    return run_id, inputs, inputs
+
+
+async def execute(job: Job, api_key: Optional[str], path: pathlib.Path = JOBS_PATH) -> dict:
+    """Run a claimed job to the end of its graph and return the result stored for it."""
+    from agent.checkpoint import run_config
+    from agent.graph import DEFAULT_MAX_WORKERS, DEFAULT_PIPELINED, build_agent
+    from agent.metrics import start_run
+
+    request = job.request
+    api_key = api_key or os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise ValueError("No Groq API key: submit one with the job or set GROQ_API_KEY for the worker.")
+    agent = build_agent(api_key, max_workers=request.get("max_workers") or DEFAULT_MAX_WORKERS,
+                        pipelined=request.get("pipelined", DEFAULT_PIPELINED))
+    beats = asyncio.create_task(_heartbeat_forever(job.id, path))
+    try:
+        run_id, inputs, state = await _start_or_resume(agent, job, path)
+        progress = _Progress(job.id, path)
+        result = dict(state)
+        progress.update(None, result)
+        await progress.write()
+
+        with start_run(run_id, enabled=request.get("record_metrics", False)) as recorder:
+            config = run_config(run_id, recursion_limit=request.get("recursion_limit") or 100)
+            if recorder:
+                config["callbacks"] = [recorder.handler]
+            ran = result.get("status") != "DONE"
+            if ran:
+                async for mode, chunk in agent.astream(inputs, config, stream_mode=["updates", "messages"]):
+                    if mode == "messages":
+                        progress.add_chars(chunk_chars(chunk[0]))
+                        await progress.write(force=False)
+                        continue
+                    for node, update in chunk.items():
+                        result.update(update or {})
+                        progress.update(node, result)
+                    await progress.write()
+    finally:
+        beats.cancel()
+
+    record = {
+        "run_id": run_id, "project_root": result["project_root"], "status": result.get("status"),
+        "error": result.get("error"), "validation": result.get("validation") or {},
+        "metrics": recorder.summary() if recorder else None, "state": result,
+    }
+    if ran and result.get("status") != "FAILED":
+        from agent.database import save_project
+
+        plan = result.get("plan")
+        try:
+            record["project_id"] = await asyncio.to_thread(
+                save_project, plan.name if plan else run_id, result.get("user_prompt", ""), result["project_root"]
+            )
+        except Exception as e:
+            logging.warning(f"Job {job.id}: could not save the project to the library: {e}")
+    return record
+
+
+def run_job(job: Job, api_key: Optional[str], path: pathlib.Path = JOBS_PATH) -> str:
+    """Execute a claimed job and record its outcome. Returns the job's final status."""
+    logging.info(f"Running job {job.id} (attempt {job.attempts})")
+    try:
+        record = asyncio.run(execute(job, api_key, path))
+    except Exception as e:
+        logging.exception(f"Job {job.id} failed")
+        finish(job.id, FAILED, error=f"{type(e).__name__}: {e}\n\n{traceback.format_exc()}", path=path)
+        return FAILED
+    except BaseException:
+        release(job.id, path)  # stopped mid-run: another worker resumes it from its checkpoint
+        raise
+    status = FAILED if record["status"] == "FAILED" else DONE
+    finish(job.id, status, record, record["error"] if status == FAILED else None, path)
+    logging.info(f"Job {job.id} {status} (run {record['run_id']})")
+    return status
+
+
+# -------------------------------
+# Workers
+# -------------------------------
+def run_worker(path: pathlib.Path = JOBS_PATH, name: Optional[str] = None, parent_pid: Optional[int] = None,
+               max_jobs: Optional[int] = None) -> int:
+    """Claim and run jobs one at a time until `max_jobs` ran or the parent process is gone.
+
+    Returns the number of jobs run.
+    """
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    ran = 0
+    logging.info(f"Job worker {name} serving {path}")
+    while max_jobs is None or ran < max_jobs:
+        if parent_pid is not None and os.getppid() != parent_pid:
+            logging.info(f"Job worker {name}: parent exited, stopping")
+            break
+        claimed = claim(name, path)
+        if claimed is None:
+            if max_jobs is not None:
+                break
+            time.sleep(POLL_INTERVAL_S)
+            continue
+        run_job(*claimed, path=path)
+        ran += 1
+    return ran
+
+
+_workers: list[subprocess.Popen] = []
+_workers_lock = threading.Lock()
+
+
+def _spawn_worker(path: pathlib.Path) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "agent.jobs", "--db", str(path), "--parent", str(os.getpid())],
+        cwd=os.getcwd(), start_new_session=True,
+    )
+
+
+def start_workers(n: int = JOB_WORKERS, path: pathlib.Path = JOBS_PATH) -> int:
+    """Keep `n` worker processes running for this process, replacing any that exited.
+
+    Workers stop on their own once this process is gone, after finishing their
+    current job. Returns the number of live workers.
+    """
+    with _workers_lock:
+        _workers[:] = [p for p in _workers if p.poll() is None]
+        while len(_workers) < n:
+            _workers.append(_spawn_worker(pathlib.Path(path)))
+        return len(_workers)
+
+
+def _serve(count: int, path: pathlib.Path) -> None:
+    """Run `count` workers as child processes until interrupted."""
+    procs = [_spawn_worker(path) for _ in range(count)]
+    try:
+        for proc in procs:
+            proc.wait()
+    finally:
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()  # SIGTERM releases the job it is running
+        for proc in procs:
+            proc.wait()
+
+
+if __name__ == "__main__":
+    # python -m agent.jobs [--workers N]: serve the job queue from this machine
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run CodePilot job workers")
+    parser.add_argument("--workers", "-w", type=int, default=1, help="Worker processes (default: 1)")
+    parser.add_argument("--db", type=pathlib.Path, default=JOBS_PATH, help=f"Job database (default: {JOBS_PATH})")
+    parser.add_argument("--parent", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(143))
+
+    try:
+        if args.workers > 1:
+            _serve(args.workers, args.db)
+        else:
+            run_worker(args.db, parent_pid=args.parent)
+    except KeyboardInterrupt:
+        pass
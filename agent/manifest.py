@@ -0,0 +1,168 @@
+import bisect
+import os
+import pathlib
+import threading
+
+
+# Heavy directories created by package managers and build tools. They are never
+# listed or walked; the coder only cares about the files it generates.
+IGNORED_DIRS = frozenset({
+    "node_modules", ".venv", "venv", "env", "__pycache__", ".git", ".hg",
+    ".mypy_cache", ".pytest_cache", ".next", ".nuxt", ".cache", "dist", "build",
+})
+
+
+def is_ignored(rel_path: str) -> bool:
+    return any(part in IGNORED_DIRS for part in pathlib.PurePosixPath(rel_path).parts)
+
+
+class ProjectManifest:
+    """Sorted index of the files in a project folder, kept up to date incrementally.
+
+    write_file adds entries directly. Other changes are detected by comparing the
+    mtimes of the known (non-ignored) directories, so a refresh costs one stat per
+    directory rather than one per file, and only changed directories are re-read.
+    `mark_dirty()` forces a full rescan, e.g. after a shell command ran.
+    """
+
+    def __init__(self, root: pathlib.Path):
+        self.root = pathlib.Path(root).resolve()
+        self._files: list[str] = []
+        self._file_set: set[str] = set()
+        self._dirs: dict[str, int] = {}
+        self._dirty = True
+        self._lock = threading.Lock()
+
+    # -------------------------------
+    # Updates
+    # -------------------------------
+    def mark_dirty(self) -> None:
+        self._dirty = True
+
+    def add(self, rel_path: str) -> None:
+        if is_ignored(rel_path):
+            return
+        with self._lock:
+            self._add_file(rel_path)
+            # Record directories write_file just created. Known directories keep
+            # their old mtime so other changes in them are still picked up.
+            parent = pathlib.PurePosixPath(rel_path).parent
+            for d in [parent, *parent.parents]:
+                rel_dir = "" if str(d) == "." else str(d)
+                if rel_dir in self._dirs:
+                    break
+                try:
+                    self._dirs[rel_dir] = (self.root / rel_dir).stat().st_mtime_ns
+                except FileNotFoundError:
+                    pass
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    def list(self, prefix: str = "") -> list[str]:
+        """Files under the directory `prefix` (relative, "" for the whole project)."""
+        with self._lock:
+            self._refresh()
+            if not prefix:
+                return list(self._files)
+            prefix = prefix.rstrip("/") + "/"
+            start = bisect.bisect_left(self._files, prefix)
+            end = bisect.bisect_left(self._files, prefix + "\U0010ffff")
+            return self._files[start:end]
+
+    def __contains__(self, rel_path: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return rel_path in self._file_set
+
+    # -------------------------------
+    # Internals (caller holds the lock)
+    # -------------------------------
+    def _add_file(self, rel_path: str) -> None:
+        if rel_path not in self._file_set:
+            self._file_set.add(rel_path)
+            bisect.insort(self._files, rel_path)
+
+    def _remove_file(self, rel_path: str) -> None:
+        if rel_path in self._file_set:
+            self._file_set.discard(rel_path)
+            del self._files[bisect.bisect_left(self._files, rel_path)]
+
+    def _refresh(self) -> None:
+        if self._dirty:
+            self._files, self._file_set, self._dirs = [], set(), {}
+            self._dirty = False
+            self._scan_tree("")
+            return
+        for rel_dir, mtime in list(self._dirs.items()):
+            if rel_dir not in self._dirs:
+                continue  # dropped while handling a parent
+            try:
+                current = (self.root / rel_dir).stat().st_mtime_ns
+            except FileNotFoundError:
+                self._drop_tree(rel_dir)
+                continue
+            if current != mtime:
+                self._rescan_dir(rel_dir, current)
+
+    def _scan_tree(self, rel_dir: str) -> None:
+        for dirpath, dirnames, filenames in os.walk(self.root / rel_dir):
+            dirnames[:] = [d for d in dirnames if d not in IGNORED_DIRS]
+            rel = pathlib.Path(dirpath).relative_to(self.root).as_posix()
+            rel = "" if rel == "." else rel
+            self._dirs[rel] = os.stat(dirpath).st_mtime_ns
+            for name in filenames:
+                self._add_file(f"{rel}/{name}" if rel else name)
+
+    def _rescan_dir(self, rel_dir: str, mtime: int) -> None:
+        self._dirs[rel_dir] = mtime
+        prefix = f"{rel_dir}/" if rel_dir else ""
+        seen_files, seen_dirs = set(), set()
+        with os.scandir(self.root / rel_dir) as it:
+            for entry in it:
+                rel = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in IGNORED_DIRS:
+                        seen_dirs.add(rel)
+                        if rel not in self._dirs:
+                            self._scan_tree(rel)
+                else:
+                    seen_files.add(rel)
+                    self._add_file(rel)
+        # drop direct children that disappeared
+        start = bisect.bisect_left(self._files, prefix)
+        end = bisect.bisect_left(self._files, prefix + "\U0010ffff") if prefix else len(self._files)
+        for rel in self._files[start:end]:
+            if "/" not in rel[len(prefix):] and rel not in seen_files:
+                self._remove_file(rel)
+        for d in [d for d in self._dirs if d and d != rel_dir and pathlib.PurePosixPath(d).parent.as_posix() == (rel_dir or ".")]:
+            if d not in seen_dirs:
+                self._drop_tree(d)
+
+    def _drop_tree(self, rel_dir: str) -> None:
+        prefix = f"{rel_dir}/"
+        for d in [d for d in self._dirs if d == rel_dir or d.startswith(prefix)]:
+            del self._dirs[d]
+        for rel in [f for f in self._files if f.startswith(prefix)]:
+            self._remove_file(rel)
+
+
+# -------------------------------
+# Per-project registry
+# -------------------------------
+_manifests: dict[pathlib.Path, ProjectManifest] = {}
+_registry_lock = threading.Lock()
+
+
+def get_manifest(root: pathlib.Path) -> ProjectManifest:
+    root = pathlib.Path(root).resolve()
+    with _registry_lock:
+        manifest = _manifests.get(root)
+        if manifest is None:
+            manifest = _manifests[root] = ProjectManifest(root)
+        return manifest
+
+
+def forget_manifest(root: pathlib.Path) -> None:
+    with _registry_lock:
+        _manifests.pop(pathlib.Path(root).resolve(), None)
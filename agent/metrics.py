@@ -0,0 +1,276 @@
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+import uuid
+from typing import Any, Iterator, Optional
+from uuid import UUID
+
+from agent import tools
+from agent.executor import CommandResult, add_command_listener
+
+
+METRICS_ENABLED = os.getenv("CODEPILOT_METRICS", "0") == "1"
+METRICS_PATH = pathlib.Path(os.getenv("CODEPILOT_METRICS_PATH", pathlib.Path.cwd() / "metrics" / "runs.jsonl"))
+
+_current: contextvars.ContextVar[Optional["RunRecorder"]] = contextvars.ContextVar("run_recorder", default=None)
+
+
+def current_recorder() -> Optional["RunRecorder"]:
+    return _current.get()
+
+
+# -------------------------------
+# Recorder
+# -------------------------------
+class RunRecorder:
+    """Collects timing, token and tool events for one run and appends them to a JSONL file."""
+
+    def __init__(self, run_id: str, path: pathlib.Path = METRICS_PATH):
+        self.run_id = run_id
+        self.path = pathlib.Path(path)
+        self.events: list[dict] = []
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    @functools.cached_property
+    def handler(self):
+        """LangChain callback handler feeding this recorder."""
+        return _handler_class()(self)
+
+    def record(self, event: str, **fields: Any) -> None:
+        entry = {"run_id": self.run_id, "ts": round(time.time(), 4), "event": event, **fields}
+        with self._lock:
+            self.events.append(entry)
+
+    @contextlib.asynccontextmanager
+    async def span(self, scope: str, **fields: Any):
+        """Record the wall time of the enclosed block as a `node` event."""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.record("node", scope=scope, wall_s=round(time.perf_counter() - start, 4), error=error, **fields)
+
+    def flush(self) -> None:
+        self.record("run", wall_s=round(time.time() - self.started, 4))
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(e, default=str) + "\n" for e in self.events)
+        except OSError as e:
+            logging.warning(f"Could not write metrics to {self.path}: {e}")
+
+    def summary(self) -> list[dict]:
+        """One row per scope (graph node or coder task file) with aggregated numbers."""
+        rows: dict[str, dict] = {}
+
+        def row(scope: str) -> dict:
+            return rows.setdefault(scope, {
+                "scope": scope, "wall_s": 0.0, "llm_calls": 0, "llm_s": 0.0, "avg_ttft_s": None,
+                "prompt_tokens": 0, "completion_tokens": 0, "tool_calls": 0, "tool_s": 0.0, "bytes_written": 0,
+            })
+
+        ttfts: dict[str, list[float]] = {}
+        with self._lock:
+            events = list(self.events)
+        for e in events:
+            scope = e.get("scope") or "run"
+            if e["event"] == "node":
+                row(scope)["wall_s"] += e["wall_s"]
+            elif e["event"] == "llm":
+                r = row(scope)
+                r["llm_calls"] += 1
+                r["llm_s"] += e["latency_s"]
+                r["prompt_tokens"] += e.get("prompt_tokens") or 0
+                r["completion_tokens"] += e.get("completion_tokens") or 0
+                if e.get("ttft_s") is not None:
+                    ttfts.setdefault(scope, []).append(e["ttft_s"])
+            elif e["event"] == "tool":
+                r = row(scope)
+                r["tool_calls"] += 1
+                r["tool_s"] += e["duration_s"]
+            elif e["event"] == "write":
+                row(scope)["bytes_written"] += e["bytes"]
+        for scope, values in ttfts.items():
+            rows[scope]["avg_ttft_s"] = round(sum(values) / len(values), 4)
+        for r in rows.values():
+            for k in ("wall_s", "llm_s", "tool_s"):
+                r[k] = round(r[k], 4)
+        return list(rows.values())
+
+
+@contextlib.contextmanager
+def start_run(run_id: Optional[str] = None, enabled: bool = METRICS_ENABLED,
+              path: pathlib.Path = METRICS_PATH) -> Iterator[Optional[RunRecorder]]:
+    """Activate a recorder for the enclosed run; yields None (and costs nothing) when disabled.
+
+    Pass `recorder.handler` in the run config's callbacks to capture LLM and tool events.
+    """
+    if not enabled:
+        yield None
+        return
+    recorder = RunRecorder(run_id or uuid.uuid4().hex[:12], path)
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+        recorder.flush()
+
+
+# Coder tasks tag their LLM and tool calls with this metadata key, so events
+# can be attributed to the file being implemented rather than just "coder".
+SCOPE_METADATA_KEY = "codepilot_scope"
+
+
+def _scope(metadata: Optional[dict]) -> str:
+    metadata = metadata or {}
+    return metadata.get(SCOPE_METADATA_KEY) or metadata.get("langgraph_node") or "run"
+
+
+# -------------------------------
+# LangChain callbacks
+# -------------------------------
+# Defined on first use: importing langchain_core's callbacks is slow and only
+# runs that record metrics need the handler.
+@functools.lru_cache(maxsize=None)
+def _handler_class() -> type:
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class MetricsCallbackHandler(BaseCallbackHandler):
+        """Times LLM calls (latency, time-to-first-token, token usage) and tool calls."""
+
+        run_inline = True
+
+        def __init__(self, recorder: RunRecorder):
+            self.recorder = recorder
+            self._llm: dict[UUID, dict] = {}
+            self._tools: dict[UUID, dict] = {}
+            self._lock = threading.Lock()
+
+        def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs) -> None:
+            with self._lock:
+                self._llm[run_id] = {"start": time.perf_counter(), "first": None, "scope": _scope(metadata)}
+
+        def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata=None, **kwargs) -> None:
+            self.on_chat_model_start(serialized, prompts, run_id=run_id, metadata=metadata)
+
+        def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs) -> None:
+            call = self._llm.get(run_id)
+            if call is not None and call["first"] is None:
+                call["first"] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+            with self._lock:
+                call = self._llm.pop(run_id, None)
+            if call is None:
+                return
+            end = time.perf_counter()
+            prompt_tokens, completion_tokens = _token_usage(response)
+            self.recorder.record(
+                "llm", scope=call["scope"], latency_s=round(end - call["start"], 4),
+                ttft_s=round(call["first"] - call["start"], 4) if call["first"] else None,
+                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+            )
+
+        def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+            with self._lock:
+                call = self._llm.pop(run_id, None)
+            if call is not None:
+                self.recorder.record(
+                    "llm", scope=call["scope"], latency_s=round(time.perf_counter() - call["start"], 4),
+                    error=type(error).__name__,
+                )
+
+        def on_tool_start(self, serialized, input_str, *, run_id: UUID, metadata=None, **kwargs) -> None:
+            with self._lock:
+                self._tools[run_id] = {
+                    "start": time.perf_counter(), "scope": _scope(metadata),
+                    "tool": (serialized or {}).get("name") or kwargs.get("name") or "tool",
+                }
+
+        def on_tool_end(self, output, *, run_id: UUID, **kwargs) -> None:
+            self._finish_tool(run_id, None)
+
+        def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+            self._finish_tool(run_id, type(error).__name__)
+
+        def _finish_tool(self, run_id: UUID, error: Optional[str]) -> None:
+            with self._lock:
+                call = self._tools.pop(run_id, None)
+            if call is not None:
+                self.recorder.record(
+                    "tool", scope=call["scope"], tool=call["tool"],
+                    duration_s=round(time.perf_counter() - call["start"], 4), error=error,
+                )
+
+    MetricsCallbackHandler.__qualname__ = "MetricsCallbackHandler"
+    return MetricsCallbackHandler
+
+
+def __getattr__(name: str):
+    if name == "MetricsCallbackHandler":
+        return _handler_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _token_usage(response) -> tuple[Optional[int], Optional[int]]:
+    for generations in response.generations or []:
+        for gen in generations:
+            usage = getattr(getattr(gen, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens"), usage.get("output_tokens")
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+
+# -------------------------------
+# Bytes written by tools
+# -------------------------------
+def _on_write(root: pathlib.Path, path: pathlib.Path, data: bytes) -> None:
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.record("write", scope=_write_scope.get(), path=path.relative_to(root).as_posix(), bytes=len(data))
+
+
+# Scope of the coder task currently running in this context (for write events).
+_write_scope: contextvars.ContextVar[str] = contextvars.ContextVar("write_scope", default="coder")
+
+
+@contextlib.contextmanager
+def task_scope(scope: str) -> Iterator[None]:
+    token = _write_scope.set(scope)
+    try:
+        yield
+    finally:
+        _write_scope.reset(token)
+
+
+tools.add_write_listener(_on_write)
+
+
+# -------------------------------
+# Shell commands
+# -------------------------------
+def _on_command(result: CommandResult) -> None:
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.record(
+            "command", scope=_write_scope.get(), cmd=result.cmd[:200], returncode=result.returncode,
+            duration_s=result.duration_s, timed_out=result.timed_out, cpu_user_s=result.cpu_user_s,
+            cpu_system_s=result.cpu_system_s, max_rss_kb=result.max_rss_kb, truncated_bytes=result.truncated_bytes,
+            cached=result.cached,
+        )
+
+
+add_command_listener(_on_command)
@@ -0,0 +1,198 @@
+import errno
+import hashlib
+import logging
+import os
+import pathlib
+import stat
+import threading
+import uuid
+from typing import Callable, Iterable, Optional
+
+
+# -------------------------------
+# Content-addressed object store
+# -------------------------------
+# Project folders that live next to an `.objects` directory are backed by it:
+# once a run is done, `link_tree()` replaces each of its files with a hardlink
+# to a read-only blob named after the SHA-256 of its content, so identical files
+# across runs share one inode. A blob's reference count is its link count minus
+# one (the store's own name); `gc()` removes blobs no project links to any more.
+#
+# While a run is writing, its files are private (`write_private` breaks a link
+# before writing). A finished project's files are shared and must not be edited
+# in place -- as root the read-only bit does not stop a write, which would then
+# change every project linking the blob; copy the folder (or use the ZIP) first.
+
+OBJECTS_DIRNAME = ".objects"
+DEDUP_ENABLED = os.getenv("CODEPILOT_DEDUP", "1") == "1"
+
+# Filesystems (or mounts) where hardlinks are unavailable.
+_LINK_ERRORS = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP}
+
+# Called as fn(project_root, path, stat_before, data) after link_tree replaced a
+# private file with a blob link; the new inode carries the blob's mtime, so
+# state keyed by the file's stat (e.g. precompressed ZIP entries) moves over.
+LinkListener = Callable[[pathlib.Path, pathlib.Path, os.stat_result, bytes], None]
+_link_listeners: list[LinkListener] = []
+
+
+def add_link_listener(listener: LinkListener) -> None:
+    if listener not in _link_listeners:
+        _link_listeners.append(listener)
+
+
+def _notify_link(root: pathlib.Path, path: pathlib.Path, before: os.stat_result, data: bytes) -> None:
+    for listener in _link_listeners:
+        try:
+            listener(root, path, before, data)
+        except Exception:
+            logging.exception(f"Link listener {listener!r} failed for {path}")
+
+
+class ObjectStore:
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.enabled = True
+
+    def object_path(self, digest: str) -> pathlib.Path:
+        return self.path / digest[:2] / digest
+
+    def _ensure_object(self, digest: str, data: bytes) -> pathlib.Path:
+        obj = self.object_path(digest)
+        if obj.exists():
+            return obj
+        obj.parent.mkdir(exist_ok=True)
+        tmp = obj.parent / f".{digest}.{uuid.uuid4().hex}.tmp"
+        tmp.write_bytes(data)
+        # Read-only, so an in-place write to one project's file cannot change the others.
+        tmp.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(tmp, obj)
+        return obj
+
+    def write(self, dest: pathlib.Path, data: bytes) -> None:
+        """Make `dest` a hardlink to the blob holding `data`, replacing it atomically."""
+        if not self.enabled:
+            write_private(dest, data)
+            return
+        digest = hashlib.sha256(data).hexdigest()
+        tmp = dest.parent / f".{dest.name}.{uuid.uuid4().hex}.tmp"
+        for _ in range(2):
+            obj = self._ensure_object(digest, data)
+            try:
+                os.link(obj, tmp)
+                break
+            except FileNotFoundError:
+                continue  # collected by gc() between the check and the link
+            except OSError as e:
+                if e.errno not in _LINK_ERRORS:
+                    raise
+                logging.warning(f"Hardlinks unavailable under {self.path} ({e}); writing plain files")
+                self.enabled = False
+                write_private(dest, data)
+                return
+        else:
+            write_private(dest, data)
+            return
+        os.replace(tmp, dest)
+
+    def link_tree(self, root: pathlib.Path, files: Iterable[str]) -> int:
+        """Replace the private files among `files` (relative to `root`) with blob links; returns how many."""
+        root = pathlib.Path(root).resolve()
+        linked = 0
+        for rel_path in files:
+            if not self.enabled:
+                break
+            path = root / rel_path
+            try:
+                st = path.lstat()
+                if not stat.S_ISREG(st.st_mode) or st.st_nlink > 1:
+                    continue  # symlinks, and files that are already links
+                data = path.read_bytes()
+                self.write(path, data)
+                linked += 1
+                _notify_link(root, path, st, data)
+            except FileNotFoundError:
+                continue
+        return linked
+
+    def refcount(self, digest: str) -> int:
+        try:
+            return self.object_path(digest).stat().st_nlink - 1
+        except FileNotFoundError:
+            return 0
+
+    def stats(self) -> dict:
+        """Unique blobs, their total size, and how many project files link to them."""
+        objects = size = links = 0
+        for obj in self._iter_objects():
+            st = obj.stat()
+            objects += 1
+            size += st.st_size
+            links += st.st_nlink - 1
+        return {"objects": objects, "bytes": size, "links": links}
+
+    def gc(self) -> tuple[int, int]:
+        """Delete blobs that no project file links to; returns (blobs, bytes) removed."""
+        removed = freed = 0
+        for obj in self._iter_objects():
+            try:
+                st = obj.stat()
+                if st.st_nlink == 1:
+                    obj.unlink()
+                    removed += 1
+                    freed += st.st_size
+            except FileNotFoundError:
+                pass
+        if removed:
+            logging.info(f"Object store GC removed {removed} blob(s), {freed} bytes")
+        return removed, freed
+
+    def _iter_objects(self):
+        for shard in self.path.iterdir():
+            if shard.is_dir():
+                yield from (p for p in shard.iterdir() if not p.name.startswith("."))
+
+
+def write_private(dest: pathlib.Path, data: bytes) -> None:
+    """Write `data` to `dest`, first unlinking it if it shares its inode with a blob."""
+    try:
+        st = dest.lstat()
+    except FileNotFoundError:
+        pass
+    else:
+        if stat.S_ISREG(st.st_mode) and (st.st_nlink > 1 or not os.access(dest, os.W_OK)):
+            dest.unlink()  # copy-on-write: the blob and the other projects keep the old content
+    dest.write_bytes(data)
+
+
+
+# -------------------------------
+# Store lookup
+# -------------------------------
+_stores: dict[pathlib.Path, Optional[ObjectStore]] = {}
+_lock = threading.Lock()
+
+
+def get_object_store(base_dir: pathlib.Path) -> ObjectStore:
+    """The store for project folders created under `base_dir` (created on first use)."""
+    base_dir = pathlib.Path(base_dir).resolve()
+    with _lock:
+        store = _stores.get(base_dir)
+        if store is None:
+            store = _stores[base_dir] = ObjectStore(base_dir / OBJECTS_DIRNAME)
+        return store
+
+
+def store_for(project_root: pathlib.Path) -> Optional[ObjectStore]:
+    """The store backing `project_root`, if its parent folder has one."""
+    if not DEDUP_ENABLED:
+        return None
+    base_dir = pathlib.Path(project_root).resolve().parent
+    with _lock:
+        if base_dir in _stores:
+            return _stores[base_dir]
+    if (base_dir / OBJECTS_DIRNAME).is_dir():
+        return get_object_store(base_dir)
+    with _lock:
+        return _stores.setdefault(base_dir, None)
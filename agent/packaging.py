@@ -0,0 +1,230 @@
+import io
+import logging
+import os
+import pathlib
+import shutil
+import stat
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+
+from agent import tools
+from agent.objects import add_link_listener
+
+
+# -------------------------------
+# In-memory ZIP packaging
+# -------------------------------
+# Files are deflated as soon as write_file saves them, so building the archive
+# after the coder finishes only concatenates already-compressed entries. Files
+# that changed on disk since (e.g. created by run_cmd) are compressed at build time.
+# When a finished project is linked into the object store, its entries move to
+# the blobs' stat but keep the files' own timestamps.
+
+_ZIP_VERSION = 20
+_UTF8_FLAG = 0x0800
+_DEFLATED = 8
+_ZIP32_LIMIT = 0xFFFFFFFF
+# Installed dependencies and VCS data; build output such as dist/ is part of the download.
+_EXCLUDED_DIRS = frozenset({"node_modules", ".venv", "venv", "__pycache__", ".git", ".hg"})
+
+
+@dataclass
+class _Entry:
+    crc: int
+    size: int
+    mtime_ns: int  # of the file on disk, to tell whether the entry is still current
+    data: bytes  # raw deflate stream
+    date_ns: int  # timestamp stored in the archive
+
+
+def _deflate(data: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _entry_for(data: bytes, mtime_ns: int) -> _Entry:
+    return _Entry(crc=zlib.crc32(data), size=len(data), mtime_ns=mtime_ns, data=_deflate(data), date_ns=mtime_ns)
+
+
+def _is_current(entry: _Entry, st: os.stat_result) -> bool:
+    return entry.size == st.st_size and entry.mtime_ns == st.st_mtime_ns
+
+
+_archives: dict[pathlib.Path, dict[str, _Entry]] = {}
+_lock = threading.Lock()
+
+# Entries of files hardlinked into the object store, keyed by inode: identical
+# files of different projects share an inode, so each is compressed once.
+_SHARED_MAX_BYTES = 64 * 1024 * 1024
+_shared: "OrderedDict[tuple[int, int], _Entry]" = OrderedDict()
+_shared_bytes = 0
+
+
+def _shared_get(st: os.stat_result) -> _Entry | None:
+    with _lock:
+        entry = _shared.get((st.st_dev, st.st_ino))
+        if entry is None or not _is_current(entry, st):
+            return None
+        _shared.move_to_end((st.st_dev, st.st_ino))
+        return entry
+
+
+def _shared_put(st: os.stat_result, entry: _Entry) -> None:
+    global _shared_bytes
+    if st.st_nlink < 2 or len(entry.data) > _SHARED_MAX_BYTES // 8:
+        return
+    key = (st.st_dev, st.st_ino)
+    with _lock:
+        old = _shared.pop(key, None)
+        if old is not None:
+            _shared_bytes -= len(old.data)
+        _shared[key] = entry
+        _shared_bytes += len(entry.data)
+        while _shared_bytes > _SHARED_MAX_BYTES:
+            _, evicted = _shared.popitem(last=False)
+            _shared_bytes -= len(evicted.data)
+
+
+def track_project(project_dir: str | pathlib.Path) -> None:
+    """Start compressing files written into `project_dir` as they are produced."""
+    with _lock:
+        _archives.setdefault(pathlib.Path(project_dir).resolve(), {})
+
+
+def untrack_project(project_dir: str | pathlib.Path) -> None:
+    with _lock:
+        _archives.pop(pathlib.Path(project_dir).resolve(), None)
+
+
+def _on_write(root: pathlib.Path, path: pathlib.Path, data: bytes) -> None:
+    with _lock:
+        entries = _archives.get(root)
+    if entries is None:
+        return
+    st = path.stat()
+    entry = _shared_get(st)
+    if entry is None:
+        entry = _entry_for(data, st.st_mtime_ns)
+        _shared_put(st, entry)
+    with _lock:
+        entries[path.relative_to(root).as_posix()] = entry
+
+
+def _on_link(root: pathlib.Path, path: pathlib.Path, before: os.stat_result, data: bytes) -> None:
+    with _lock:
+        entries = _archives.get(root)
+    if entries is None:
+        return
+    arcname = path.relative_to(root).as_posix()
+    st = path.stat()
+    with _lock:
+        entry = entries.get(arcname)
+    shared = _shared_get(st)
+    if entry is None or not _is_current(entry, before):
+        entry = shared or _entry_for(data, before.st_mtime_ns)
+    # validated against the blob from now on; the archive keeps the file's own date
+    entry = replace(entry, mtime_ns=st.st_mtime_ns, date_ns=before.st_mtime_ns)
+    if shared is None:
+        _shared_put(st, entry)
+    with _lock:
+        entries[arcname] = entry
+
+
+tools.add_write_listener(_on_write)
+add_link_listener(_on_link)
+
+
+def _dos_datetime(mtime_ns: int) -> tuple[int, int]:
+    t = time.localtime(mtime_ns / 1e9)
+    year = max(t.tm_year, 1980)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def _archive_mode(mode: int) -> int:
+    # object store blobs are read-only; extracted files should not be
+    return mode | stat.S_IWUSR
+
+
+def _iter_project_files(project_dir: pathlib.Path):
+    for dirpath, dirnames, filenames in os.walk(project_dir):
+        dirnames[:] = sorted(d for d in dirnames if d not in _EXCLUDED_DIRS)
+        for name in sorted(filenames):
+            yield pathlib.Path(dirpath) / name
+
+
+class _NeedsZip64(Exception):
+    pass
+
+
+def build_project_zip(project_dir: str | pathlib.Path) -> bytes:
+    """Return a ZIP archive of `project_dir` built entirely in memory."""
+    project_dir = pathlib.Path(project_dir).resolve()
+    try:
+        return _build_zip32(project_dir)
+    except _NeedsZip64:
+        # rare for generated projects; let zipfile handle the ZIP64 records
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            for path in _iter_project_files(project_dir):
+                info = zipfile.ZipInfo.from_file(path, path.relative_to(project_dir).as_posix())
+                info.external_attr = (_archive_mode(path.stat().st_mode) & 0xFFFF) << 16
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(path, "rb") as src, zf.open(info, "w", force_zip64=True) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        return out.getvalue()
+
+
+def _build_zip32(project_dir: pathlib.Path) -> bytes:
+    with _lock:
+        cached = dict(_archives.get(project_dir, {}))
+
+    out = io.BytesIO()
+    central = []
+    reused = 0
+    for path in _iter_project_files(project_dir):
+        arcname = path.relative_to(project_dir).as_posix()
+        st = path.stat()
+        entry = cached.get(arcname)
+        if entry is not None and _is_current(entry, st):
+            reused += 1
+        elif (entry := _shared_get(st)) is not None:
+            reused += 1
+        else:
+            entry = _entry_for(path.read_bytes(), st.st_mtime_ns)
+            _shared_put(st, entry)
+        if entry.size >= _ZIP32_LIMIT or len(entry.data) >= _ZIP32_LIMIT or out.tell() >= _ZIP32_LIMIT:
+            raise _NeedsZip64()
+
+        name = arcname.encode("utf-8")
+        dos_time, dos_date = _dos_datetime(entry.date_ns)
+        offset = out.tell()
+        out.write(struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, _ZIP_VERSION, _UTF8_FLAG, _DEFLATED,
+            dos_time, dos_date, entry.crc, len(entry.data), entry.size, len(name), 0,
+        ))
+        out.write(name)
+        out.write(entry.data)
+        central.append(struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | _ZIP_VERSION, _ZIP_VERSION, _UTF8_FLAG,
+            _DEFLATED, dos_time, dos_date, entry.crc, len(entry.data), entry.size, len(name),
+            0, 0, 0, 0, (_archive_mode(st.st_mode) & 0xFFFF) << 16, offset,
+        ) + name)
+
+    if len(central) > 0xFFFF:
+        raise _NeedsZip64()
+    cd_offset = out.tell()
+    for record in central:
+        out.write(record)
+    out.write(struct.pack(
+        "<IHHHHIIH", 0x06054B50, 0, 0, len(central), len(central),
+        out.tell() - cd_offset, cd_offset, 0,
+    ))
+    logging.info(f"Packaged {len(central)} files from {project_dir.name} ({reused} precompressed)")
+    return out.getvalue()
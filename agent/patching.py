@@ -0,0 +1,119 @@
+import re
+
+
+class PatchConflict(ValueError):
+    """An edit could not be applied because the file does not look as the edit expects."""
+
+
+# -------------------------------
+# Search / replace hunks
+# -------------------------------
+def apply_search_replace(text: str, edits: list[dict]) -> str:
+    """Apply `{"search": ..., "replace": ...}` hunks in order.
+
+    Each search string must occur exactly once in the current text, so an edit
+    can never silently land in the wrong place.
+    """
+    problems = []
+    for n, edit in enumerate(edits, 1):
+        search = edit.get("search")
+        replace = edit.get("replace", "")
+        if not search:
+            problems.append(f"hunk {n}: empty search text")
+            continue
+        count = text.count(search)
+        if count == 1:
+            text = text.replace(search, replace, 1)
+            continue
+        if count == 0:
+            problems.append(f"hunk {n}: search text not found{_closest_line_hint(text, search)}")
+        else:
+            problems.append(f"hunk {n}: search text matches {count} places; include more surrounding lines")
+    if problems:
+        raise PatchConflict("; ".join(problems))
+    return text
+
+
+def _closest_line_hint(text: str, search: str) -> str:
+    first = next((line.strip() for line in search.splitlines() if line.strip()), "")
+    if not first:
+        return ""
+    for lineno, line in enumerate(text.splitlines(), 1):
+        if line.strip() == first:
+            return f" (its first line matches line {lineno}; check whitespace in the following lines)"
+    return ""
+
+
+# -------------------------------
+# Unified diffs
+# -------------------------------
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def _parse_hunks(diff: str) -> list[tuple[int, list[str], list[str]]]:
+    """Return (old_start, old_lines, new_lines) for each hunk of a single-file diff."""
+    hunks = []
+    current = None
+    for line in diff.splitlines():
+        header = _HUNK_HEADER.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+            continue
+        if current is None:  # file headers and anything before the first hunk
+            continue
+        if line.startswith("\\"):  # "\ No newline at end of file"
+            continue
+        tag, body = (line[:1], line[1:]) if line else (" ", "")
+        if tag == " ":
+            current[1].append(body)
+            current[2].append(body)
+        elif tag == "-":
+            current[1].append(body)
+        elif tag == "+":
+            current[2].append(body)
+        else:
+            raise PatchConflict(f"malformed diff line: {line!r}")
+    if not hunks:
+        raise PatchConflict("no @@ hunks found in diff")
+    return hunks
+
+
+def apply_unified_diff(text: str, diff: str, fuzz: int = 50) -> str:
+    """Apply a unified diff to `text`.
+
+    Hunks are matched at their stated line number first, then anywhere within
+    `fuzz` lines of it, to tolerate slightly stale line numbers.
+    """
+    trailing_newline = text.endswith("\n")
+    lines = text.splitlines()
+    offset = 0
+    problems = []
+    for n, (old_start, old_lines, new_lines) in enumerate(_parse_hunks(diff), 1):
+        # a pure insertion (-N,0) goes after line N rather than replacing it
+        expected = (old_start if not old_lines else max(old_start - 1, 0)) + offset
+        pos = _find_block(lines, old_lines, expected, fuzz)
+        if pos is None:
+            problems.append(f"hunk {n} (@@ -{old_start}): context does not match the file")
+            continue
+        lines[pos:pos + len(old_lines)] = new_lines
+        offset += len(new_lines) - len(old_lines)
+    if problems:
+        raise PatchConflict("; ".join(problems))
+    result = "\n".join(lines)
+    return result + "\n" if trailing_newline or (lines and not text) else result
+
+
+def _find_block(lines: list[str], block: list[str], expected: int, fuzz: int):
+    if not block:
+        return min(expected, len(lines))
+    candidates = [expected] + [expected + d * s for d in range(1, fuzz + 1) for s in (-1, 1)]
+    for pos in candidates:
+        if 0 <= pos <= len(lines) - len(block) and lines[pos:pos + len(block)] == block:
+            return pos
+    # whitespace-insensitive second pass
+    stripped = [b.rstrip() for b in block]
+    for pos in candidates:
+        if 0 <= pos <= len(lines) - len(block) and [l.rstrip() for l in lines[pos:pos + len(block)]] == stripped:
+            return pos
+    return None
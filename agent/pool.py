@@ -0,0 +1,61 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+def api_key_fingerprint(api_key: str) -> str:
+    """Stable, non-reversible identifier for an API key (safe to use as a dict key or in logs)."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class ResourcePool:
+    """Process-wide LRU pool of expensive objects with idle-time eviction.
+
+    `get(key, factory)` returns the pooled object for `key`, building it with
+    `factory()` on a miss. Entries unused for `idle_ttl` seconds, or beyond
+    `max_entries`, are dropped. Evicted objects are not closed explicitly since a
+    run that fetched them earlier may still be using them; their connections are
+    released once the last reference goes away.
+    """
+
+    def __init__(self, name: str, idle_ttl: float = 900.0, max_entries: int = 32):
+        self.name = name
+        self.idle_ttl = idle_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+            if key in self._entries:
+                value, _ = self._entries.pop(key)
+            else:
+                value = factory()
+                logging.debug(f"{self.name} pool: created entry ({len(self._entries) + 1} total)")
+            self._entries[key] = (value, now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return value
+
+    def evict_idle(self) -> int:
+        """Drop entries idle for longer than `idle_ttl`; returns how many were dropped."""
+        with self._lock:
+            return self._evict_idle(time.monotonic())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict_idle(self, now: float) -> int:
+        expired = [k for k, (_, last_used) in self._entries.items() if now - last_used > self.idle_ttl]
+        for key in expired:
+            del self._entries[key]
+        return len(expired)
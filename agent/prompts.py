@@ -1,3 +1,8 @@
+# Bump whenever a prompt template below changes, so cached responses built
+# from the old wording are not reused.
+PROMPT_VERSION = "3"
+
+
 def planner_prompt(user_prompt: str) -> str:
     PLANNER_PROMPT = f"""
 You are the PLANNER agent. Convert the user prompt into a COMPLETE engineering project plan.
@@ -20,6 +25,7 @@ RULES:
     * Mention how this task depends on or will be used by previous tasks.
     * Include integration details: imports, expected function signatures, data flow.
 - Order tasks so that dependencies are implemented first.
+- In `depends_on`, list the paths of the other files a task needs to exist first (imports, loaded scripts, stylesheets). Leave it empty if the task is independent, so it can be implemented in parallel.
 - Each step must be SELF-CONTAINED but also carry FORWARD the relevant context from earlier tasks.
 
 Project Plan:
@@ -28,6 +34,25 @@ Project Plan:
     return ARCHITECT_PROMPT
 
 
+def architect_file_prompt(plan: str, filepath: str) -> str:
+    ARCHITECT_FILE_PROMPT = f"""
+You are the ARCHITECT agent. The project plan below is still being written; the files listed so far come first in implementation order.
+Break down the work for ONE file, {filepath}, into explicit engineering tasks.
+
+RULES:
+- Create one or more IMPLEMENTATION TASKS, all with filepath {filepath}, in the order they should be implemented.
+- In each task description:
+    * Specify exactly what to implement.
+    * Name the variables, functions, classes, and components to be defined.
+    * Include integration details: imports, expected function signatures, data flow, DOM ids and selectors shared with other files.
+- In `depends_on`, list the paths of the files listed BEFORE {filepath} that it needs to exist first (imports, loaded scripts, stylesheets). Leave it empty if it is independent.
+
+Project Plan (so far):
+{plan}
+    """
+    return ARCHITECT_FILE_PROMPT
+
+
 def coder_system_prompt() -> str:
     CODER_SYSTEM_PROMPT = """
 You are the CODER agent.
@@ -35,10 +60,12 @@ You are implementing a specific engineering task.
 You have access to tools to read and write files.
 
 Always:
-- Review all existing files to maintain compatibility.
+- Use the symbols listed in the task (functions, classes, DOM ids, selectors of the files it depends on) to stay compatible with them. Only read_file another file when you need more than its signatures.
 - Implement the FULL file content, integrating with other modules.
+- Create new files with write_file. Change existing files with edit_file search/replace hunks (copy the search text exactly from the current file); only rewrite a whole file when most of it changes. If an edit reports CONFLICT, re-read the file and retry.
 - Maintain consistent naming of variables, functions, and imports.
 - When a module is imported from another file, ensure it exists and is implemented as described.
+- Use run_cmd only when a task needs a command, e.g. installing the project's dependencies (`npm install`, `pip install -r requirements.txt`) or a quick check; pass a larger timeout for slow commands.
 
 Tool usage rules (critical):
 - When calling tools, ensure arguments are STRICT, valid JSON. Use only double quotes, no trailing commas, no markdown/code fences.
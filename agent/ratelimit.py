@@ -0,0 +1,486 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Optional
+
+import groq
+import httpx
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_groq.chat_models import ChatGroq
+
+from agent import metrics, tools
+
+
+# Starting budgets. 0 (the default) leaves a budget unlimited until the provider's
+# x-ratelimit-* response headers, or a 429, say what the key is allowed.
+DEFAULT_RPM = int(os.getenv("CODEPILOT_RPM", "0"))
+DEFAULT_TPM = int(os.getenv("CODEPILOT_TPM", "0"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("CODEPILOT_LLM_CONCURRENCY", "8"))
+MAX_ATTEMPTS = int(os.getenv("CODEPILOT_LLM_ATTEMPTS", "6"))
+
+# Completion tokens reserved per call before the real usage is known.
+_COMPLETION_ESTIMATE = 1024
+
+_RETRYABLE = (groq.RateLimitError, groq.InternalServerError, groq.APIConnectionError, groq.APITimeoutError)
+
+
+# -------------------------------
+# Provider limits
+# -------------------------------
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def _seconds(value: str) -> Optional[float]:
+    """Parse a reset time such as `7.66s`, `2m59.56s` or `120ms`."""
+    try:
+        return float(value)
+    except ValueError:
+        parts = _DURATION.findall(value)
+        return sum(float(n) * _UNITS[unit] for n, unit in parts) if parts else None
+
+
+def parse_rate_limit_headers(headers: Any) -> dict[str, tuple[float, float, Optional[float]]]:
+    """(limit, remaining, seconds until reset) for each budget ("requests", "tokens") in `headers`."""
+    budgets = {}
+    for kind in ("requests", "tokens"):
+        limit, remaining = headers.get(f"x-ratelimit-limit-{kind}"), headers.get(f"x-ratelimit-remaining-{kind}")
+        if limit is None or remaining is None:
+            continue
+        try:
+            budgets[kind] = (float(limit), float(remaining), _seconds(headers.get(f"x-ratelimit-reset-{kind}") or ""))
+        except ValueError:
+            continue
+    return budgets
+
+
+@dataclass
+class _Bucket:
+    """A budget refilled continuously at `rate` per second up to `capacity`; unlimited by default."""
+
+    capacity: float = math.inf
+    rate: float = math.inf
+    level: float = math.inf
+
+    @classmethod
+    def per_minute(cls, limit: int) -> "_Bucket":
+        return cls(float(limit), limit / 60, float(limit)) if limit > 0 else cls()
+
+    def refill(self, elapsed: float) -> None:
+        if elapsed > 0 and self.level < self.capacity:
+            self.level = min(self.capacity, self.level + elapsed * self.rate)
+
+    def wait(self, amount: float) -> float:
+        """Seconds until `amount` is available."""
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def learn(self, limit: float, remaining: float, reset_s: Optional[float]) -> None:
+        """Adopt the provider's view: `remaining` of `limit` left, and full again in `reset_s`."""
+        self.capacity = limit
+        if reset_s and remaining < limit:
+            self.rate = (limit - remaining) / reset_s
+        elif math.isinf(self.rate):
+            self.rate = limit / 60  # a per-minute window until a reset time says otherwise
+        self.level = min(self.level, remaining)
+
+
+# -------------------------------
+# Limiter
+# -------------------------------
+@dataclass(eq=False)
+class _Waiter:
+    tokens: int
+    run_key: str
+    wake: Callable[[], None]
+    granted: bool = False
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class RateLimiter:
+    """Requests and tokens budgets for one API key, shared by every run.
+
+    Both budgets are token buckets refilled continuously. They start unlimited
+    (or at `rpm`/`tpm` per minute) and follow the x-ratelimit-* headers of the
+    provider's responses, fed in through `on_response`. Waiting calls are queued
+    per run and served round-robin, so a run with many parallel coders cannot
+    starve another run. Concurrency follows AIMD: it grows by about one per
+    window of successful calls while latency stays near its baseline, and is
+    halved on a 429 or a latency spike. A 429's retry-after pauses all calls.
+
+    The limiter is thread-safe and can be awaited from different event loops
+    (Streamlit runs each session's generation in its own loop), or waited on
+    from sync callers with `acquire_sync`.
+    """
+
+    def __init__(self, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, min_concurrency: int = 1):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(max(min_concurrency, min(4, max_concurrency)))
+        self._requests = _Bucket.per_minute(rpm)
+        self._tokens = _Bucket.per_minute(tpm)
+        self._refilled = time.monotonic()
+        self._inflight = 0
+        self._paused_until = 0.0
+        self._queues: "OrderedDict[str, deque[_Waiter]]" = OrderedDict()
+        self._latency: Optional[float] = None  # EWMA of seconds per call
+        self._baseline: Optional[float] = None  # slowly rising minimum of the EWMA
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    # ---- acquiring ----
+    async def acquire(self, tokens: int, run_key: str = "default") -> float:
+        """Wait for a slot and budget for a call of about `tokens` tokens; returns seconds waited."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = _Waiter(tokens, run_key, lambda: loop.call_soon_threadsafe(_resolve, future))
+        self._enqueue(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        return time.monotonic() - waiter.enqueued
+
+    def acquire_sync(self, tokens: int, run_key: str = "default") -> float:
+        """Blocking `acquire` for sync callers."""
+        event = threading.Event()
+        waiter = _Waiter(tokens, run_key, event.set)
+        self._enqueue(waiter)
+        try:
+            event.wait()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        return time.monotonic() - waiter.enqueued
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        with self._lock:
+            self._queues.setdefault(waiter.run_key, deque()).append(waiter)
+        self._dispatch()
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if waiter.granted:
+                self._inflight -= 1
+            else:
+                queue = self._queues.get(waiter.run_key)
+                if queue and waiter in queue:
+                    queue.remove(waiter)
+                    if not queue:
+                        del self._queues[waiter.run_key]
+        self._dispatch()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._refilled
+        self._refilled = now
+        self._requests.refill(elapsed)
+        self._tokens.refill(elapsed)
+
+    def _dispatch(self) -> None:
+        """Grant queued calls while budgets allow; otherwise wake up again when they will."""
+        wake_in = None
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            while self._queues and self._inflight < math.floor(self.concurrency):
+                if now < self._paused_until:
+                    wake_in = self._paused_until - now
+                    break
+                run_key, queue = next(iter(self._queues.items()))
+                waiter = queue[0]
+                # a call larger than the whole budget waits for a full bucket rather than forever
+                tokens = min(waiter.tokens, self._tokens.capacity)
+                if self._requests.level < 1 or self._tokens.level < tokens:
+                    wake_in = max(self._requests.wait(1), self._tokens.wait(tokens), 0.05)
+                    break
+                queue.popleft()
+                # round-robin: this run goes to the back of the line
+                del self._queues[run_key]
+                if queue:
+                    self._queues[run_key] = queue
+                self._requests.level -= 1
+                self._tokens.level -= tokens
+                self._inflight += 1
+                waiter.granted = True
+                waiter.wake()
+            if wake_in is not None and self._timer is None:
+                self._timer = threading.Timer(wake_in, self._on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+        self._dispatch()
+
+    # ---- learning the limits ----
+    def observe_headers(self, headers: Any) -> None:
+        """Seed the budgets from the provider's x-ratelimit-* headers."""
+        budgets = parse_rate_limit_headers(headers)
+        if not budgets:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            for kind, (limit, remaining, reset_s) in budgets.items():
+                (self._requests if kind == "requests" else self._tokens).learn(limit, remaining, reset_s)
+        self._dispatch()
+
+    def on_response(self, response: httpx.Response) -> None:
+        """httpx response hook feeding every response's headers to `observe_headers`."""
+        self.observe_headers(response.headers)
+
+    async def aon_response(self, response: httpx.Response) -> None:
+        self.on_response(response)
+
+    # ---- releasing ----
+    def release(self, reserved: int, used: Optional[int], latency: float) -> None:
+        """Return a slot after a successful call, settling the token budget with the real usage."""
+        with self._lock:
+            self._inflight -= 1
+            if used is not None:
+                self._tokens.level = min(self._tokens.capacity, self._tokens.level + reserved - used)
+            self._observe_latency(latency)
+        self._dispatch()
+
+    def release_failed(self, rate_limited: bool, retry_after: Optional[float]) -> None:
+        """Return a slot after a failed call; 429s shrink concurrency and pause everyone."""
+        with self._lock:
+            self._inflight -= 1
+            if rate_limited:
+                self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                # the provider says we are out of budget, whatever our buckets think
+                self._requests.level = min(self._requests.level, 0)
+                pause = retry_after if retry_after is not None else min(60.0, max(1.0, self._requests.wait(1)))
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+                logging.warning(f"Rate limited: pausing LLM calls for {pause:.1f}s, concurrency {self.concurrency:.1f}")
+        self._dispatch()
+
+    def _observe_latency(self, latency: float) -> None:
+        self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+        if self._baseline is None or self._latency < self._baseline:
+            self._baseline = self._latency
+        else:
+            self._baseline *= 1.01  # let the baseline follow slow drifts in prompt size
+        if self._latency > 2 * self._baseline:
+            self.concurrency = max(self.min_concurrency, self.concurrency * 0.75)
+        else:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "concurrency": round(self.concurrency, 2), "inflight": self._inflight,
+                "queued": sum(len(q) for q in self._queues.values()),
+                # None while a budget is still unlimited
+                "requests_left": round(self._requests.level, 1) if math.isfinite(self._requests.level) else None,
+                "tokens_left": int(self._tokens.level) if math.isfinite(self._tokens.level) else None,
+                "latency_s": round(self._latency, 3) if self._latency is not None else None,
+            }
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(key: str) -> RateLimiter:
+    """The limiter shared by every client of one API key (pass its fingerprint)."""
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter()
+        return limiter
+
+
+# -------------------------------
+# HTTP transport
+# -------------------------------
+class LoopLocalTransport(httpx.AsyncBaseTransport):
+    """Async transport keeping one connection pool per event loop.
+
+    A pooled client outlives the `asyncio.run()` of the run that created it, and
+    httpx connections cannot be used from another loop once theirs is closed.
+    """
+
+    def __init__(self, **kwargs: Any):
+        self._kwargs = kwargs
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for closed in [l for l in self._transports if l.is_closed()]:
+                del self._transports[closed]  # its connections are closed when collected
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = httpx.AsyncHTTPTransport(**self._kwargs)
+            return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        with self._lock:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+# -------------------------------
+# Rate-limited ChatGroq
+# -------------------------------
+def estimate_call_tokens(messages: list[BaseMessage]) -> int:
+    chars = sum(len(m.content) if isinstance(m.content, str) else len(str(m.content)) for m in messages)
+    return chars // 4 + _COMPLETION_ESTIMATE
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, from a 429's headers."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    return min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def _usage(result: ChatResult) -> Optional[int]:
+    for gen in result.generations:
+        usage = getattr(gen.message, "usage_metadata", None)
+        if usage:
+            return usage.get("total_tokens")
+    return ((result.llm_output or {}).get("token_usage") or {}).get("total_tokens")
+
+
+class RateLimitedChatGroq(ChatGroq):
+    """ChatGroq whose calls go through a shared RateLimiter and retry 429s and transient errors.
+
+    Create it with `max_retries=0` so the SDK does not retry behind the limiter's back.
+    """
+
+    limiter: Any = None  # `rate_limiter` is taken by BaseChatModel
+
+    def _run_key(self) -> str:
+        try:
+            return str(tools.get_project_root())
+        except RuntimeError:
+            return "default"
+
+    async def _acquire(self, tokens: int) -> None:
+        self._record_wait(await self.limiter.acquire(tokens, self._run_key()))
+
+    def _acquire_sync(self, tokens: int) -> None:
+        self._record_wait(self.limiter.acquire_sync(tokens, self._run_key()))
+
+    @staticmethod
+    def _record_wait(waited: float) -> None:
+        recorder = metrics.current_recorder()
+        if recorder is not None and waited > 0.01:
+            recorder.record("ratelimit", wait_s=round(waited, 4))
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.limiter is None:
+            return await super()._agenerate(messages, stop, run_manager, **kwargs)
+        reserved = estimate_call_tokens(messages)
+        for attempt in range(MAX_ATTEMPTS):
+            await self._acquire(reserved)
+            started = time.monotonic()
+            try:
+                result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+            except _RETRYABLE as e:
+                self._failed(e)
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                continue
+            except BaseException:
+                self.limiter.release(reserved, None, time.monotonic() - started)
+                raise
+            self.limiter.release(reserved, _usage(result), time.monotonic() - started)
+            return result
+
+    async def _astream(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        if self.limiter is None:
+            async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+                yield chunk
+            return
+        reserved = estimate_call_tokens(messages)
+        for attempt in range(MAX_ATTEMPTS):
+            await self._acquire(reserved)
+            started = time.monotonic()
+            used = None
+            yielded = False
+            try:
+                async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+                    yielded = True
+                    usage = getattr(chunk.message, "usage_metadata", None)
+                    if usage:
+                        used = usage.get("total_tokens") or used
+                    yield chunk
+            except _RETRYABLE as e:
+                self._failed(e)
+                # once output reached the caller the call cannot be replayed
+                if yielded or attempt == MAX_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                continue
+            except BaseException:
+                self.limiter.release(reserved, None, time.monotonic() - started)
+                raise
+            self.limiter.release(reserved, used, time.monotonic() - started)
+            return
+
+    def _failed(self, error: Exception) -> None:
+        rate_limited = isinstance(error, groq.RateLimitError)
+        self.limiter.release_failed(rate_limited, retry_after(error) if rate_limited else None)
+        logging.warning(f"LLM call failed ({type(error).__name__}), retrying")
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        # 429s wait in the limiter's pause instead; other errors back off here
+        return 0.0 if isinstance(error, groq.RateLimitError) else _backoff(attempt)
+
+    def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.limiter is None:
+            return super()._generate(messages, stop, run_manager, **kwargs)
+        reserved = estimate_call_tokens(messages)
+        for attempt in range(MAX_ATTEMPTS):
+            self._acquire_sync(reserved)
+            started = time.monotonic()
+            try:
+                result = super()._generate(messages, stop, run_manager, **kwargs)
+            except _RETRYABLE as e:
+                self._failed(e)
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+                time.sleep(self._retry_delay(e, attempt))
+                continue
+            except BaseException:
+                self.limiter.release(reserved, None, time.monotonic() - started)
+                raise
+            self.limiter.release(reserved, _usage(result), time.monotonic() - started)
+            return result
@@ -0,0 +1,313 @@
+import contextlib
+import fcntl
+import logging
+import os
+import pathlib
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from agent.manifest import forget_manifest
+from agent.objects import OBJECTS_DIRNAME, get_object_store
+from agent.packaging import untrack_project
+from agent.symbols import forget_symbol_index
+
+
+# -------------------------------
+# Retention of generated projects
+# -------------------------------
+# Project folders are evicted least recently used first once the folder holding
+# them exceeds its size budget, and regardless of size once they have not been
+# accessed for the age budget. Accesses touch a marker per project under
+# `<base>/.retention`; a run holds a shared flock on the project's lock file
+# there, so projects being generated (in any process) are never evicted.
+
+RETENTION_ENABLED = os.getenv("CODEPILOT_RETENTION", "1") == "1"
+MAX_BYTES = int(float(os.getenv("CODEPILOT_RETENTION_MAX_BYTES", str(2 * 1024 ** 3))))
+MAX_AGE_S = float(os.getenv("CODEPILOT_RETENTION_MAX_AGE", str(7 * 24 * 3600)))  # 0 keeps projects forever
+# Projects accessed this recently are kept even when over budget.
+GRACE_S = float(os.getenv("CODEPILOT_RETENTION_GRACE", "600"))
+SWEEP_INTERVAL_S = float(os.getenv("CODEPILOT_RETENTION_INTERVAL", "600"))
+
+RETENTION_DIRNAME = ".retention"
+
+
+@dataclass
+class ProjectUsage:
+    root: pathlib.Path
+    last_access: float
+    bytes: int  # apparent size of its files
+    exclusive_bytes: int  # what deleting it frees (files not shared with other projects)
+
+
+def _markers(project_root: pathlib.Path) -> Optional[pathlib.Path]:
+    """The marker folder of the project's base folder, None if the base is not managed."""
+    path = project_root.parent / RETENTION_DIRNAME
+    return path if path.is_dir() else None
+
+
+def manage(base_dir: pathlib.Path) -> None:
+    """Track accesses to the projects created under `base_dir` from now on."""
+    (pathlib.Path(base_dir) / RETENTION_DIRNAME).mkdir(parents=True, exist_ok=True)
+
+
+def touch(project_root: str | pathlib.Path) -> None:
+    """Record an access to a project (creation, a graph step, a download)."""
+    root = pathlib.Path(project_root).resolve()
+    markers = _markers(root)
+    if markers is None:
+        return
+    try:
+        (markers / root.name).touch()
+    except OSError as e:
+        logging.debug(f"Could not record access to {root.name}: {e}")
+
+
+def last_access(project_root: pathlib.Path) -> float:
+    root = pathlib.Path(project_root)
+    for path in (root.parent / RETENTION_DIRNAME / root.name, root):
+        try:
+            return path.stat().st_mtime
+        except FileNotFoundError:
+            continue
+    return 0.0
+
+
+# -------------------------------
+# Leases
+# -------------------------------
+_leases: dict[pathlib.Path, tuple[int, int]] = {}  # root -> (fd, holders)
+_leases_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def lease(project_root: str | pathlib.Path) -> Iterator[None]:
+    """Keep `project_root` from being evicted while the block runs; re-entrant."""
+    root = pathlib.Path(project_root).resolve()
+    markers = _markers(root)
+    if markers is None:
+        yield  # not under a folder the sweeper manages
+        return
+    touch(root)
+    with _leases_lock:
+        fd, holders = _leases.get(root, (-1, 0))
+        if not holders:
+            fd = os.open(markers / f"{root.name}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_SH)
+        _leases[root] = (fd, holders + 1)
+    try:
+        yield
+    finally:
+        touch(root)
+        with _leases_lock:
+            fd, holders = _leases.pop(root)
+            if holders > 1:
+                _leases[root] = (fd, holders - 1)
+            else:
+                os.close(fd)  # releases the flock
+
+
+@contextlib.contextmanager
+def _evicting(root: pathlib.Path) -> Iterator[bool]:
+    """Yields whether `root` could be locked for eviction (no run holds it)."""
+    lock_path = root.parent / RETENTION_DIRNAME / f"{root.name}.lock"
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+
+# -------------------------------
+# Measuring
+# -------------------------------
+def _walk_files(root: pathlib.Path) -> Iterator[os.stat_result]:
+    stack = [root]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(pathlib.Path(entry.path))
+                else:
+                    yield entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+
+def disk_usage(base_dir: pathlib.Path) -> int:
+    """Bytes used under `base_dir`, counting hardlinked files once."""
+    seen, total = set(), 0
+    for st in _walk_files(pathlib.Path(base_dir)):
+        if (st.st_dev, st.st_ino) not in seen:
+            seen.add((st.st_dev, st.st_ino))
+            total += st.st_size
+    return total
+
+
+def project_usage(project_root: pathlib.Path) -> ProjectUsage:
+    root = pathlib.Path(project_root)
+    # a blob of the object store has one link of its own
+    shared_links = 2 if (root.parent / OBJECTS_DIRNAME).is_dir() else 1
+    size = exclusive = 0
+    for st in _walk_files(root):
+        size += st.st_size
+        if st.st_nlink <= shared_links:
+            exclusive += st.st_size
+    return ProjectUsage(root, last_access(root), size, exclusive)
+
+
+def list_projects(base_dir: pathlib.Path) -> list[ProjectUsage]:
+    """Project folders under `base_dir`, least recently accessed first."""
+    base_dir = pathlib.Path(base_dir)
+    if not base_dir.is_dir():
+        return []
+    projects = [project_usage(p) for p in base_dir.iterdir() if p.is_dir() and not p.name.startswith(".")]
+    return sorted(projects, key=lambda p: p.last_access)
+
+
+# -------------------------------
+# Evicting
+# -------------------------------
+_stats = {
+    "sweeps": 0, "projects_evicted": 0, "bytes_freed": 0,
+    "projects": 0, "bytes_used": 0, "last_sweep_at": None, "last_sweep_s": None, "errors": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def retention_stats() -> dict:
+    """Counters of the sweeps run in this process and the usage found by the last one."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _forget(root: pathlib.Path) -> None:
+    """Drop what the in-process indexes and the shared databases know about an evicted project."""
+    forget_manifest(root)
+    forget_symbol_index(root)
+    untrack_project(root)
+    # langgraph and numpy are only loaded when something is actually evicted
+    from agent.checkpoint import get_checkpointer
+    from agent.retrieval import RETRIEVAL_ENABLED, get_index
+    try:
+        get_checkpointer().delete_thread(root.name)
+    except Exception as e:
+        logging.warning(f"Could not delete the checkpoints of {root.name}: {e}")
+    try:
+        if RETRIEVAL_ENABLED:
+            # its prompt and plan stay indexed for plan reuse; its file texts go
+            get_index().forget(root.name, kind="file")
+    except Exception as e:
+        logging.warning(f"Could not remove {root.name} from the similarity index: {e}")
+
+
+def evict(project: ProjectUsage) -> bool:
+    """Delete a project folder unless a run holds it. Returns whether it was deleted."""
+    root = project.root
+    with _evicting(root) as free:
+        if not free:
+            return False
+        shutil.rmtree(root, ignore_errors=True)
+        if root.exists():
+            return False
+        _forget(root)
+        with contextlib.suppress(FileNotFoundError):
+            (root.parent / RETENTION_DIRNAME / root.name).unlink()
+    # the lock file is only removed once no one can be waiting on it
+    with contextlib.suppress(FileNotFoundError):
+        (root.parent / RETENTION_DIRNAME / f"{root.name}.lock").unlink()
+    logging.info(f"Evicted project {root.name} ({project.bytes} bytes, idle {time.time() - project.last_access:.0f}s)")
+    return True
+
+
+def sweep(base_dir: pathlib.Path, max_bytes: int = MAX_BYTES, max_age_s: float = MAX_AGE_S,
+          grace_s: float = GRACE_S) -> dict:
+    """Evict expired projects, then the least recently used ones until `base_dir` fits `max_bytes`."""
+    started = time.monotonic()
+    base_dir = pathlib.Path(base_dir)
+    manage(base_dir)
+    now = time.time()
+    projects = list_projects(base_dir)
+    used = before = disk_usage(base_dir)
+    evicted = 0
+    for project in projects:  # least recently used first
+        idle = now - project.last_access
+        expired = max_age_s > 0 and idle > max_age_s
+        if idle < grace_s or not (expired or used > max_bytes):
+            continue
+        if evict(project):
+            evicted += 1
+            used -= project.exclusive_bytes  # estimate until the object store is collected
+    if evicted:
+        if (base_dir / OBJECTS_DIRNAME).is_dir():
+            get_object_store(base_dir).gc()  # blobs only the evicted projects linked to
+        used = disk_usage(base_dir)
+    freed = before - used
+
+    result = {
+        "projects_evicted": evicted, "bytes_freed": freed,
+        "projects": len(projects) - evicted, "bytes_used": used,
+    }
+    elapsed = round(time.monotonic() - started, 3)
+    with _stats_lock:
+        _stats["sweeps"] += 1
+        for key in ("projects_evicted", "bytes_freed"):
+            _stats[key] += result[key]
+        _stats.update(projects=result["projects"], bytes_used=result["bytes_used"],
+                      last_sweep_at=round(now, 3), last_sweep_s=elapsed)
+    if evicted:
+        logging.info(f"Retention sweep of {base_dir}: evicted {evicted} project(s), freed {freed} bytes in {elapsed}s")
+    return result
+
+
+# -------------------------------
+# Background sweeper
+# -------------------------------
+_sweepers: dict[pathlib.Path, threading.Thread] = {}
+_sweepers_lock = threading.Lock()
+
+
+def _sweep_forever(base_dir: pathlib.Path, interval_s: float) -> None:
+    while True:
+        try:
+            sweep(base_dir)
+        except Exception:
+            logging.exception(f"Retention sweep of {base_dir} failed")
+            with _stats_lock:
+                _stats["errors"] += 1
+        time.sleep(interval_s)
+
+
+def start_sweeper(base_dir: pathlib.Path, interval_s: float = SWEEP_INTERVAL_S) -> None:
+    """Sweep `base_dir` now and every `interval_s` seconds in a daemon thread (once per process)."""
+    if not RETENTION_ENABLED:
+        return
+    base_dir = pathlib.Path(base_dir).resolve()
+    manage(base_dir)
+    with _sweepers_lock:
+        if base_dir in _sweepers:
+            return
+        thread = threading.Thread(target=_sweep_forever, args=(base_dir, interval_s),
+                                  name=f"retention-{base_dir.name}", daemon=True)
+        _sweepers[base_dir] = thread
+        thread.start()
+
+
+if __name__ == "__main__":
+    # One sweep from the command line: python -m agent.retention [projects_dir]
+    import json
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(sweep(pathlib.Path(sys.argv[1] if len(sys.argv) > 1 else "generated_projects")), indent=2))
@@ -0,0 +1,352 @@
+import contextlib
+import logging
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import numpy as np
+
+from agent.cache import DEFAULT_CACHE_DIR, normalize_prompt
+from agent.manifest import IGNORED_DIRS
+from agent.states import File, Plan
+
+
+# -------------------------------
+# Similarity index over past generations
+# -------------------------------
+# Prompts (with the plan they produced) and generated files are embedded as
+# hashed TF-IDF vectors: word unigrams and bigrams are hashed into DIM buckets
+# with sublinear term frequency, and IDF weights come from document frequencies
+# kept up to date as documents are added. Vectors live in SQLite and in one
+# in-memory matrix, so a query is a single matrix-vector product: the IDF
+# weights are applied to the query twice instead of to every document, and the
+# documents' IDF-weighted norms are cached until the next document is added.
+# Each kind keeps at most MAX_DOCUMENTS documents; the oldest are dropped first.
+
+RETRIEVAL_PATH = pathlib.Path(os.getenv("CODEPILOT_RETRIEVAL_DB", DEFAULT_CACHE_DIR / "retrieval.db"))
+RETRIEVAL_ENABLED = os.getenv("CODEPILOT_RETRIEVAL", "1") == "1"
+# Cosine similarity above which a past plan is reused instead of calling the planner.
+PLAN_REUSE_THRESHOLD = float(os.getenv("CODEPILOT_PLAN_REUSE_THRESHOLD", "0.9"))
+# Cosine similarity above which a past file is shown to the coder as a reference.
+REFERENCE_THRESHOLD = float(os.getenv("CODEPILOT_REFERENCE_THRESHOLD", "0.08"))
+REFERENCE_MAX_CHARS = int(os.getenv("CODEPILOT_REFERENCE_MAX_CHARS", "6000"))
+# Per kind; a document takes DIM * 4 bytes (16 KiB) of memory.
+MAX_DOCUMENTS = int(os.getenv("CODEPILOT_RETRIEVAL_MAX_DOCS", "5000"))
+
+# Hand-kept example projects shipped with the repo, indexed on first use.
+SEED_DIRS = [
+    pathlib.Path(__file__).resolve().parent.parent / name
+    for name in ("todo_generated_project", "tictactoe", "sketching_app")
+]
+
+DIM = 1 << 12
+_MAX_FILE_BYTES = 256 * 1024
+_TEXT_SUFFIXES = frozenset({
+    ".html", ".htm", ".css", ".scss", ".js", ".jsx", ".ts", ".tsx", ".mjs", ".vue", ".svelte",
+    ".py", ".json", ".md", ".txt", ".toml", ".yaml", ".yml", ".sql", ".sh",
+})
+_TOKEN = re.compile(r"[a-z0-9_]+")
+
+
+def embed(text: str) -> np.ndarray:
+    """Hashed, sublinear term frequencies of the words and word pairs in `text`."""
+    words = _TOKEN.findall(text.lower())
+    terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not terms:
+        return np.zeros(DIM, dtype=np.float32)
+    buckets = np.fromiter((zlib.crc32(t.encode()) % DIM for t in terms), dtype=np.int64, count=len(terms))
+    return np.log1p(np.bincount(buckets, minlength=DIM)).astype(np.float32)
+
+
+@dataclass
+class Match:
+    score: float
+    kind: str  # "plan" or "file"
+    project: str
+    path: str
+    text: str
+    payload: Optional[str] = None
+
+
+class SimilarityIndex:
+    """Incrementally updated TF-IDF index of past prompts/plans and files."""
+
+    def __init__(self, path: pathlib.Path = RETRIEVAL_PATH):
+        self.path = pathlib.Path(path)
+        self._lock = threading.RLock()
+        self._unload()
+
+    def _unload(self) -> None:
+        self._loaded = False
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._kinds = np.zeros(0, dtype="U4")
+        # project and file extension per row, so searches can filter before ranking
+        self._projects = np.zeros(0, dtype=object)
+        self._suffixes = np.zeros(0, dtype=object)
+        self._matrix = np.zeros((0, DIM), dtype=np.float32)
+        self._size = 0
+        self._df = np.zeros(DIM, dtype=np.float64)
+        self._norms: Optional[np.ndarray] = None  # IDF-weighted document norms, None once stale
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # -------------------------------
+    # Loading and adding
+    # -------------------------------
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " id INTEGER PRIMARY KEY, kind TEXT NOT NULL, project TEXT NOT NULL, path TEXT NOT NULL,"
+                " text TEXT NOT NULL, payload TEXT, vector BLOB NOT NULL, UNIQUE (kind, project, path))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            rows = conn.execute("SELECT id, kind, project, path, vector FROM documents ORDER BY id").fetchall()
+        for doc_id, kind, project, path, vector in rows:
+            self._append(doc_id, kind, project, path, np.frombuffer(vector, dtype=np.float32))
+        self._loaded = True
+        logging.info(f"Loaded similarity index with {self._size} document(s)")
+
+    def _append(self, doc_id: int, kind: str, project: str, path: str, vector: np.ndarray) -> None:
+        if self._size == len(self._matrix):
+            capacity = max(64, 2 * self._size)
+            self._matrix = np.resize(self._matrix, (capacity, DIM))
+            self._ids = np.resize(self._ids, capacity)
+            self._kinds = np.resize(self._kinds, capacity)
+            self._projects = np.resize(self._projects, capacity)
+            self._suffixes = np.resize(self._suffixes, capacity)
+        self._matrix[self._size] = vector
+        self._ids[self._size] = doc_id
+        self._kinds[self._size] = kind
+        self._projects[self._size] = project
+        self._suffixes[self._size] = pathlib.PurePosixPath(path).suffix
+        self._size += 1
+        self._df += vector > 0
+        self._norms = None
+
+    def _drop_oldest(self, conn: sqlite3.Connection, kind: str) -> None:
+        """Delete the oldest documents of `kind` once there are more than MAX_DOCUMENTS."""
+        n = self._size
+        rows = np.flatnonzero(self._kinds[:n] == kind)
+        if len(rows) <= MAX_DOCUMENTS:
+            return
+        # a tenth more than needed, so a full index is not compacted on every add
+        drop = rows[:len(rows) - MAX_DOCUMENTS + MAX_DOCUMENTS // 10]  # rows are in id order
+        conn.executemany("DELETE FROM documents WHERE id = ?", [(int(i),) for i in self._ids[drop]])
+        self._df -= np.count_nonzero(self._matrix[drop] > 0, axis=0)
+        keep = np.ones(n, dtype=bool)
+        keep[drop] = False
+        for name in ("_matrix", "_ids", "_kinds", "_projects", "_suffixes"):
+            setattr(self, name, getattr(self, name)[:n][keep])
+        self._size = int(keep.sum())
+        self._norms = None
+        logging.info(f"Dropped {len(drop)} old {kind} document(s) from the similarity index")
+
+    def add(self, kind: str, project: str, path: str, text: str, payload: Optional[str] = None,
+            context: str = "") -> bool:
+        """Index a document; returns False if (kind, project, path) is already indexed.
+
+        `context` (e.g. the project's prompt) is embedded along with `text` but not stored.
+        """
+        vector = embed(f"{context}\n{path}\n{text}")
+        with self._lock:
+            self._load()
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO documents (kind, project, path, text, payload, vector) VALUES (?, ?, ?, ?, ?, ?)",
+                    (kind, project, path, text, payload, vector.tobytes()),
+                )
+                if not cursor.rowcount:
+                    return False
+                self._append(cursor.lastrowid, kind, project, path, vector)
+                self._drop_oldest(conn, kind)
+            return True
+
+    def add_project(self, project: str, root: pathlib.Path, prompt: Optional[str] = None,
+                    plan: Optional[Plan] = None) -> int:
+        """Index a project's prompt and plan, and its text files. Returns the documents added."""
+        added = 0
+        if prompt:
+            added += self.add("plan", project, "", normalize_prompt(prompt), plan.model_dump_json() if plan else None)
+        for rel, content in _text_files(pathlib.Path(root)):
+            added += self.add("file", project, rel, content, context=prompt or "")
+        return added
+
+    def forget(self, project: str, kind: Optional[str] = None) -> int:
+        """Remove a project's documents (only those of `kind` if given). Returns how many."""
+        with self._lock:
+            self._load()
+            with self._connect() as conn:
+                if kind is None:
+                    cursor = conn.execute("DELETE FROM documents WHERE project = ?", (project,))
+                else:
+                    cursor = conn.execute("DELETE FROM documents WHERE project = ? AND kind = ?", (project, kind))
+            if cursor.rowcount:
+                self._unload()  # the matrix and document frequencies are rebuilt on next use
+            return cursor.rowcount
+
+    def seed(self, dirs: list[pathlib.Path] = SEED_DIRS, database: bool = True) -> int:
+        """Index the example projects and the projects database once."""
+        with self._lock:
+            self._load()
+            with self._connect() as conn:
+                if conn.execute("SELECT 1 FROM meta WHERE key = 'seeded'").fetchone():
+                    return 0
+            added = 0
+            for folder in dirs:
+                if folder.is_dir():
+                    plan = plan_from_folder(folder)
+                    summary = f"{plan.name}. {plan.description} {' '.join(plan.features)}"
+                    added += self.add_project(f"seed:{folder.name}", folder, summary, plan)
+            if database:
+                added += self._seed_database()
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seeded', '1')")
+            logging.info(f"Seeded similarity index with {added} document(s)")
+            return added
+
+    def _seed_database(self) -> int:
+        from agent.database import DATABASE_PATH, get_engine, iter_project_files, list_projects
+
+        if not DATABASE_PATH.exists():
+            return 0
+        added = 0
+        engine = get_engine()
+        for project in list_projects(limit=1000, engine=engine):
+            key = f"db:{project.id}"
+            added += self.add("plan", key, "", normalize_prompt(project.prompt))
+            for rel, data in iter_project_files(project.id, engine=engine):
+                if pathlib.PurePosixPath(rel).suffix in _TEXT_SUFFIXES and len(data) <= _MAX_FILE_BYTES:
+                    text = data.decode("utf-8", errors="replace")
+                    added += self.add("file", key, rel, text, context=project.prompt)
+        return added
+
+    # -------------------------------
+    # Queries
+    # -------------------------------
+    def search(self, text: str, kind: str, k: int = 5, suffix: Optional[str] = None,
+               exclude_project: Optional[str] = None) -> list[Match]:
+        """The `k` documents of `kind` most similar to `text`, best first."""
+        with self._lock:
+            self._load()
+            n = self._size
+            if not n:
+                return []
+            idf = (np.log((1 + n) / (1 + self._df)) + 1).astype(np.float32)
+            docs = self._matrix[:n]
+            if self._norms is None:
+                # sqrt(sum_j (d_j * idf_j)^2) per document, without a weighted copy of the matrix
+                self._norms = np.sqrt(np.einsum("ij,ij,j->i", docs, docs, idf * idf))
+            query = embed(text) * idf
+            norms = self._norms * (np.linalg.norm(query) or 1.0)
+            candidates = self._kinds[:n] == kind
+            if suffix:
+                candidates &= self._suffixes[:n] == suffix
+            if exclude_project is not None:
+                candidates &= self._projects[:n] != exclude_project
+            # (d * idf) . (q * idf) == d . (q * idf^2)
+            scores = np.where(candidates, docs @ (query * idf) / np.maximum(norms, 1e-9), -1.0)
+            order = np.argsort(-scores)[:k]
+            ids = self._ids[:n]
+
+            matches = []
+            with self._connect() as conn:
+                for i in order:
+                    if scores[i] <= 0:
+                        break
+                    row = conn.execute(
+                        "SELECT project, path, text, payload FROM documents WHERE id = ?", (int(ids[i]),)
+                    ).fetchone()
+                    project, path, doc_text, payload = row
+                    matches.append(Match(float(scores[i]), kind, project, path, doc_text, payload))
+            return matches
+
+    def similar_plan(self, prompt: str, threshold: float = PLAN_REUSE_THRESHOLD) -> Optional[Plan]:
+        """The plan of a past prompt that is a near duplicate of `prompt`, if any."""
+        for match in self.search(normalize_prompt(prompt), "plan", k=5):
+            if match.score < threshold:
+                break
+            if match.payload:
+                logging.info(f"Reusing the plan of {match.project} (similarity {match.score:.2f})")
+                return Plan.model_validate_json(match.payload)
+        return None
+
+    def reference_file(self, prompt: str, filepath: str, description: str, exclude_project: Optional[str] = None,
+                       threshold: float = REFERENCE_THRESHOLD) -> Optional[Match]:
+        """The past file most similar to `filepath` of a project for `prompt`, with the same extension."""
+        suffix = pathlib.PurePosixPath(filepath).suffix or None
+        query = f"{prompt}\n{filepath}\n{description}"
+        matches = self.search(query, "file", k=1, suffix=suffix, exclude_project=exclude_project)
+        return matches[0] if matches and matches[0].score >= threshold else None
+
+
+# -------------------------------
+# Helpers
+# -------------------------------
+def _text_files(root: pathlib.Path) -> Iterator[tuple[str, str]]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in IGNORED_DIRS and not d.startswith("."))
+        for name in sorted(filenames):
+            path = pathlib.Path(dirpath) / name
+            if path.suffix not in _TEXT_SUFFIXES or path.stat().st_size > _MAX_FILE_BYTES:
+                continue
+            yield path.relative_to(root).as_posix(), path.read_text(encoding="utf-8", errors="replace")
+
+
+def _readme_summary(folder: pathlib.Path) -> str:
+    readme = folder / "README.md"
+    return readme.read_text(encoding="utf-8", errors="replace")[:4000] if readme.exists() else folder.name
+
+
+def plan_from_folder(folder: pathlib.Path) -> Plan:
+    """An approximate Plan for an example project, from its README and file list."""
+    readme = _readme_summary(folder)
+    heading = re.search(r"^#\s+(.+)$", readme, re.M)
+    body = re.sub(r"^#.*$", "", readme, flags=re.M)
+    paragraphs = [
+        re.sub(r"^\*\*[^*]+\*\*\s*", "", p.strip()) for p in re.split(r"\n\s*\n", body)
+        if p.strip() and not p.lstrip().startswith(("#", "|", "-", "`", "!"))
+    ]
+    features = [re.sub(r"[*_`]", "", f).strip() for f in re.findall(r"^\s*(?:[-*]|\d+\.)\s+(.+)$", readme, re.M)][:10]
+    files = [rel for rel, _ in _text_files(folder) if rel != "README.md"]
+    suffixes = sorted({pathlib.PurePosixPath(f).suffix.lstrip(".") for f in files})
+    return Plan(
+        name=heading.group(1).strip() if heading else folder.name,
+        description=paragraphs[0][:300] if paragraphs else folder.name,
+        techstack=", ".join(suffixes),
+        features=features,
+        files=[File(path=f, purpose=f"{pathlib.PurePosixPath(f).name} of {folder.name}") for f in files],
+    )
+
+
+_index: Optional[SimilarityIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> SimilarityIndex:
+    """The process-wide index, seeded from the example projects on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SimilarityIndex()
+            try:
+                _index.seed()
+            except (OSError, sqlite3.Error) as e:
+                logging.warning(f"Could not seed the similarity index: {e}")
+        return _index
@@ -0,0 +1,259 @@
+import logging
+import os
+import pathlib
+import re
+from dataclasses import dataclass, field
+
+from agent.states import ImplementationTask, TaskPlan
+
+
+# Upper bounds for the steps on one file that a single coder call implements.
+MAX_TASKS_PER_CALL = int(os.getenv("CODEPILOT_MAX_TASKS_PER_CALL", "4"))
+MAX_BATCH_CHARS = int(os.getenv("CODEPILOT_MAX_BATCH_CHARS", "6000"))
+
+
+# -------------------------------
+# Task dependency graph
+# -------------------------------
+@dataclass
+class TaskNode:
+    """A schedulable unit of work: one or more implementation steps on a single file."""
+    key: int
+    filepath: str
+    steps: list[int]
+    deps: set[int] = field(default_factory=set)
+
+
+def _normalize(filepath: str) -> str:
+    return str(pathlib.PurePosixPath(filepath.replace("\\", "/")))
+
+
+def _mention_patterns(filepath: str) -> list[re.Pattern]:
+    """Regexes that indicate a task description refers to `filepath`."""
+    path = pathlib.PurePosixPath(_normalize(filepath))
+    patterns = [re.compile(rf"(?<![\w/.-]){re.escape(str(path))}(?![\w-])")]
+    if path.name != str(path):
+        patterns.append(re.compile(rf"(?<![\w.-]){re.escape(path.name)}(?![\w-])"))
+    # `import utils`, `from utils import`, `from './store'`, `require("./store")`
+    stem = re.escape(path.stem)
+    patterns.append(re.compile(rf"\b(?:import|from)\s+{stem}\b"))
+    patterns.append(re.compile(rf"""['"]\.{{1,2}}/(?:[\w.-]+/)*{stem}(?:\.\w+)?['"]"""))
+    return patterns
+
+
+def infer_file_dependencies(task_plan: TaskPlan) -> dict[str, set[str]]:
+    """Map each file to the files it depends on, from `depends_on` and mentions in task descriptions."""
+    steps = task_plan.implementation_steps
+    files = list(dict.fromkeys(_normalize(t.filepath) for t in steps))
+    patterns = {f: _mention_patterns(f) for f in files}
+
+    deps: dict[str, set[str]] = {f: set() for f in files}
+    for task in steps:
+        src = _normalize(task.filepath)
+        for dep in task.depends_on:
+            dep = _normalize(dep)
+            if dep in deps and dep != src:
+                deps[src].add(dep)
+        for other in files:
+            if other != src and any(p.search(task.task_description) for p in patterns[other]):
+                deps[src].add(other)
+    return deps
+
+
+def _fits(node: TaskNode, steps: list[ImplementationTask], task: ImplementationTask,
+          max_tasks: int, max_chars: int) -> bool:
+    chars = sum(len(steps[i].task_description) for i in node.steps) + len(task.task_description)
+    return len(node.steps) < max_tasks and chars <= max_chars
+
+
+def build_task_graph(task_plan: TaskPlan, max_tasks: int = MAX_TASKS_PER_CALL,
+                     max_chars: int = MAX_BATCH_CHARS) -> dict[int, TaskNode]:
+    """Turn the architect's ordered steps into a DAG of TaskNodes.
+
+    Steps on the same file stay in plan order. A step on file F waits for the steps
+    of every file F depends on that the architect ordered before it, since the
+    architect is asked to implement dependencies first. Explicit `depends_on`
+    edges to files ordered later are honoured too, unless they would form a cycle.
+
+    A step joins the previous node of its file, so one coder call implements them
+    together, when it needs nothing that node does not already wait for and the
+    node stays within `max_tasks` steps and `max_chars` of task descriptions.
+    """
+    steps = task_plan.implementation_steps
+    file_deps = infer_file_dependencies(task_plan)
+
+    nodes: dict[int, TaskNode] = {}
+    node_of: dict[int, int] = {}
+    nodes_by_file: dict[str, list[int]] = {}
+    for idx, task in enumerate(steps):
+        path = _normalize(task.filepath)
+        # only the nodes already seen, i.e. ordered before this step
+        deps = {k for dep in file_deps[path] for k in nodes_by_file.get(dep, [])}
+        last = nodes[nodes_by_file[path][-1]] if path in nodes_by_file else None
+        # explicit references to files ordered later would hold up the whole node
+        forward = {_normalize(d) for d in task.depends_on} & file_deps[path] - nodes_by_file.keys()
+        if last is not None and not forward and deps <= last.deps and _fits(last, steps, task, max_tasks, max_chars):
+            last.steps.append(idx)
+            node_of[idx] = last.key
+            continue
+        node = TaskNode(key=idx, filepath=path, steps=[idx], deps=deps)
+        if last is not None:
+            node.deps.add(last.key)
+        nodes[idx] = node
+        node_of[idx] = idx
+        nodes_by_file.setdefault(path, []).append(idx)
+
+    # Explicit forward references: wait for all later steps of the referenced file.
+    for idx, task in enumerate(steps):
+        node = nodes[node_of[idx]]
+        for dep in task.depends_on:
+            forward = [k for k in nodes_by_file.get(_normalize(dep), []) if k > node.key]
+            if not forward or set(forward) <= node.deps:
+                continue
+            added = set(forward) - node.deps
+            node.deps.update(added)
+            if _has_cycle(nodes):
+                node.deps.difference_update(added)
+                logging.warning(f"Ignoring dependency {task.filepath} -> {dep}: it would form a cycle")
+    return nodes
+
+
+def _has_cycle(nodes: dict[int, TaskNode]) -> bool:
+    indegree = {k: 0 for k in nodes}
+    dependents: dict[int, list[int]] = {k: [] for k in nodes}
+    for node in nodes.values():
+        for dep in node.deps:
+            indegree[node.key] += 1
+            dependents[dep].append(node.key)
+    queue = [k for k, d in indegree.items() if d == 0]
+    seen = 0
+    while queue:
+        key = queue.pop()
+        seen += 1
+        for child in dependents[key]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                queue.append(child)
+    return seen != len(nodes)
+
+
+def ready_nodes(nodes: dict[int, TaskNode], completed_steps: set[int]) -> list[TaskNode]:
+    """Nodes not yet done whose dependencies have all completed, in plan order."""
+    done = {k for k, n in nodes.items() if all(s in completed_steps for s in n.steps)}
+    return [
+        n for k, n in sorted(nodes.items())
+        if k not in done and n.deps <= done
+    ]
+
+
+def dependency_files(nodes: dict[int, TaskNode], node: TaskNode) -> list[str]:
+    """Files `node` depends on, nearest dependencies first (excluding its own file)."""
+    files: dict[str, None] = {}
+    frontier, seen = sorted(node.deps), set(node.deps)
+    while frontier:
+        next_frontier = []
+        for key in frontier:
+            dep = nodes[key]
+            if dep.filepath != node.filepath:
+                files.setdefault(dep.filepath)
+            for k in sorted(dep.deps - seen):
+                seen.add(k)
+                next_frontier.append(k)
+        frontier = next_frontier
+    return list(files)
+
+
+def critical_path_length(nodes: dict[int, TaskNode]) -> int:
+    """Number of sequential waves needed to finish the graph."""
+    depth: dict[int, int] = {}
+
+    def visit(key: int) -> int:
+        if key not in depth:
+            depth[key] = 1 + max((visit(d) for d in nodes[key].deps), default=0)
+        return depth[key]
+
+    return max((visit(k) for k in nodes), default=0)
+
+
+# -------------------------------
+# Incremental task graph
+# -------------------------------
+class IncrementalTaskGraph:
+    """Task DAG that grows while the plan is still being generated.
+
+    Files are added in plan order and tasks per file as the architect produces
+    them. A file only counts as finished once it is closed (no more tasks will
+    come) and all of its tasks completed. To stay acyclic without seeing the
+    whole plan, a task only waits for files ordered before its own file.
+    """
+
+    def __init__(self):
+        self.files: list[str] = []
+        self.steps: list[ImplementationTask] = []
+        self.completed: set[int] = set()
+        self.started: set[int] = set()
+        self._closed: set[str] = set()
+        self._steps_by_file: dict[str, list[int]] = {}
+        self._deps: dict[int, list[str]] = {}
+
+    def add_file(self, filepath: str) -> str:
+        path = _normalize(filepath)
+        if path not in self._steps_by_file:
+            self.files.append(path)
+            self._steps_by_file[path] = []
+        return path
+
+    def add_task(self, task: ImplementationTask) -> int:
+        path = self.add_file(task.filepath)
+        earlier = self.files[:self.files.index(path)]
+        deps = {_normalize(d) for d in task.depends_on} & set(earlier)
+        deps.update(f for f in earlier if any(p.search(task.task_description) for p in _mention_patterns(f)))
+        idx = len(self.steps)
+        self.steps.append(task)
+        self._steps_by_file[path].append(idx)
+        self._deps[idx] = [f for f in reversed(earlier) if f in deps]  # nearest first
+        return idx
+
+    def close_file(self, filepath: str) -> None:
+        self._closed.add(self.add_file(filepath))
+
+    def complete(self, idx: int) -> None:
+        self.completed.add(idx)
+
+    def _file_done(self, path: str) -> bool:
+        return path in self._closed and all(s in self.completed for s in self._steps_by_file[path])
+
+    def ready(self, max_tasks: int = MAX_TASKS_PER_CALL, max_chars: int = MAX_BATCH_CHARS) -> list[list[int]]:
+        """Batches of unstarted steps, one per file, whose file predecessors and dependency
+        files are done. A batch extends over the file's next steps that need no other
+        dependency files, within the same bounds as `build_task_graph`; it is only
+        handed out once the file is closed or the batch is full."""
+        ready = []
+        for path, steps in self._steps_by_file.items():
+            pending = [i for i in steps if i not in self.started]
+            if not pending:
+                continue
+            first = pending[0]
+            earlier_done = all(s in self.completed for s in steps[:steps.index(first)])
+            if not earlier_done or not all(self._file_done(d) for d in self._deps[first]):
+                continue
+            batch = TaskNode(key=first, filepath=path, steps=[first])
+            for idx in pending[1:]:
+                if not set(self._deps[idx]) <= set(self._deps[first]):
+                    break
+                if not _fits(batch, self.steps, self.steps[idx], max_tasks, max_chars):
+                    break
+                batch.steps.append(idx)
+            else:
+                if path not in self._closed and len(batch.steps) < max_tasks:
+                    continue  # more steps of this file may still arrive
+            ready.append(batch.steps)
+        return ready
+
+    def dependency_files(self, idx: int) -> list[str]:
+        return list(self._deps[idx])
+
+    def ordered(self) -> tuple[TaskPlan, list[int]]:
+        """The steps grouped in plan file order, and the old index of each new position."""
+        order = [idx for path in self.files for idx in self._steps_by_file[path]]
+        return TaskPlan(implementation_steps=[self.steps[i] for i in order]), order
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, TypedDict
 
 from pydantic import BaseModel, Field, ConfigDict
 
@@ -17,6 +17,7 @@ class Plan(BaseModel):
 class ImplementationTask(BaseModel):
     filepath: str = Field(description="The path to the file to be modified")
     task_description: str = Field(description="A detailed description of the task to be performed on the file, e.g. 'add user authentication', 'implement data processing logic', etc.")
+    depends_on: list[str] = Field(default_factory=list, description="Paths of other files in the plan that must be implemented before this task, e.g. modules it imports or scripts it loads")
 
 class TaskPlan(BaseModel):
     implementation_steps: list[ImplementationTask] = Field(description="A list of steps to be taken to implement the task")
@@ -25,5 +26,20 @@ class TaskPlan(BaseModel):
 class CoderState(BaseModel):
     task_plan: TaskPlan = Field(description="The plan for the task to be implemented")
     current_step_idx: int = Field(0, description="The index of the current step in the implementation steps")
+    completed_steps: list[int] = Field(default_factory=list, description="Indices of the implementation steps already completed")
     current_file_content: Optional[str] = Field(None, description="The content of the file currently being edited or created")
+    file_hashes: dict[str, str] = Field(default_factory=dict, description="SHA-256 of each file as its last completed task left it, checked on resume")
 
+
+
+class GraphState(TypedDict, total=False):
+    user_prompt: str
+    project_root: str  # folder this run writes into, see tools.project_context()
+    use_cache: bool  # reuse cached planner/architect responses (default True)
+    plan: Plan
+    task_plan: TaskPlan
+    coder_state: CoderState
+    status: str  # "DONE", "FIXING" while validation fixes are coded, or "FAILED" with `error` set (the run can be resumed)
+    error: str
+    validation_rounds: int  # fix rounds queued by the validate node so far
+    validation: dict[str, list[str]]  # problems per file from the last validation pass
@@ -0,0 +1,69 @@
+import logging
+import typing
+from typing import Callable, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+
+# -------------------------------
+# Incremental structured output
+# -------------------------------
+# The schema is bound as a forced tool call and its JSON arguments are parsed
+# as they stream in, so the elements of one list field can be acted on before
+# the model has finished the rest of the object.
+
+Model = TypeVar("Model", bound=BaseModel)
+ItemCallback = Callable[[BaseModel, dict], None]
+
+
+def _item_type(schema: type[BaseModel], field: str) -> type[BaseModel]:
+    (item,) = typing.get_args(schema.model_fields[field].annotation)
+    return item
+
+
+async def stream_structured(llm, schema: type[Model], prompt: str, field: str, on_item: ItemCallback) -> Model:
+    """Generate `schema` with `llm`, calling `on_item(item, partial)` for each element of the
+    list `field` as soon as it is complete. `partial` holds the fields parsed so far.
+
+    Falls back to a plain structured-output call for models that do not stream tool calls.
+    """
+    from langchain_core.utils.json import parse_partial_json
+
+    item_type = _item_type(schema, field)
+    bound = llm.bind_tools([schema], tool_choice=schema.__name__)
+    args, partial, emitted = "", {}, 0
+
+    async for chunk in bound.astream(prompt):
+        for call in getattr(chunk, "tool_call_chunks", None) or []:
+            if call.get("index") in (None, 0) and call.get("args"):
+                args += call["args"]
+                # an element can only be complete once a closing brace arrived
+                if "}" in call["args"]:
+                    partial = parse_partial_json(args) or partial
+        items = partial.get(field) or []
+        while emitted < len(items) - 1:  # every element but the last one is complete
+            try:
+                item = item_type.model_validate(items[emitted])
+            except ValidationError:
+                break
+            on_item(item, partial)
+            emitted += 1
+
+    if args:
+        result = schema.model_validate_json(args)
+    else:
+        logging.info(f"{schema.__name__} was not streamed as a tool call; waiting for the full response")
+        result = await llm.with_structured_output(schema).ainvoke(prompt)
+        if result is None:
+            raise ValueError(f"{schema.__name__} was not returned by the model.")
+    final = result.model_dump()
+    for item in getattr(result, field)[emitted:]:
+        on_item(item, final)
+    return result
+
+
+def replay(result: BaseModel, field: str, on_item: ItemCallback) -> None:
+    """Feed an already complete `result` (e.g. from the response cache) through `on_item`."""
+    final = result.model_dump()
+    for item in getattr(result, field):
+        on_item(item, final)
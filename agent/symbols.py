@@ -0,0 +1,195 @@
+import ast
+import pathlib
+import re
+import threading
+
+from agent import tools
+
+
+# -------------------------------
+# Symbol extraction
+# -------------------------------
+_JS_PATTERNS = [
+    re.compile(r"^\s*(export\s+(?:default\s+)?)?(async\s+)?function\s*\*?\s*(\w+)\s*(\([^)]*\))", re.M),
+    re.compile(r"^\s*(export\s+(?:default\s+)?)?class\s+(\w+)(\s+extends\s+[\w.]+)?", re.M),
+    re.compile(r"^\s*(export\s+)?(?:const|let|var)\s+(\w+)\s*=\s*(async\s+)?(\([^)]*\)|\w+)\s*=>", re.M),
+    re.compile(r"^\s*export\s+(?:const|let|var)\s+(\w+)\s*=", re.M),
+    re.compile(r"^\s*export\s*\{([^}]*)\}", re.M),
+]
+_HTML_ID = re.compile(r"""\bid\s*=\s*["']([^"']+)["']""")
+_HTML_ASSET = re.compile(r"""<(?:script|link)\b[^>]*\b(?:src|href)\s*=\s*["']([^"']+)["']""", re.I)
+_CSS_SELECTOR = re.compile(r"(?:^|})\s*([^{}@/][^{}]*?)\s*\{", re.M)
+
+
+def _python_symbols(text: str) -> list[str]:
+    try:
+        tree = ast.parse(text)
+    except SyntaxError:
+        return [m.group(0).rstrip(":") for m in re.finditer(r"^(?:async\s+)?(?:def|class)\s+\w+[^:\n]*", text, re.M)]
+    out = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+            out.append(f"{prefix} {node.name}({ast.unparse(node.args)})")
+        elif isinstance(node, ast.ClassDef):
+            bases = f"({', '.join(ast.unparse(b) for b in node.bases)})" if node.bases else ""
+            methods = [
+                f"{n.name}({ast.unparse(n.args)})" for n in node.body
+                if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))
+                and (not n.name.startswith("_") or n.name == "__init__")
+            ]
+            out.append(f"class {node.name}{bases}" + (f": {', '.join(methods)}" if methods else ""))
+        elif isinstance(node, ast.Assign):
+            names = [t.id for t in node.targets if isinstance(t, ast.Name) and t.id.isupper()]
+            out.extend(f"{name} = ..." for name in names)
+    return out
+
+
+def _js_symbols(text: str) -> list[str]:
+    out = []
+    for m in _JS_PATTERNS[0].finditer(text):
+        out.append(f"{(m.group(1) or '').strip()} {(m.group(2) or '')}function {m.group(3)}{m.group(4)}".strip())
+    for m in _JS_PATTERNS[1].finditer(text):
+        out.append(f"{(m.group(1) or '').strip()} class {m.group(2)}{m.group(3) or ''}".strip())
+    for m in _JS_PATTERNS[2].finditer(text):
+        params = m.group(4) if m.group(4).startswith("(") else f"({m.group(4)})"
+        out.append(f"{(m.group(1) or '').strip()} const {m.group(2)} = {m.group(3) or ''}{params} =>".strip())
+    arrow_names = {m.group(2) for m in _JS_PATTERNS[2].finditer(text)}
+    for m in _JS_PATTERNS[3].finditer(text):
+        if m.group(1) not in arrow_names:
+            out.append(f"export const {m.group(1)}")
+    for m in _JS_PATTERNS[4].finditer(text):
+        out.append(f"export {{ {' '.join(m.group(1).split())} }}")
+    return out
+
+
+def _html_symbols(text: str) -> list[str]:
+    out = [f"#{i}" for i in dict.fromkeys(_HTML_ID.findall(text))]
+    out.extend(f"uses {a}" for a in dict.fromkeys(_HTML_ASSET.findall(text)))
+    return out
+
+
+def _css_symbols(text: str) -> list[str]:
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    selectors = []
+    for m in _CSS_SELECTOR.finditer(text):
+        for sel in m.group(1).split(","):
+            sel = " ".join(sel.split())
+            if sel and (sel.startswith((".", "#")) or " " not in sel):
+                selectors.append(sel)
+    return list(dict.fromkeys(selectors))
+
+
+_EXTRACTORS = {
+    ".py": _python_symbols,
+    ".js": _js_symbols, ".jsx": _js_symbols, ".mjs": _js_symbols, ".ts": _js_symbols, ".tsx": _js_symbols,
+    ".html": _html_symbols, ".htm": _html_symbols,
+    ".css": _css_symbols,
+}
+
+
+def extract_symbols(path: str, text: str) -> list[str]:
+    """Exported functions, classes, DOM ids and selectors defined in a source file."""
+    extractor = _EXTRACTORS.get(pathlib.PurePosixPath(path).suffix.lower())
+    return extractor(text) if extractor else []
+
+
+# -------------------------------
+# Per-project index
+# -------------------------------
+class SymbolIndex:
+    """Symbols per file of one project, refreshed on write_file and by mtime otherwise."""
+
+    def __init__(self, root: pathlib.Path):
+        self.root = pathlib.Path(root).resolve()
+        self._entries: dict[str, tuple[int, list[str]]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, rel_path: str, text: str, mtime_ns: int) -> None:
+        with self._lock:
+            self._entries[rel_path] = (mtime_ns, extract_symbols(rel_path, text))
+
+    def symbols(self, rel_path: str) -> list[str]:
+        p = self.root / rel_path
+        try:
+            mtime_ns = p.stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            cached = self._entries.get(rel_path)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        try:
+            text = p.read_text(encoding="utf-8")
+        except (UnicodeDecodeError, OSError):
+            return []
+        self.update(rel_path, text, mtime_ns)
+        return self._entries[rel_path][1]
+
+
+_indexes: dict[pathlib.Path, SymbolIndex] = {}
+_registry_lock = threading.Lock()
+
+
+def get_symbol_index(root: pathlib.Path) -> SymbolIndex:
+    root = pathlib.Path(root).resolve()
+    with _registry_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = SymbolIndex(root)
+        return index
+
+
+def forget_symbol_index(root: pathlib.Path) -> None:
+    with _registry_lock:
+        _indexes.pop(pathlib.Path(root).resolve(), None)
+
+
+def _on_write(root: pathlib.Path, path: pathlib.Path, data: bytes) -> None:
+    if path.suffix.lower() not in _EXTRACTORS:
+        return
+    get_symbol_index(root).update(
+        path.relative_to(root).as_posix(), data.decode("utf-8", errors="replace"), path.stat().st_mtime_ns
+    )
+
+
+tools.add_write_listener(_on_write)
+
+
+# -------------------------------
+# Context packing
+# -------------------------------
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def pack_context(root: pathlib.Path, filepath: str, related: list[str], budget_tokens: int = 1500) -> str:
+    """Signatures of `related` files (most relevant first) that fit in `budget_tokens`.
+
+    Files that do not exist yet or define no symbols are skipped; a file whose
+    symbols do not all fit is truncated rather than dropped, and one whose first
+    symbol does not fit is skipped in favour of the files after it.
+    """
+    index = get_symbol_index(root)
+    sections = []
+    used = 0
+    for rel in dict.fromkeys(related):
+        if rel == filepath:
+            continue
+        symbols = index.symbols(rel)
+        if not symbols:
+            continue
+        header = f"{rel}:"
+        lines = []
+        cost = estimate_tokens(header)
+        for sym in symbols:
+            line = f"  {sym}"
+            if used + cost + estimate_tokens(line) > budget_tokens:
+                break
+            lines.append(line)
+            cost += estimate_tokens(line)
+        if not lines:
+            continue  # a smaller file further down may still fit
+        sections.append("\n".join([header, *lines]))
+        used += cost
+    return "\n".join(sections)
@@ -1,6 +1,5 @@
 # import pathlib
-# import subprocess
-# from typing import Tuple
+# # from typing import Tuple
 
 # from langchain_core.tools import tool
 # from langchain_core.tools import StructuredTool
@@ -75,92 +74,226 @@
 #     return str(PROJECT_ROOT)
 
 
+import asyncio
+import contextlib
+import contextvars
 import pathlib
-import subprocess
-from typing import Tuple
-from langchain_core.tools import tool, StructuredTool
+import logging
+import threading
+from typing import Any, Callable, Iterator, Optional, Tuple
 
+from agent import depcache
+from agent.executor import CommandResult, arun_command, submit_command
+from agent.manifest import get_manifest, is_ignored
+from agent.objects import write_private
+from agent.patching import PatchConflict, apply_search_replace, apply_unified_diff
 
-PROJECT_ROOT: pathlib.Path | None = None
 
+# The project root is scoped to the current run (thread or asyncio task), so
+# several generations can write to their own folders in the same process.
+_project_root: contextvars.ContextVar[pathlib.Path | None] = contextvars.ContextVar("project_root", default=None)
 
-def set_project_root(root: pathlib.Path):
-    """Allow external modules (like graph.py) to set the global project root."""
-    global PROJECT_ROOT
-    PROJECT_ROOT = root
+
+def set_project_root(root: pathlib.Path | str) -> contextvars.Token:
+    """Set the project root for the current run context."""
+    return _project_root.set(pathlib.Path(root))
+
+
+def get_project_root() -> pathlib.Path:
+    """Return the project root of the current run context."""
+    root = _project_root.get()
+    if root is None:
+        raise RuntimeError("Project root not initialized — call set_project_root() first.")
+    return root
+
+
+@contextlib.contextmanager
+def project_context(root: pathlib.Path | str) -> Iterator[pathlib.Path]:
+    """Run the enclosed block with tools resolving paths against `root`."""
+    token = set_project_root(root)
+    try:
+        yield pathlib.Path(root)
+    finally:
+        _project_root.reset(token)
 
 
 def safe_path_for_project(path: str) -> pathlib.Path:
-    """Ensure the given path stays within the PROJECT_ROOT sandbox."""
-    if PROJECT_ROOT is None:
-        raise RuntimeError("PROJECT_ROOT not initialized — call set_project_root() first.")
-    
+    """Ensure the given path stays within the project root sandbox."""
+    project_root_resolved = get_project_root().resolve()
+
     p = pathlib.Path(path).expanduser()
     if not p.is_absolute():
-        p = (PROJECT_ROOT / p).resolve()
+        p = project_root_resolved / p
+    p = p.resolve()
 
-    # If absolute but inside PROJECT_ROOT, allow it
-    project_root_resolved = PROJECT_ROOT.resolve()
-    if not str(p).startswith(str(project_root_resolved)):
+    # If absolute but inside the project root, allow it
+    if not p.is_relative_to(project_root_resolved):
         raise ValueError(f"Attempt to access path outside project root: {p}")
 
     return p
 
 
+# -------------------------------
+# Write listeners
+# -------------------------------
+# Called as fn(project_root, path, data) after write_file saves a file, so other
+# modules (packaging, indexes) can keep derived state up to date incrementally.
+WriteListener = Callable[[pathlib.Path, pathlib.Path, bytes], None]
+_write_listeners: list[WriteListener] = []
+
+
+def add_write_listener(listener: WriteListener) -> None:
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+
+
+def _notify_write(p: pathlib.Path, data: bytes) -> None:
+    root = get_project_root().resolve()
+    for listener in _write_listeners:
+        try:
+            listener(root, p, data)
+        except Exception:
+            logging.exception(f"Write listener {listener!r} failed for {p}")
+
+
+def _save(p: pathlib.Path, content: str) -> None:
+    """Write a project file and update the manifest and write listeners."""
+    p.parent.mkdir(parents=True, exist_ok=True)
+    data = content.encode("utf-8")
+    root = get_project_root().resolve()
+    # files stay private while the run writes them; finished projects are linked into the object store
+    write_private(p, data)
+    get_manifest(root).add(p.relative_to(root).as_posix())
+    _notify_write(p, data)
+
 
 # -------------------------------
 # TOOLS
 # -------------------------------
+# The LangChain tool objects (write_file, read_file, ...) are built on first
+# access by the module __getattr__ below: importing langchain_core takes longer
+# than everything else this module needs.
 
-@tool
-def write_file(path: str, content: str) -> str:
+def _write_file(path: str, content: str) -> str:
     """Writes content to a file inside the project root."""
     p = safe_path_for_project(path)
-    p.parent.mkdir(parents=True, exist_ok=True)
-    p.write_text(content, encoding="utf-8")
+    _save(p, content)
     return f"WROTE: {p}"
 
 
-@tool
-def read_file(path: str) -> str:
+def _edit_file(path: str, edits: list[dict[str, str]]) -> str:
+    """Edits an existing file with search/replace hunks instead of rewriting it.
+
+    `edits` is a list of {"search": "exact existing text", "replace": "new text"}.
+    Each search text must appear exactly once in the file; include a few
+    surrounding lines to make it unique. Either all hunks apply or none do.
+    """
+    p = safe_path_for_project(path)
+    if not p.exists():
+        return f"ERROR: {path} does not exist; create it with write_file"
+    try:
+        updated = apply_search_replace(p.read_text(encoding="utf-8"), edits)
+    except PatchConflict as e:
+        return f"CONFLICT: {path} unchanged: {e}. Re-read the file and retry."
+    _save(p, updated)
+    return f"EDITED: {p} ({len(edits)} hunk(s))"
+
+
+def _apply_patch(path: str, diff: str) -> str:
+    """Applies a unified diff (with @@ hunk headers) to a file inside the project root."""
+    p = safe_path_for_project(path)
+    original = p.read_text(encoding="utf-8") if p.exists() else ""
+    try:
+        updated = apply_unified_diff(original, diff)
+    except PatchConflict as e:
+        return f"CONFLICT: {path} unchanged: {e}. Re-read the file and retry."
+    _save(p, updated)
+    return f"PATCHED: {p}"
+
+
+def _read_file(path: str) -> str:
     """Reads content from a file inside the project root."""
     p = safe_path_for_project(path)
     return p.read_text(encoding="utf-8") if p.exists() else ""
 
 
-@tool
-def get_current_directory() -> str:
+def _get_current_directory() -> str:
     """Returns the current project root path."""
-    return str(PROJECT_ROOT)
+    return str(get_project_root())
 
 
-# define the plain Python function separately
 def _list_files(directory: str = ".") -> str:
     """Lists all files in the specified directory within the project root."""
     p = safe_path_for_project(directory)
     if not p.is_dir():
         return f"ERROR: {p} is not a directory"
-    files = [str(f.relative_to(PROJECT_ROOT)) for f in p.glob("**/*") if f.is_file()]
+    root = get_project_root().resolve()
+    prefix = p.relative_to(root).as_posix()
+    if is_ignored(prefix):
+        # dependency folders are not indexed; walk them only when asked for explicitly
+        files = [str(f.relative_to(root)) for f in p.glob("**/*") if f.is_file()]
+    else:
+        files = get_manifest(root).list("" if prefix == "." else prefix)
     return "\n".join(files) if files else "No files found."
 
 
-# now create both variants safely
-list_files = tool(_list_files)
-list_file = StructuredTool.from_function(_list_files)
+def _command_cwd(cwd: Optional[str]) -> pathlib.Path:
+    return safe_path_for_project(cwd) if cwd else get_project_root()
+
+
+def _command_output(result: CommandResult) -> Tuple[int, str, str]:
+    # commands may create or delete files behind the manifest's back
+    get_manifest(get_project_root()).mark_dirty()
+    return result.returncode, result.stdout, result.stderr
+
+
+def _run_cmd(cmd: str, cwd: str = None, timeout: int = 30) -> Tuple[int, str, str]:
+    """Runs a shell command in the specified directory and returns code, stdout, stderr.
+
+    Long output is cut down to its beginning and end. The command and anything it
+    started are killed after `timeout` seconds. `npm install` and
+    `pip install -r requirements.txt` are served from a local dependency cache;
+    pip installs go into the project's .venv.
+    """
+    return _command_output(depcache.run_with_cache(cmd, str(_command_cwd(cwd)), timeout, submit_command))
+
+
+async def _arun_cmd(cmd: str, cwd: str = None, timeout: int = 30) -> Tuple[int, str, str]:
+    cwd = str(_command_cwd(cwd))
+    if depcache.plan_install(cmd, cwd) is None:
+        return _command_output(await arun_command(cmd, cwd, timeout, depcache.package_env()))
+    # cache hits link files and misses populate the cache; keep both off the event loop
+    return _command_output(await asyncio.to_thread(depcache.run_with_cache, cmd, cwd, timeout, submit_command))
+
+
+# name -> StructuredTool.from_function arguments
+_TOOL_SPECS: dict[str, dict[str, Any]] = {
+    "write_file": {"func": _write_file, "name": "write_file"},
+    "edit_file": {"func": _edit_file, "name": "edit_file"},
+    "apply_patch": {"func": _apply_patch, "name": "apply_patch"},
+    "read_file": {"func": _read_file, "name": "read_file"},
+    "get_current_directory": {"func": _get_current_directory, "name": "get_current_directory"},
+    # both list tools have always been registered under the function's name
+    "list_files": {"func": _list_files},
+    "list_file": {"func": _list_files},
+    "run_cmd": {"func": _run_cmd, "coroutine": _arun_cmd, "name": "run_cmd"},
+}
+_tools_lock = threading.Lock()
 
 
-@tool
-def run_cmd(cmd: str, cwd: str = None, timeout: int = 30) -> Tuple[int, str, str]:
-    """Runs a shell command in the specified directory and returns code, stdout, stderr."""
-    cwd_dir = safe_path_for_project(cwd) if cwd else PROJECT_ROOT
-    res = subprocess.run(
-        cmd, shell=True, cwd=str(cwd_dir),
-        capture_output=True, text=True, timeout=timeout
-    )
-    return res.returncode, res.stdout, res.stderr
+def __getattr__(name: str):
+    spec = _TOOL_SPECS.get(name)
+    if spec is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _tools_lock:
+        if name not in globals():
+            from langchain_core.tools import StructuredTool
+            globals()[name] = StructuredTool.from_function(**spec)
+    return globals()[name]
 
 
 def init_project_root() -> str:
     """Initialize and return the project root path."""
-    PROJECT_ROOT.mkdir(parents=True, exist_ok=True)
-    return str(PROJECT_ROOT)
+    root = get_project_root()
+    root.mkdir(parents=True, exist_ok=True)
+    return str(root)
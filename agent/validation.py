@@ -0,0 +1,391 @@
+import ast
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import posixpath
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from typing import Optional
+
+
+# -------------------------------
+# Static validation of generated files
+# -------------------------------
+# Each file is checked on its own in a process pool: Python is compiled, JSON
+# parsed, HTML tags and CSS blocks matched, and JavaScript tokenized to find
+# unterminated strings, comments and unbalanced brackets (what a truncated or
+# garbled LLM output usually looks like). Local references (scripts, stylesheets,
+# relative imports) must resolve to files of the project. Only the standard
+# library is used so the worker processes start quickly.
+
+VALIDATION_ENABLED = os.getenv("CODEPILOT_VALIDATE", "1") == "1"
+# Fix rounds after the coder finishes; files still failing after that are reported.
+MAX_VALIDATION_ROUNDS = int(os.getenv("CODEPILOT_VALIDATION_ROUNDS", "2"))
+VALIDATION_WORKERS = int(os.getenv("CODEPILOT_VALIDATE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_MAX_BYTES = 2 * 1024 * 1024
+_JS_EXTENSIONS = (".js", ".mjs", ".cjs", ".jsx", ".ts", ".tsx", ".json")
+
+
+# -------------------------------
+# References
+# -------------------------------
+def _resolve(rel: str, ref: str, known: frozenset[str], extensions: tuple[str, ...] = ()) -> Optional[bool]:
+    """Whether a local reference from file `rel` exists; None for external references."""
+    ref = ref.split("#", 1)[0].split("?", 1)[0].strip()
+    if not ref or re.match(r"^[a-zA-Z][\w+.-]*:|^//|^\{\{|^\$\{", ref):
+        return None  # scheme (http:, data:, mailto:), protocol-relative or templated
+    base = "" if ref.startswith("/") else posixpath.dirname(rel)
+    path = posixpath.normpath(posixpath.join(base, ref.lstrip("/")))
+    if path.startswith(".."):
+        return None
+    candidates = [path] + [path + ext for ext in extensions] + [f"{path}/index{ext}" for ext in extensions]
+    return any(c in known for c in candidates)
+
+
+def _line_of(text: str, offset: int) -> int:
+    return text.count("\n", 0, offset) + 1
+
+
+# -------------------------------
+# Python / JSON
+# -------------------------------
+def check_python(rel: str, text: str, known: frozenset[str]) -> list[str]:
+    try:
+        tree = ast.parse(compile(text, rel, "exec", flags=ast.PyCF_ONLY_AST, dont_inherit=True))
+    except SyntaxError as e:
+        return [f"line {e.lineno}: SyntaxError: {e.msg}"]
+    issues = []
+    package = posixpath.dirname(rel)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level:
+            base = package
+            for _ in range(node.level - 1):
+                base = posixpath.dirname(base)
+            parts = node.module.split(".") if node.module else []
+            if not parts and posixpath.join(base, "__init__.py") in known:
+                continue  # `from . import name` may import a name defined by the package
+            names = [parts] if parts else [[alias.name] for alias in node.names]
+            for name in names:
+                target = posixpath.join(base, *name)
+                if not ({f"{target}.py", f"{target}/__init__.py"} & known
+                        or any(k.startswith(target + "/") for k in known)):
+                    dots = "." * node.level
+                    issues.append(f"line {node.lineno}: relative import {dots}{'.'.join(name)} does not match a project file")
+    return issues
+
+
+def check_json(rel: str, text: str, known: frozenset[str]) -> list[str]:
+    try:
+        json.loads(text)
+    except json.JSONDecodeError as e:
+        return [f"line {e.lineno}: invalid JSON: {e.msg}"]
+    return []
+
+
+# -------------------------------
+# HTML
+# -------------------------------
+_VOID = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr",
+})
+# End tags the HTML spec lets authors omit.
+_OPTIONAL_END = frozenset({
+    "html", "head", "body", "p", "li", "dt", "dd", "tr", "td", "th", "thead", "tbody", "tfoot",
+    "option", "optgroup", "colgroup", "caption", "rt", "rp",
+})
+_REF_ATTRS = {"script": "src", "link": "href", "img": "src", "source": "src", "iframe": "src"}
+
+
+class _HTMLChecker(HTMLParser):
+    def __init__(self, rel: str, known: frozenset[str]):
+        super().__init__(convert_charrefs=True)
+        self.rel, self.known = rel, known
+        self.stack: list[tuple[str, int]] = []
+        self.issues: list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        line = self.getpos()[0]
+        attr = _REF_ATTRS.get(tag)
+        values = dict(attrs)
+        if attr and values.get(attr) and _resolve(self.rel, values[attr], self.known) is False:
+            self.issues.append(f"line {line}: <{tag} {attr}=\"{values[attr]}\"> refers to a file that does not exist")
+        if tag not in _VOID:
+            self.stack.append((tag, line))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID and self.stack and self.stack[-1][0] == tag:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        line = self.getpos()[0]
+        if tag in _VOID:
+            return
+        if not any(open_tag == tag for open_tag, _ in self.stack):
+            if tag not in _OPTIONAL_END:
+                self.issues.append(f"line {line}: </{tag}> has no matching <{tag}>")
+            return
+        while self.stack:
+            open_tag, open_line = self.stack.pop()
+            if open_tag == tag:
+                break
+            if open_tag not in _OPTIONAL_END:
+                self.issues.append(f"line {open_line}: <{open_tag}> is not closed before </{tag}> on line {line}")
+
+    def finish(self) -> list[str]:
+        self.close()
+        for open_tag, open_line in self.stack:
+            if open_tag not in _OPTIONAL_END:
+                self.issues.append(f"line {open_line}: <{open_tag}> is never closed")
+        return self.issues
+
+
+def check_html(rel: str, text: str, known: frozenset[str]) -> list[str]:
+    checker = _HTMLChecker(rel, known)
+    checker.feed(text)
+    return checker.finish()
+
+
+# -------------------------------
+# CSS
+# -------------------------------
+_CSS_IMPORT = re.compile(r"""@import\s+(?:url\(\s*)?['"]?([^'")\s;]+)""")
+
+
+def check_css(rel: str, text: str, known: frozenset[str]) -> list[str]:
+    issues = []
+    depth, opened = 0, []
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            if end < 0:
+                return [f"line {_line_of(text, i)}: unterminated comment"]
+            i = end + 2
+            continue
+        if c in "'\"":
+            end = i + 1
+            while end < n and text[end] not in (c, "\n"):
+                end += 2 if text[end] == "\\" else 1
+            if end >= n or text[end] != c:
+                return [f"line {_line_of(text, i)}: unterminated string"]
+            i = end + 1
+            continue
+        if c == "{":
+            depth += 1
+            opened.append(i)
+        elif c == "}":
+            if not depth:
+                return [f"line {_line_of(text, i)}: unexpected '}}'"]
+            depth -= 1
+            opened.pop()
+        i += 1
+    if depth:
+        issues.append(f"line {_line_of(text, opened[-1])}: '{{' is never closed (the file may be truncated)")
+    for m in _CSS_IMPORT.finditer(text):
+        if _resolve(rel, m.group(1), known) is False:
+            issues.append(f"line {_line_of(text, m.start())}: @import of {m.group(1)} refers to a file that does not exist")
+    return issues
+
+
+# -------------------------------
+# JavaScript
+# -------------------------------
+_CLOSERS = {")": "(", "]": "[", "}": "{"}
+# After these words a `/` starts a regular expression rather than a division.
+_REGEX_AFTER_WORDS = frozenset({
+    "return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw", "case", "do", "else", "yield", "await",
+})
+_JS_IMPORT = re.compile(
+    r"""(?:\bimport\s*(?:[\w*{}\s,$]+\s*from\s*)?|\bexport\s+[\w*{}\s,$]+\s*from\s*|\bimport\s*\(\s*|\brequire\s*\(\s*)"""
+    r"""(['"])(\.{1,2}/[^'"\n]+|/[^'"\n]+)\1"""
+)
+
+
+def _js_tokens_ok(text: str) -> Optional[str]:
+    """Scan JavaScript for unbalanced brackets and unterminated strings, comments and
+    template literals. Returns the first problem found, or None."""
+    stack: list[tuple[str, int]] = []  # open brackets, and "${" for template substitutions
+    i, n = 0, len(text)
+    regex_allowed = True
+
+    def scan_template(i: int) -> int:
+        """Scan template text from `i`; returns the index after the closing backtick or `${`."""
+        while i < n:
+            c = text[i]
+            if c == "\\":
+                i += 2
+            elif c == "`":
+                return i + 1
+            elif text.startswith("${", i):
+                stack.append(("${", i))
+                return i + 2
+            else:
+                i += 1
+        return -1
+
+    while i < n:
+        c = text[i]
+        if c in " \t\r\n":
+            i += 1
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            if end < 0:
+                return f"line {_line_of(text, i)}: unterminated /* comment"
+            i = end + 2
+        elif c in "'\"":
+            end = i + 1
+            while end < n and text[end] not in (c, "\n"):
+                end += 2 if text[end] == "\\" else 1
+            if end >= n or text[end] != c:
+                return f"line {_line_of(text, i)}: unterminated string"
+            i, regex_allowed = end + 1, False
+        elif c == "`":
+            start, i = i, scan_template(i + 1)
+            if i < 0:
+                return f"line {_line_of(text, start)}: unterminated template literal"
+            regex_allowed = False
+        elif c == "/" and regex_allowed:
+            end, in_class = i + 1, False
+            while end < n and text[end] != "\n" and (in_class or text[end] != "/"):
+                if text[end] == "\\":
+                    end += 1
+                elif text[end] == "[":
+                    in_class = True
+                elif text[end] == "]":
+                    in_class = False
+                end += 1
+            if end < n and text[end] == "/":
+                i = end + 1
+                while i < n and (text[i].isalnum() or text[i] == "_"):
+                    i += 1  # flags
+                regex_allowed = False
+            else:
+                i += 1  # not a regex after all; treat as an operator
+        elif c in "([{":
+            stack.append((c, i))
+            i, regex_allowed = i + 1, True
+        elif c in ")]}":
+            if c == "}" and stack and stack[-1][0] == "${":
+                stack.pop()
+                start, i = i, scan_template(i + 1)
+                if i < 0:
+                    return f"line {_line_of(text, start)}: unterminated template literal"
+                regex_allowed = False
+                continue
+            if not stack or stack[-1][0] != _CLOSERS[c]:
+                expected = f", expected the match of '{stack[-1][0]}' from line {_line_of(text, stack[-1][1])}" if stack else ""
+                return f"line {_line_of(text, i)}: unexpected '{c}'{expected}"
+            stack.pop()
+            i, regex_allowed = i + 1, c != ")" and c != "]"
+        elif c.isalnum() or c in "_$":
+            end = i
+            while end < n and (text[end].isalnum() or text[end] in "_$"):
+                end += 1
+            regex_allowed = text[i:end] in _REGEX_AFTER_WORDS
+            i = end
+        else:
+            regex_allowed = c not in ".)"
+            i += 1
+    if stack:
+        opener, offset = stack[-1]
+        return f"line {_line_of(text, offset)}: '{opener}' is never closed (the file may be truncated)"
+    return None
+
+
+def check_js(rel: str, text: str, known: frozenset[str]) -> list[str]:
+    issues = []
+    # JSX text and TypeScript generics need a real parser; only their imports are checked
+    if posixpath.splitext(rel)[1] in (".js", ".mjs", ".cjs"):
+        problem = _js_tokens_ok(text)
+        if problem:
+            issues.append(problem)
+    for m in _JS_IMPORT.finditer(text):
+        if _resolve(rel, m.group(2), known, _JS_EXTENSIONS) is False:
+            issues.append(f"line {_line_of(text, m.start())}: import of {m.group(2)} does not match a project file")
+    return issues
+
+
+_CHECKERS = {
+    ".py": check_python, ".json": check_json, ".html": check_html, ".htm": check_html, ".css": check_css,
+    ".js": check_js, ".mjs": check_js, ".cjs": check_js, ".jsx": check_js, ".ts": check_js, ".tsx": check_js,
+}
+
+
+def is_checked(rel: str) -> bool:
+    return posixpath.splitext(rel)[1].lower() in _CHECKERS
+
+
+def check_file(root: str, rel: str, known: frozenset[str]) -> list[str]:
+    """Problems found in the project file `rel`; runs in a worker process."""
+    path = os.path.join(root, rel)
+    try:
+        if os.path.getsize(path) > _MAX_BYTES:
+            return []
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    except UnicodeDecodeError:
+        return ["file is not valid UTF-8 text"]
+    except OSError as e:
+        return [f"cannot be read: {e}"]
+    return _CHECKERS[posixpath.splitext(rel)[1].lower()](rel, text, known)
+
+
+# -------------------------------
+# Running
+# -------------------------------
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs threads and an event loop is unsafe
+            _pool = ProcessPoolExecutor(max_workers=max(1, VALIDATION_WORKERS),
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def validate_files(root: str, files: list[str]) -> dict[str, list[str]]:
+    """Check every checkable file of `files` (paths relative to `root`) in parallel.
+
+    `files` should list the whole project, since references are resolved against it.
+    Returns the problems per failing file.
+    """
+    known = frozenset(files)
+    targets = [rel for rel in files if is_checked(rel)]
+    if not targets:
+        return {}
+    loop = asyncio.get_running_loop()
+    if VALIDATION_WORKERS <= 0:
+        results = await asyncio.to_thread(lambda: [check_file(root, rel, known) for rel in targets])
+    else:
+        try:
+            results = await asyncio.gather(*(loop.run_in_executor(_get_pool(), check_file, root, rel, known) for rel in targets))
+        except BrokenProcessPool as e:
+            logging.warning(f"Validation workers died ({e}); checking in this process")
+            _reset_pool()
+            results = await asyncio.to_thread(lambda: [check_file(root, rel, known) for rel in targets])
+    issues = {rel: problems for rel, problems in zip(targets, results) if problems}
+    logging.info(f"Validated {len(targets)} file(s): {len(issues)} with problems")
+    return issues
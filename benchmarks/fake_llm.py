@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableGenerator, RunnableLambda
+
+from agent.states import File, ImplementationTask, Plan, TaskPlan
+
+
+def file_body(path: str, size: int) -> str:
+    """Deterministic file content of exactly `size` bytes for `path`."""
+    seed = hashlib.sha256(path.encode()).hexdigest()
+    line = f"// {path} {seed}\n"
+    return (line * (size // len(line) + 1))[:size]
+
+
+def canned_task_plan(n_steps: int) -> TaskPlan:
+    """`n_steps` tasks over ceil(n_steps / 2) files, two tasks per file, with a
+    dependency on the previous file every fifth file so the DAG has some depth."""
+    n_files = max(1, (n_steps + 1) // 2)
+    steps = []
+    for i in range(n_steps):
+        f = i // 2
+        depends_on = [f"src/mod_{f - 1}.js"] if f and f % 5 == 0 else []
+        steps.append(ImplementationTask(
+            filepath=f"src/mod_{f}.js",
+            task_description=f"Implement part {i % 2 + 1} of module {f} of {n_files}.",
+            depends_on=depends_on,
+        ))
+    return TaskPlan(implementation_steps=steps)
+
+
+def canned_plan(n_steps: int) -> Plan:
+    n_files = max(1, (n_steps + 1) // 2)
+    return Plan(
+        name="benchmark app",
+        description="Synthetic project used to measure CodePilot overhead",
+        techstack="javascript",
+        features=["benchmarking"],
+        files=[File(path=f"src/mod_{f}.js", purpose=f"module {f}") for f in range(n_files)],
+    )
+
+
+def canned_file_tasks(filepath: str, n_steps: int) -> TaskPlan:
+    """The tasks of `canned_task_plan(n_steps)` for one file, as a per-file architect call returns them."""
+    steps = [t for t in canned_task_plan(n_steps).implementation_steps if t.filepath == filepath]
+    return TaskPlan(implementation_steps=steps)
+
+
+class FakeChatGroq(BaseChatModel):
+    """Deterministic offline stand-in for ChatGroq.
+
+    Structured output returns canned Plan/TaskPlan objects sized by `n_steps`.
+    In the coder's ReAct loop the first call asks for one write_file of
+    `file_size` bytes to the task's file; once a tool result comes back it
+    answers with a final message. Every call sleeps `latency_s` to simulate
+    the provider. Binding Plan or TaskPlan as a forced tool streams the canned
+    JSON in `stream_chunks` pieces spread over `latency_s`.
+    """
+
+    n_steps: int = 5
+    file_size: int = 1024
+    latency_s: float = 0.0
+    stream_chunks: int = 8
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-groq"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        if kwargs.get("tool_choice") and list(tools) in ([Plan], [TaskPlan]):
+            return RunnableGenerator(self._stream_canned(tools[0]))
+        return self
+
+    def _canned(self, schema: Any, prompt: str):
+        if schema is Plan:
+            return canned_plan(self.n_steps)
+        match = re.search(r"ONE file, (\S+?),", prompt)
+        return canned_file_tasks(match.group(1), self.n_steps) if match else canned_task_plan(self.n_steps)
+
+    def _stream_canned(self, schema: Any):
+        async def stream(inputs):
+            async for prompt in inputs:
+                args = self._canned(schema, str(prompt)).model_dump_json()
+                size = -(-len(args) // self.stream_chunks)
+                for start in range(0, len(args), size):
+                    if self.latency_s:
+                        await asyncio.sleep(self.latency_s / self.stream_chunks)
+                    yield AIMessageChunk(content="", tool_call_chunks=[{
+                        "name": schema.__name__ if start == 0 else None,
+                        "args": args[start:start + size], "id": None, "index": 0,
+                    }])
+        return stream
+
+    def with_structured_output(self, schema: Any, **kwargs: Any):
+        async def respond(_: Any):
+            await self._sleep()
+            if schema is Plan:
+                return canned_plan(self.n_steps)
+            if schema is TaskPlan:
+                return canned_task_plan(self.n_steps)
+            raise TypeError(f"FakeChatGroq has no canned response for {schema!r}")
+
+        def respond_sync(prompt: Any):
+            return asyncio.run(respond(prompt))
+
+        return RunnableLambda(respond_sync, afunc=respond)
+
+    def _reply(self, messages: list[BaseMessage]) -> AIMessage:
+        self.calls += 1
+        last = messages[-1]
+        usage = {"input_tokens": sum(len(str(m.content)) for m in messages) // 4, "output_tokens": 0, "total_tokens": 0}
+        if isinstance(last, ToolMessage):
+            usage["output_tokens"] = 1
+            usage["total_tokens"] = usage["input_tokens"] + 1
+            return AIMessage(content="Done.", usage_metadata=usage)
+        match = re.search(r"^File: (.+)$", str(last.content), re.M)
+        path = match.group(1).strip() if match else "output.txt"
+        usage["output_tokens"] = self.file_size // 4
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return AIMessage(
+            content="",
+            tool_calls=[{
+                "name": "write_file",
+                "args": {"path": path, "content": file_body(path, self.file_size)},
+                "id": f"call_{self.calls}",
+            }],
+            usage_metadata=usage,
+        )
+
+    async def _sleep(self) -> None:
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+
+    def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await self._sleep()
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
@@ -0,0 +1,216 @@
+"""Offline benchmarks for CodePilot's own overhead (no Groq calls).
+
+    python -m benchmarks.run --out bench.json            # full matrix
+    python -m benchmarks.run --quick                      # small matrix for CI
+    python -m benchmarks.run --only graph --latency 0.05  # one suite
+    python -m benchmarks.run --only startup               # cold import time of the entry modules
+
+Results are JSON: {"meta": {...}, "results": [{"suite": ..., <params>, <metrics>}]}
+so runs from different commits can be diffed or compared with a script.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from agent import tools
+from agent.graph import compile_agent
+from agent.packaging import build_project_zip, track_project, untrack_project
+from agent.scheduler import build_task_graph, critical_path_length
+from benchmarks.fake_llm import FakeChatGroq, canned_task_plan, file_body
+
+
+FULL = {"steps": [5, 50, 500], "sizes": [1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024], "files": [10, 100, 1000],
+        "repeats": 10}
+QUICK = {"steps": [5, 50], "sizes": [1024, 100 * 1024], "files": [10, 100], "repeats": 3}
+
+
+def _measure(fn):
+    """Run `fn` and return (result, wall seconds, peak traced memory in bytes)."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+# -------------------------------
+# Suites
+# -------------------------------
+def bench_graph(steps: list[int], latency: float, workers: int, pipelined: bool = False) -> list[dict]:
+    """End-to-end graph runs with a fake LLM: orchestration overhead per step."""
+    rows = []
+    for n in steps:
+        llm = FakeChatGroq(n_steps=n, file_size=1024, latency_s=latency)
+        agent = compile_agent(llm, max_workers=workers, model="fake", pipelined=pipelined)
+        with tempfile.TemporaryDirectory() as root:
+            inputs = {"user_prompt": f"benchmark {n}", "project_root": root, "use_cache": False}
+            config = {"recursion_limit": 10 * n + 50}
+            _, wall, peak = _measure(lambda: asyncio.run(agent.ainvoke(inputs, config)))
+            written = sum(1 for p in Path(root).rglob("*") if p.is_file())
+        depth = critical_path_length(build_task_graph(canned_task_plan(n)))
+        # what an ideal scheduler would spend just waiting on the simulated LLM
+        llm_floor = (2 + 2 * depth) * latency
+        rows.append({
+            "suite": "graph", "steps": n, "workers": workers, "latency_s": latency, "pipelined": pipelined,
+            "wall_s": round(wall, 4), "overhead_s": round(max(wall - llm_floor, 0.0), 4),
+            "overhead_per_step_ms": round(1000 * max(wall - llm_floor, 0.0) / n, 3),
+            "critical_path": depth, "llm_calls": llm.calls, "files_written": written, "peak_mem_bytes": peak,
+        })
+    return rows
+
+
+def bench_tools(sizes: list[int], ops: int = 20) -> list[dict]:
+    """write_file / read_file / edit_file / list_files throughput per file size."""
+    rows = []
+    for size in sizes:
+        reps = max(1, min(ops, (50 * 1024 * 1024) // size))
+        with tempfile.TemporaryDirectory() as root, tools.project_context(root):
+            body = file_body("bench.js", size)
+            timings = {}
+            _, timings["write_file"], peak = _measure(lambda: [
+                tools.write_file.invoke({"path": f"f{i}.js", "content": body}) for i in range(reps)
+            ])
+            _, timings["read_file"], _ = _measure(lambda: [
+                tools.read_file.invoke({"path": f"f{i}.js"}) for i in range(reps)
+            ])
+            edit = [{"search": body[:40], "replace": body[:40].upper()}]
+            _, timings["edit_file"], _ = _measure(lambda: [
+                tools.edit_file.invoke({"path": f"f{i}.js", "edits": edit}) for i in range(reps)
+            ])
+            _, timings["list_files"], _ = _measure(lambda: [tools.list_files.invoke({}) for _ in range(reps)])
+        for tool_name, elapsed in timings.items():
+            rows.append({
+                "suite": "tools", "tool": tool_name, "file_size": size, "ops": reps,
+                "ops_per_s": round(reps / elapsed, 2) if elapsed else None,
+                "mb_per_s": round(reps * size / elapsed / 1e6, 2) if elapsed and tool_name != "list_files" else None,
+                "peak_mem_bytes": peak if tool_name == "write_file" else None,
+            })
+    return rows
+
+
+def bench_packaging(file_counts: list[int], sizes: list[int]) -> list[dict]:
+    """In-memory ZIP build time, with files precompressed at write time or read from disk."""
+    rows = []
+    for count in file_counts:
+        for size in sizes:
+            if count * size > 200 * 1024 * 1024:
+                continue  # keep each case under ~200 MB of input
+            for precompressed in (True, False):
+                with tempfile.TemporaryDirectory() as root, tools.project_context(root):
+                    if precompressed:
+                        track_project(root)
+                    for i in range(count):
+                        tools.write_file.invoke({"path": f"d{i % 10}/f{i}.js", "content": file_body(f"f{i}", size)})
+                    data, wall, peak = _measure(lambda: build_project_zip(root))
+                    untrack_project(root)
+                rows.append({
+                    "suite": "packaging", "files": count, "file_size": size, "precompressed": precompressed,
+                    "wall_s": round(wall, 4), "zip_bytes": len(data), "peak_mem_bytes": peak,
+                })
+    return rows
+
+
+# Run in a fresh interpreter per sample. The repo root goes last on sys.path so
+# `import streamlit` inside streamlit.py finds the package, not the app itself.
+_STARTUP_SNIPPET = """
+import importlib, importlib.util, json, sys, time
+root, target = sys.argv[1], sys.argv[2]
+sys.path = [p for p in sys.path if p not in ("", root)] + [root]
+before = set(sys.modules)
+start = time.perf_counter()
+if target.endswith(".py"):
+    spec = importlib.util.spec_from_file_location("codepilot_app", f"{root}/{target}")
+    spec.loader.exec_module(importlib.util.module_from_spec(spec))
+else:
+    importlib.import_module(target)
+elapsed = time.perf_counter() - start
+heavy = ["langchain_groq", "langchain.agents", "langgraph", "langchain_core", "sqlmodel", "sqlalchemy", "numpy", "httpx"]
+print(json.dumps({"import_s": elapsed, "modules": len(set(sys.modules) - before),
+                  "heavy": [m for m in heavy if m in sys.modules]}))
+"""
+STARTUP_TARGETS = ["agent.tools", "agent.graph", "main", "streamlit.py"]
+
+
+def bench_startup(repeats: int) -> list[dict]:
+    """Cold import time of the CLI/UI entry modules, each in a new interpreter."""
+    root = str(Path(__file__).resolve().parent.parent)
+    rows = []
+    for target in STARTUP_TARGETS:
+        samples, walls = [], []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, "-c", _STARTUP_SNIPPET, root, target],
+                                 capture_output=True, text=True, check=True, cwd=root)
+            walls.append(time.perf_counter() - start)
+            samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        imports = sorted(s["import_s"] for s in samples)
+        rows.append({
+            "suite": "startup", "target": target, "repeats": repeats,
+            "import_s_median": round(imports[len(imports) // 2], 4), "import_s_min": round(imports[0], 4),
+            "process_s_median": round(sorted(walls)[len(walls) // 2], 4),
+            "modules_loaded": samples[-1]["modules"], "heavy_modules": samples[-1]["heavy"],
+        })
+    return rows
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+def _meta() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit or None, "python": platform.python_version(), "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run CodePilot's offline benchmarks")
+    parser.add_argument("--quick", action="store_true", help="Smaller matrix (5-50 steps, up to 100 KB files)")
+    parser.add_argument("--only", choices=["graph", "tools", "packaging", "startup"], action="append",
+                        help="Run only these suites (repeatable)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated LLM latency per call, seconds")
+    parser.add_argument("--workers", type=int, default=4, help="Coder worker limit for graph runs")
+    parser.add_argument("--pipelined", action="store_true", help="Run the graph suite in pipelined mode")
+    parser.add_argument("--out", type=Path, help="Write results JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    matrix = QUICK if args.quick else FULL
+    suites = args.only or ["graph", "tools", "packaging", "startup"]
+    results = []
+    if "graph" in suites:
+        results += bench_graph(matrix["steps"], args.latency, args.workers, args.pipelined)
+    if "tools" in suites:
+        results += bench_tools(matrix["sizes"])
+    if "packaging" in suites:
+        results += bench_packaging(matrix["files"], matrix["sizes"])
+    if "startup" in suites:
+        results += bench_startup(matrix["repeats"])
+
+    report = json.dumps({"meta": _meta(), "results": results}, indent=2)
+    if args.out:
+        args.out.write_text(report + "\n")
+        print(f"Wrote {len(results)} results to {args.out}", file=sys.stderr)
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
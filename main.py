@@ -1,26 +1,239 @@
 import argparse
+import asyncio
+import json
+import logging
+import os
 import sys
+import time
 import traceback
+from pathlib import Path
+from typing import Optional
 
-from agent.graph import agent
+from agent.checkpoint import run_config
+from agent.graph import DEFAULT_MAX_WORKERS, DEFAULT_PIPELINED, build_agent, init_project_root, prepare_resume
 
 
+# -------------------------------
+# Batch mode
+# -------------------------------
+def load_requests(path: Path) -> list[dict]:
+    """Read batch requests: one JSON object per line with `prompt`, or `title` and `body`.
+
+    Each request is identified by `request_id` (or `id`), defaulting to its line number.
+    """
+    requests = []
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            prompt = item.get("prompt") or "\n\n".join(p for p in (item.get("title"), item.get("body")) if p)
+            if not prompt:
+                raise ValueError(f"{path}:{lineno}: request has no prompt, title or body")
+            request_id = str(item.get("request_id") or item.get("id") or f"line-{lineno}")
+            name = item.get("name") or item.get("title") or request_id
+            requests.append({"request_id": request_id, "prompt": prompt, "name": name})
+    return requests
+
+
+def load_results(path: Path) -> dict[str, dict]:
+    """Latest result record per request id; later lines supersede earlier ones."""
+    results = {}
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by a crash
+                results[record["request_id"]] = record
+    return results
+
+
+class ResultsWriter:
+    """Appends one JSON line per status change so an interrupted batch can be resumed."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8")
+
+    def write(self, record: dict) -> None:
+        self._f.write(json.dumps(record, default=str) + "\n")
+        self._f.flush()
+
+    def close(self) -> None:
+        self._f.close()
+
+
+async def _resumable_state(agent, run_id: str) -> Optional[dict]:
+    """State to continue `run_id` from, or None when it has no checkpoint."""
+    try:
+        state = await prepare_resume(agent, run_config(run_id))
+    except KeyError:
+        return None
+    if state is None:  # finished, but the batch stopped before recording it
+        state = (await agent.aget_state(run_config(run_id))).values
+    return state
+
+
+async def run_request(agent, request: dict, previous: Optional[dict], recursion_limit: int,
+                      writer: ResultsWriter) -> dict:
+    """Generate (or resume) one batch request and record its outcome."""
+    record = {"request_id": request["request_id"], "name": request["name"]}
+    started = time.time()
+    timings: dict[str, float] = {}
+    try:
+        inputs = None
+        state = await _resumable_state(agent, previous["run_id"]) if previous and previous.get("run_id") else None
+        if state is not None:
+            record.update(run_id=previous["run_id"], project_path=state["project_root"])
+        else:
+            project_root = init_project_root(request["name"])
+            record.update(run_id=Path(project_root).name, project_path=project_root)
+            inputs = {"user_prompt": request["prompt"], "project_root": project_root}
+        writer.write({**record, "status": "running", "started_at": started})
+
+        result = dict(state or inputs)
+        if result.get("status") != "DONE":
+            config = run_config(record["run_id"], recursion_limit=recursion_limit)
+            last = time.perf_counter()
+            async for chunk in agent.astream(inputs, config, stream_mode="updates"):
+                now = time.perf_counter()
+                for node, update in chunk.items():
+                    timings[node] = round(timings.get(node, 0.0) + now - last, 3)
+                    result.update(update or {})
+                last = now
+
+        if result.get("status") == "FAILED":
+            record.update(status="failed", error=result.get("error"))
+        else:
+            from agent.database import save_project  # SQLModel is slow to import
+
+            plan = result.get("plan")
+            record["project_id"] = await asyncio.to_thread(
+                save_project, plan.name if plan else request["name"], request["prompt"], record["project_path"]
+            )
+            record["status"] = "done"
+            if result.get("validation"):
+                record["validation"] = result["validation"]
+    except Exception as e:
+        logging.exception(f"Request {request['request_id']} failed")
+        record.update(status="failed", error=f"{type(e).__name__}: {e}")
+
+    finished = time.time()
+    record.update(started_at=started, finished_at=finished, wall_s=round(finished - started, 3), timings=timings)
+    writer.write(record)
+    return record
+
+
+async def run_batch(agent, requests: list[dict], results_path: Path, concurrency: int,
+                    recursion_limit: int, retry_failed: bool = True) -> list[dict]:
+    """Run batch requests with at most `concurrency` generations in flight.
+
+    Requests already recorded as done in `results_path` are skipped; interrupted
+    (and, with `retry_failed`, failed) ones continue from their last checkpoint.
+    """
+    previous = load_results(results_path)
+    skip = {"done"} if retry_failed else {"done", "failed"}
+    todo = [r for r in requests if previous.get(r["request_id"], {}).get("status") not in skip]
+    logging.info(f"Batch: skipping {len(requests) - len(todo)} of {len(requests)} request(s), running {len(todo)}")
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    writer = ResultsWriter(results_path)
+
+    async def run(request: dict) -> dict:
+        async with semaphore:
+            record = await run_request(agent, request, previous.get(request["request_id"]), recursion_limit, writer)
+        print(f"[{record['status']}] {record['request_id']} ({record['wall_s']}s) {record.get('project_path') or ''}")
+        return record
+
+    try:
+        return await asyncio.gather(*(run(r) for r in todo))
+    finally:
+        writer.close()
+
+
+# -------------------------------
+# CLI
+# -------------------------------
 def main():
     parser = argparse.ArgumentParser(description="Run engineering project planner")
     parser.add_argument("--recursion-limit", "-r", type=int, default=100,
                         help="Recursion limit for processing (default: 100)")
+    parser.add_argument("--workers", "-w", type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"Files the coder may implement in parallel (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument("--pipelined", action="store_true", default=DEFAULT_PIPELINED,
+                        help="Start coding files while the plan is still being generated")
+    parser.add_argument("--project-name", "-n", default="project",
+                        help="Name used for the generated project folder")
+    parser.add_argument("--resume", metavar="RUN_ID",
+                        help="Continue a failed or interrupted run instead of starting a new one")
+    parser.add_argument("--batch", "-b", type=Path, metavar="JSONL",
+                        help="Generate every request of a JSONL file (`prompt`, or `title` and `body`, per line)")
+    parser.add_argument("--results", type=Path, metavar="JSONL",
+                        help="Batch results file, also read to resume a batch (default: <batch>.results.jsonl)")
+    parser.add_argument("--concurrency", "-c", type=int, default=2,
+                        help="Batch requests generated at the same time (default: 2)")
+    parser.add_argument("--skip-failed", action="store_true",
+                        help="When resuming a batch, do not retry requests that failed")
 
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
 
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        print("Error: set GROQ_API_KEY to your Groq API key.", file=sys.stderr)
+        sys.exit(1)
+
+    if args.batch:
+        results_path = args.results or args.batch.with_suffix(".results.jsonl")
+        try:
+            agent = build_agent(api_key, max_workers=args.workers, pipelined=args.pipelined)
+            records = asyncio.run(run_batch(
+                agent, load_requests(args.batch), results_path, args.concurrency,
+                args.recursion_limit, retry_failed=not args.skip_failed,
+            ))
+        except KeyboardInterrupt:
+            print(f"\nBatch interrupted. Run the same command again to resume from {results_path}.")
+            sys.exit(130)
+        failed = sum(1 for r in records if r["status"] != "done")
+        print(f"Batch finished: {len(records) - failed} done, {failed} failed. Results in {results_path}")
+        sys.exit(1 if failed else 0)
+
+    run_id = args.resume
     try:
-        user_prompt = input("Enter your project prompt: ")
-        result = agent.invoke(
-            {"user_prompt": user_prompt},
-            {"recursion_limit": args.recursion_limit}
-        )
+        agent = build_agent(api_key, max_workers=args.workers, pipelined=args.pipelined)
+        if run_id:
+            config = run_config(run_id, recursion_limit=args.recursion_limit)
+            if asyncio.run(prepare_resume(agent, config)) is None:
+                print(f"Run {run_id} already finished.")
+                return
+            inputs = None
+        else:
+            user_prompt = input("Enter your project prompt: ")
+            project_root = init_project_root(args.project_name)
+            run_id = Path(project_root).name
+            config = run_config(run_id, recursion_limit=args.recursion_limit)
+            inputs = {"user_prompt": user_prompt, "project_root": project_root}
+
+        print(f"Run id: {run_id}")
+        result = asyncio.run(agent.ainvoke(inputs, config))
         print("Final State:", result)
+        if result.get("status") == "FAILED":
+            print(f"Some tasks failed: {result.get('error')}", file=sys.stderr)
+            print(f"Continue with: python main.py --resume {run_id}", file=sys.stderr)
+            sys.exit(1)
+        for path, problems in (result.get("validation") or {}).items():
+            print(f"Validation: {path}: {'; '.join(problems)}", file=sys.stderr)
+        from agent.database import DATABASE_PATH, save_project  # SQLModel is slow to import
+        plan = result.get("plan")
+        project_id = save_project(plan.name if plan else run_id, result.get("user_prompt", ""), result["project_root"])
+        print(f"Saved to {DATABASE_PATH.name} as project #{project_id}")
     except KeyboardInterrupt:
         print("\nOperation cancelled by user.")
+        if run_id:
+            print(f"Continue with: python main.py --resume {run_id}")
         sys.exit(0)
     except Exception as e:
         traceback.print_exc()
@@ -29,4 +242,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,16 +1,25 @@
 
 import streamlit as st
+import asyncio
+import logging
+import time
 import traceback
-import shutil
-import tempfile
-import os
 from pathlib import Path
+from typing import Optional
 
-from agent.graph import build_agent, init_project_root
+from pydantic import BaseModel
+
+from agent import jobs
+from agent.checkpoint import recent_runs, run_config
+from agent.graph import DEFAULT_MAX_WORKERS, DEFAULT_PIPELINED, build_agent, init_project_root, prepare_resume
+from agent.metrics import METRICS_ENABLED, RunRecorder, start_run
+from agent.packaging import build_project_zip, track_project, untrack_project
+from agent.retention import lease, retention_stats
+from agent.states import Plan
 
 
 def zip_project_folder(project_path: str):
-    """Create a ZIP file of the given project folder and return its path."""
+    """Return the given project folder as in-memory ZIP bytes."""
     if not project_path:
         st.error("❌ No project path provided to zip_project_folder()")
         return None
@@ -20,10 +29,216 @@ def zip_project_folder(project_path: str):
         st.warning("⚠️ No project directory found at runtime.")
         return None
 
-    temp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(temp_dir, f"{project_dir.name}.zip")
-    shutil.make_archive(zip_path.replace(".zip", ""), "zip", project_dir)
-    return zip_path
+    try:
+        with lease(project_dir):
+            return build_project_zip(project_dir)
+    finally:
+        untrack_project(project_dir)
+
+
+def _jsonable(state: dict) -> dict:
+    """Make the final graph state (which holds pydantic models) renderable with st.json."""
+    return {k: v.model_dump() if isinstance(v, BaseModel) else v for k, v in state.items()}
+
+
+def _render_plan(box, plan) -> None:
+    files = "\n".join(f"- `{f.path}` — {f.purpose}" for f in plan.files)
+    box.markdown(f"**🗺️ {plan.name}** · _{plan.techstack}_\n\n{plan.description}\n\n{files}")
+
+
+def _render_tasks(box, task_plan, completed: set[int]) -> None:
+    _render_file_progress(box, jobs.file_progress(task_plan, completed))
+
+
+def _render_file_progress(box, files) -> None:
+    lines = []
+    for path, done, total in files:
+        icon = "✅" if done == total else ("🛠️" if done else "⏳")
+        lines.append(f"{icon} `{path}` — {done}/{total} task(s)")
+    box.markdown("**🏗️ Tasks**\n\n" + "\n".join(f"- {line}" for line in lines))
+
+
+async def stream_generation(agent, inputs: Optional[dict], config: dict, state: Optional[dict] = None) -> dict:
+    """Run the agent with astream, showing plan, task progress and token throughput live.
+
+    Pass `inputs=None` and the checkpointed `state` to continue a resumed run.
+    """
+    status = st.status("🪄 Generating your project...", expanded=True)
+    plan_box, tasks_box, speed_box = status.empty(), status.empty(), status.empty()
+    state = dict(state or inputs or {})
+    if state.get("plan"):
+        _render_plan(plan_box, state["plan"])
+    if state.get("coder_state"):
+        _render_tasks(tasks_box, state["coder_state"].task_plan, set(state["coder_state"].completed_steps))
+    chars, started, last_render = 0, time.monotonic(), 0.0
+
+    async for mode, chunk in agent.astream(inputs, config, stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            chars += jobs.chunk_chars(chunk[0])
+            now = time.monotonic()
+            if now - last_render > 0.5:
+                tokens = chars // 4
+                speed_box.caption(f"⚡ ~{tokens:,} tokens generated · {tokens / (now - started):.0f} tok/s")
+                last_render = now
+            continue
+
+        for node, update in chunk.items():
+            state.update(update or {})
+            if node == "planner":
+                _render_plan(plan_box, state["plan"])
+                status.update(label="🏗️ Breaking the plan into tasks...")
+            elif node == "architect":
+                _render_tasks(tasks_box, state["task_plan"], set())
+                status.update(label="💻 Writing code...")
+            elif node == "pipeline" and state.get("plan"):
+                _render_plan(plan_box, state["plan"])
+                _render_tasks(tasks_box, state["coder_state"].task_plan, set(state["coder_state"].completed_steps))
+            elif node == "coder" and state.get("coder_state"):
+                coder_state = state["coder_state"]
+                _render_tasks(tasks_box, coder_state.task_plan, set(coder_state.completed_steps))
+            elif node == "validate" and state.get("status") == "FIXING":
+                status.update(label=f"🔧 Fixing {len(state['validation'])} file(s) that failed validation...")
+                _render_tasks(tasks_box, state["coder_state"].task_plan, set(state["coder_state"].completed_steps))
+
+    if state.get("status") == "FAILED":
+        status.update(label="⚠️ Generation stopped", state="error", expanded=False)
+    else:
+        status.update(label="✅ Generation finished", state="complete", expanded=False)
+    return state
+
+
+def run_and_package(agent, inputs: Optional[dict], project_path: str, recursion_limit: int,
+                    record_metrics: bool, state: Optional[dict] = None) -> None:
+    """Run (or resume) a generation checkpointed under the project folder's name, then offer the ZIP."""
+    run_id = Path(project_path).name
+    track_project(project_path)
+    with start_run(run_id, enabled=record_metrics) as recorder:
+        config = run_config(run_id, recursion_limit=recursion_limit)
+        if recorder:
+            config["callbacks"] = [recorder.handler]
+        try:
+            result = asyncio.run(stream_generation(agent, inputs, config, state))
+        finally:
+            if recorder:
+                _render_metrics(recorder)
+
+    project_id = None
+    if result.get("status") != "FAILED":
+        from agent.database import save_project  # SQLModel is slow to import; only needed here
+        try:
+            plan = result.get("plan")
+            project_id = save_project(plan.name if plan else run_id, result.get("user_prompt", ""), project_path)
+        except Exception as e:
+            st.caption(f"⚠️ Could not save the project to the library: {e}")
+    _render_outcome(result, run_id, project_path, project_id)
+
+
+def _render_outcome(result: dict, run_id: str, project_path: str, project_id: Optional[int]) -> None:
+    """Report how a run ended, with its final state and the project ZIP."""
+    if result.get("status") == "FAILED":
+        st.warning(
+            f"⚠️ Some tasks failed: {result.get('error')}\n\n"
+            f"Completed work is saved. Pick run `{run_id}` under **Resume a Run** to continue from where it stopped."
+        )
+    else:
+        st.success("🎉 Project generation completed successfully!")
+        if result.get("validation"):
+            st.warning("⚠️ Some files still fail validation:\n\n" + "\n".join(
+                f"- `{path}`: {'; '.join(problems)}" for path, problems in result["validation"].items()
+            ))
+        if project_id is not None:
+            st.caption(f"💾 Saved to the project library as #{project_id}.")
+    with st.expander("📋 View Final Agent Output", expanded=False):
+        st.json(_jsonable(result))
+
+    st.info("📦 Packaging your project files...")
+    zip_bytes = zip_project_folder(project_path)
+
+    if zip_bytes:
+        st.download_button(
+            "⬇️ Download Project ZIP",
+            data=zip_bytes,
+            file_name=f"{run_id}.zip",
+            mime="application/zip",
+            use_container_width=True,
+        )
+        if result.get("status") != "FAILED":
+            st.balloons()
+            st.success("🎊 Your project is ready to download!")
+    else:
+        st.warning("⚠️ No project files found to package.")
+
+
+def _render_metrics(recorder: RunRecorder) -> None:
+    with st.expander("📊 Run Metrics", expanded=False):
+        st.dataframe(recorder.summary(), use_container_width=True, hide_index=True)
+        st.caption(f"Raw events for run `{recorder.run_id}` are appended to `{recorder.path}`.")
+
+
+# ---------------- Background jobs ----------------
+def submit_job(api_key: str, prompt: str, **options) -> str:
+    """Queue a run for the worker processes and keep its id in the URL, so a reload follows it again."""
+    if jobs.JOB_WORKERS:
+        jobs.start_workers()
+    job_id = jobs.submit(prompt, api_key, **options)
+    st.query_params["job"] = job_id
+    return job_id
+
+
+def follow_job(job_id: str) -> None:
+    """Show a job's progress, refreshed in a fragment while it runs, or its outcome once it finished."""
+    job = jobs.get(job_id)
+    if job is None:
+        st.warning(f"⚠️ Job `{job_id}` was not found.")
+        return
+    st.caption(f"🧵 Job `{job_id}` runs in a background worker; reload this page any time to check on it.")
+    if job.finished:
+        _render_job_outcome(job)
+    else:
+        _job_progress(job_id)
+
+
+@st.fragment(run_every=jobs.POLL_INTERVAL_S)
+def _job_progress(job_id: str) -> None:
+    """One snapshot of a running job; the fragment re-renders it without holding the script thread."""
+    job = jobs.get(job_id)
+    if job.finished:
+        st.rerun()  # the whole page then shows the outcome
+    progress = job.progress
+    if job.status == jobs.QUEUED:
+        hint = "" if jobs.JOB_WORKERS else " (start workers with `python -m agent.jobs`)"
+        label = f"⏳ Queued, {jobs.queue_position(job_id)} job(s) ahead{hint}..."
+    else:
+        label = progress.get("stage", "🪄 Generating your project...")
+    status = st.status(label, expanded=True)
+    _render_job_progress(status, progress)
+
+
+def _render_job_progress(box, progress: dict) -> None:
+    if progress.get("plan"):
+        _render_plan(box, Plan.model_validate(progress["plan"]))
+    if progress.get("files"):
+        _render_file_progress(box, progress["files"])
+    if progress.get("tokens"):
+        box.caption(f"⚡ ~{progress['tokens']:,} tokens generated · {progress['tok_s']} tok/s")
+
+
+def _render_job_outcome(job: "jobs.Job") -> None:
+    result = job.result
+    if result is None:
+        st.status("❌ Job failed", state="error", expanded=False)
+        st.error("❌ Oops, something went wrong.")
+        st.code(job.error or "", language="python")
+        return
+    if job.status == jobs.FAILED:
+        status = st.status("⚠️ Generation stopped", state="error", expanded=False)
+    else:
+        status = st.status("✅ Generation finished", state="complete", expanded=False)
+    _render_job_progress(status, job.progress)
+    if result.get("metrics"):
+        with st.expander("📊 Run Metrics", expanded=False):
+            st.dataframe(result["metrics"], use_container_width=True, hide_index=True)
+    _render_outcome(result["state"], result["run_id"], result["project_root"], result.get("project_id"))
 
 
 # def main():
@@ -105,6 +320,8 @@ def zip_project_folder(project_path: str):
 
 
 def main():
+    logging.basicConfig(level=logging.INFO)
+
     # ---------------- Page Setup ----------------
     st.set_page_config(
         page_title="CodePilot 🚀",
@@ -264,12 +481,45 @@ textarea:focus, input:focus {
             )
         )
 
+        max_workers = st.number_input(
+            "⚡ Parallel Coders",
+            min_value=1, max_value=16, value=DEFAULT_MAX_WORKERS,
+            help="How many independent files the coder may implement at the same time."
+        )
+
+        use_cache = st.checkbox(
+            "♻️ Reuse Cached Plans", value=True,
+            help="Skip the planner and architect calls when the same prompt was planned before."
+        )
+
+        pipelined = st.checkbox(
+            "🚀 Pipelined Generation", value=DEFAULT_PIPELINED,
+            help="Start planning tasks and writing code for the first files while the rest of the plan is still being generated."
+        )
+
+        record_metrics = st.checkbox(
+            "📊 Record Metrics", value=METRICS_ENABLED,
+            help="Time every step, LLM call and tool call, and count tokens and bytes written."
+        )
+
+        background = st.checkbox(
+            "🧵 Run in Background", value=jobs.JOBS_ENABLED,
+            help="Queue the run for worker processes; it keeps going when this page is closed or reloaded."
+        )
+
         project_name = st.text_input("🧱 Project Name", placeholder="my_ai_app")
         st.caption("This will be used to create a folder for your generated project.")
 
         st.markdown("---")
         st.caption("💡 Tip: Use a clear, detailed prompt for best results.")
 
+        storage = retention_stats()
+        if storage["sweeps"]:
+            st.caption(
+                f"🧹 {storage['projects']} stored project(s), {storage['bytes_used'] / 1024 ** 2:.1f} MB · "
+                f"{storage['projects_evicted']} evicted, {storage['bytes_freed'] / 1024 ** 2:.1f} MB freed"
+            )
+
     # ---------------- Main Input ----------------
     st.markdown("### ✨ Describe Your Project")
     user_prompt = st.text_area(
@@ -287,6 +537,9 @@ textarea:focus, input:focus {
         """)
 
     # ---------------- Generate Button ----------------
+    job_options = dict(max_workers=max_workers, pipelined=pipelined, use_cache=use_cache,
+                       recursion_limit=recursion_limit, record_metrics=record_metrics)
+    followed = False
     if st.button("🚀 Generate Project", use_container_width=True):
         if not user_prompt.strip():
             st.warning("Please enter a project description.")
@@ -295,47 +548,61 @@ textarea:focus, input:focus {
             st.warning("Please enter your Groq API key.")
             st.stop()
 
-        try:
-            st.info("🧱 Initializing project...")
-            project_path = init_project_root(project_name or "project")
-
-            if not project_path:
-                st.error("❌ Failed to initialize project folder.")
-                st.stop()
-
-            st.info("🤖 Running agent... This may take a few minutes ⏳")
-            agent = build_agent(api_key)
-
-            with st.spinner("🪄 Generating your project..."):
-                result = agent.invoke(
-                    {"user_prompt": user_prompt},
-                    {"recursion_limit": recursion_limit},
+        if background:
+            submit_job(api_key, user_prompt, project_name=project_name or "project", **job_options)
+        else:
+            followed = True  # this run's output replaces that of an earlier job
+            try:
+                st.info("🧱 Initializing project...")
+                project_path = init_project_root(project_name or "project")
+
+                if not project_path:
+                    st.error("❌ Failed to initialize project folder.")
+                    st.stop()
+
+                st.info("🤖 Running agent... This may take a few minutes ⏳")
+                agent = build_agent(api_key, max_workers=max_workers, pipelined=pipelined)
+                run_and_package(
+                    agent,
+                    {"user_prompt": user_prompt, "project_root": project_path, "use_cache": use_cache},
+                    project_path, recursion_limit, record_metrics,
                 )
 
-            st.success("🎉 Project generation completed successfully!")
-            with st.expander("📋 View Final Agent Output", expanded=False):
-                st.json(result)
-
-            st.info("📦 Packaging your project files...")
-            zip_path = zip_project_folder(project_path)
-
-            if zip_path and os.path.exists(zip_path):
-                with open(zip_path, "rb") as f:
-                    st.download_button(
-                        "⬇️ Download Project ZIP",
-                        data=f,
-                        file_name=f"{Path(project_path).name}.zip",
-                        mime="application/zip",
-                        use_container_width=True,
-                    )
-                st.balloons()
-                st.success("🎊 Your project is ready to download!")
+            except Exception as e:
+                st.error("❌ Oops, something went wrong.")
+                st.code(traceback.format_exc(), language="python")
+
+    # ---------------- Resume ----------------
+    with st.expander("♻️ Resume a Run", expanded=False):
+        st.caption("Continue a run that failed or was interrupted, without repeating its finished steps.")
+        runs = recent_runs()
+        run_id = st.selectbox("Run", runs, index=None, placeholder="Select a previous run")
+        if st.button("▶️ Resume Run", use_container_width=True, disabled=not runs):
+            if not run_id:
+                st.warning("Please select a run to resume.")
+                st.stop()
+            if not api_key.strip():
+                st.warning("Please enter your Groq API key.")
+                st.stop()
+            if background:
+                submit_job(api_key, "", resume=run_id, **job_options)
             else:
-                st.warning("⚠️ No project files found to package.")
-
-        except Exception as e:
-            st.error("❌ Oops, something went wrong.")
-            st.code(traceback.format_exc(), language="python")
+                followed = True  # this run's output replaces that of an earlier job
+                try:
+                    agent = build_agent(api_key, max_workers=max_workers, pipelined=pipelined)
+                    state = asyncio.run(prepare_resume(agent, run_config(run_id)))
+                    if state is None:
+                        st.info(f"✅ Run `{run_id}` already finished.")
+                        st.stop()
+                    run_and_package(agent, None, state["project_root"], recursion_limit, record_metrics, state)
+                except Exception:
+                    st.error("❌ Oops, something went wrong.")
+                    st.code(traceback.format_exc(), language="python")
+
+    # ---------------- Background Job ----------------
+    # the job just submitted, or one submitted before this page was (re)loaded
+    if not followed and st.query_params.get("job"):
+        follow_job(st.query_params["job"])
 
     # ---------------- Footer ----------------
     st.markdown("---")
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agent import cache
+from agent.cache import ResponseCache
+
+
+class Clock:
+    """Stands in for time.time() in agent.cache."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    store = ResponseCache(tmp_path / "responses.db", ttl=60)
+    store.put("k", "v")
+    clock.now += 59
+    assert store.get("k") == "v"
+    clock.now += 2
+    assert store.get("k") is None
+
+
+def test_expired_entries_are_not_served_from_disk(tmp_path, clock):
+    ResponseCache(tmp_path / "responses.db", ttl=60).put("k", "v")
+    fresh = ResponseCache(tmp_path / "responses.db", ttl=60)
+    assert fresh.get("k") == "v"
+    clock.now += 61
+    assert ResponseCache(tmp_path / "responses.db", ttl=60).get("k") is None
+
+
+def test_size_budget_evicts_least_recently_used(tmp_path, clock):
+    store = ResponseCache(tmp_path / "responses.db", memory_entries=0, max_bytes=10)
+    store.put("a", "aaaa")
+    clock.now += 1
+    store.put("b", "bbbb")
+    clock.now += 1
+    assert store.get("a") == "aaaa"  # now more recently used than b
+    clock.now += 1
+    store.put("c", "cccc")
+    assert store.get("a") == "aaaa"
+    assert store.get("b") is None
+    assert store.get("c") == "cccc"
+
+
+def test_concurrent_callers_share_one_computation(tmp_path):
+    store = ResponseCache(tmp_path / "responses.db")
+    calls = []
+    started = threading.Event()
+
+    def compute() -> str:
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.get_or_compute("k", compute))) for _ in range(8)]
+    threads[0].start()
+    started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert results == ["value"] * 8
+    assert len(calls) == 1
+
+
+def test_failed_computation_reaches_every_waiter_and_is_not_cached(tmp_path):
+    store = ResponseCache(tmp_path / "responses.db")
+    started = threading.Event()
+
+    def compute() -> str:
+        started.set()
+        time.sleep(0.2)
+        raise RuntimeError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            store.get_or_compute("k", compute)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 2
+    assert store.get_or_compute("k", lambda: "retried") == "retried"
+
+
+def test_async_callers_share_one_computation(tmp_path):
+    store = ResponseCache(tmp_path / "responses.db")
+    calls = []
+
+    async def compute() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(store.aget_or_compute("k", compute) for _ in range(8)))
+
+    assert asyncio.run(main()) == ["value"] * 8
+    assert len(calls) == 1
+    assert store.get("k") == "value"
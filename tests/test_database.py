@@ -0,0 +1,71 @@
+import sqlite3
+
+from sqlalchemy import text
+
+from agent.database import (
+    delete_project, get_engine, init_db, iter_project_files, list_project_files, list_projects, restore_project, save_project,
+)
+
+
+# The schema projects.db had before blobs: one row with the raw content per file.
+BASELINE_SCHEMA = [
+    "CREATE TABLE project (\n\tid INTEGER NOT NULL, \n\tname VARCHAR NOT NULL, \n\tprompt VARCHAR NOT NULL, \n"
+    "\tPRIMARY KEY (id)\n)",
+    "CREATE TABLE projectfile (\n\tid INTEGER NOT NULL, \n\tproject_id INTEGER NOT NULL, \n\tpath VARCHAR NOT NULL, \n"
+    "\tcontent VARCHAR NOT NULL, \n\tPRIMARY KEY (id), \n\tFOREIGN KEY(project_id) REFERENCES project (id)\n)",
+]
+
+
+def count(engine, table: str) -> int:
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar_one()
+
+
+def test_baseline_database_is_migrated_into_blobs(tmp_path):
+    path = tmp_path / "projects.db"
+    with sqlite3.connect(path) as conn:
+        for ddl in BASELINE_SCHEMA:
+            conn.execute(ddl)
+        conn.executemany("INSERT INTO project (id, name, prompt) VALUES (?, ?, ?)",
+                         [(1, "todo", "Build a todo app"), (2, "calc", "Build a calculator")])
+        conn.executemany("INSERT INTO projectfile (project_id, path, content) VALUES (?, ?, ?)", [
+            (1, "index.html", "<html>shared</html>"),
+            (1, "app.js", "console.log('todo');"),
+            (2, "index.html", "<html>shared</html>"),
+            (2, "calc.py", "print(1 + 1)  # ünïcode"),
+        ])
+
+    engine = get_engine(path)
+
+    assert count(engine, "projectfile") == 0
+    assert count(engine, "projectentry") == 4
+    assert count(engine, "blob") == 3  # the shared index.html is stored once
+    assert dict(iter_project_files(1, engine=engine)) == {
+        "app.js": b"console.log('todo');", "index.html": b"<html>shared</html>",
+    }
+    assert dict(iter_project_files(2, engine=engine))["calc.py"] == "print(1 + 1)  # ünïcode".encode()
+    assert {p.name for p in list_projects(engine=engine)} == {"todo", "calc"}
+
+    # running it again finds nothing left to migrate
+    init_db(engine)
+    assert count(engine, "projectentry") == 4
+
+
+def make_project(root, files: dict[str, str]):
+    for rel, content in files.items():
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_text(content)
+    return root
+
+
+def test_identical_files_share_blobs_and_survive_deletes(tmp_path):
+    engine = get_engine(tmp_path / "projects.db")
+    first = save_project("a", "prompt a", make_project(tmp_path / "a", {"style.css": "body{}", "a.js": "1"}), engine)
+    second = save_project("b", "prompt b", make_project(tmp_path / "b", {"css/style.css": "body{}", "b.js": "2"}), engine)
+    assert count(engine, "blob") == 3
+    assert list_project_files(second, engine=engine) == [("b.js", 1), ("css/style.css", 6)]
+
+    delete_project(first, engine=engine)
+    assert count(engine, "blob") == 2  # a.js is gone, the shared stylesheet is kept
+    assert restore_project(second, tmp_path / "restored", engine=engine) == 2
+    assert (tmp_path / "restored" / "css" / "style.css").read_text() == "body{}"
@@ -0,0 +1,49 @@
+import errno
+import os
+import stat
+
+from agent import depcache
+from agent.objects import write_private
+
+
+def make_tree(root):
+    (root / "pkg" / "lib").mkdir(parents=True)
+    (root / "pkg" / "index.js").write_text("module.exports = 1;\n")
+    (root / "pkg" / "lib" / "util.js").write_text("exports.x = 2;\n")
+    (root / "pkg" / "main.js").symlink_to("index.js")
+
+
+def unsupported(*args):
+    raise OSError(errno.EOPNOTSUPP, "not supported")
+
+
+def cross_device(*args):
+    raise OSError(errno.EXDEV, "cross-device link")
+
+
+def test_unclonable_trees_are_linked_read_only_and_written_privately(tmp_path, monkeypatch):
+    monkeypatch.setattr(depcache, "_clone", unsupported)
+    make_tree(tmp_path / "cache")
+    assert depcache.copy_tree(tmp_path / "cache", tmp_path / "project") == "link"
+
+    cached, restored = tmp_path / "cache" / "pkg" / "index.js", tmp_path / "project" / "pkg" / "index.js"
+    assert os.path.samefile(cached, restored)
+    assert not stat.S_IMODE(restored.stat().st_mode) & 0o222
+    assert (tmp_path / "project" / "pkg" / "main.js").is_symlink()
+
+    write_private(restored, b"module.exports = 2;\n")
+    assert restored.read_text() == "module.exports = 2;\n"
+    assert cached.read_text() == "module.exports = 1;\n"
+
+
+def test_trees_are_copied_when_nothing_can_be_shared(tmp_path, monkeypatch):
+    monkeypatch.setattr(depcache, "_clone", unsupported)
+    monkeypatch.setattr(depcache, "_link_read_only", cross_device)
+    make_tree(tmp_path / "cache")
+    assert depcache.copy_tree(tmp_path / "cache", tmp_path / "project") == "copy"
+
+    restored = tmp_path / "project" / "pkg" / "lib" / "util.js"
+    assert restored.read_text() == "exports.x = 2;\n"
+    assert not os.path.samefile(tmp_path / "cache" / "pkg" / "lib" / "util.js", restored)
+    restored.write_text("exports.x = 3;\n")
+    assert (tmp_path / "cache" / "pkg" / "lib" / "util.js").read_text() == "exports.x = 2;\n"
@@ -0,0 +1,135 @@
+import sqlite3
+import stat
+import threading
+
+import pytest
+
+from agent import jobs
+
+
+class Clock:
+    """Stands in for time.time() in agent.jobs."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobs.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def db(tmp_path):
+    return tmp_path / "jobs.db"
+
+
+def stored_key(db, job_id):
+    with sqlite3.connect(db) as conn:
+        return conn.execute("SELECT api_key FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+
+def test_claim_takes_the_oldest_queued_job_with_its_key(db, clock):
+    first = jobs.submit("first", "key-1", path=db)
+    clock.now += 1
+    second = jobs.submit("second", path=db)
+
+    job, key = jobs.claim("w1", path=db)
+    assert (job.id, key, job.status, job.worker, job.attempts) == (first, "key-1", jobs.RUNNING, "w1", 1)
+    assert job.request["prompt"] == "first"
+    job, key = jobs.claim("w2", path=db)
+    assert (job.id, key) == (second, None)
+    assert jobs.claim("w3", path=db) is None
+
+
+def test_concurrent_workers_never_claim_the_same_job(db):
+    submitted = {jobs.submit(f"job {i}", path=db) for i in range(20)}
+    claimed, lock = [], threading.Lock()
+
+    def work(name):
+        while (taken := jobs.claim(name, path=db)) is not None:
+            with lock:
+                claimed.append(taken[0].id)
+
+    threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+    assert sorted(claimed) == sorted(submitted)
+
+
+def test_job_of_a_dead_worker_is_requeued_with_its_key(db, clock):
+    job_id = jobs.submit("prompt", "key", path=db)
+    jobs.claim("dead", path=db)
+    jobs.heartbeat(job_id, run_id="project_123", path=db)
+
+    clock.now += jobs.STALE_AFTER_S - 1
+    assert jobs.claim("w2", path=db) is None  # still heartbeating recently enough
+    clock.now += 2
+    job, key = jobs.claim("w2", path=db)
+    assert (job.id, key, job.worker, job.attempts) == (job_id, "key", "w2", 2)
+    assert job.run_id == "project_123"  # the new worker resumes the checkpoint
+
+
+def test_heartbeats_keep_a_job_with_its_worker(db, clock):
+    job_id = jobs.submit("prompt", path=db)
+    jobs.claim("w1", path=db)
+    for _ in range(3):
+        clock.now += jobs.STALE_AFTER_S - 1
+        jobs.heartbeat(job_id, {"stage": "coding"}, path=db)
+        assert jobs.claim("w2", path=db) is None
+    job = jobs.get(job_id, path=db)
+    assert (job.status, job.worker, job.progress) == (jobs.RUNNING, "w1", {"stage": "coding"})
+
+
+def test_job_fails_after_max_attempts_and_its_key_is_deleted(db, clock, monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_ATTEMPTS", 2)
+    job_id = jobs.submit("prompt", "key", path=db)
+    for worker in ("w1", "w2"):
+        assert jobs.claim(worker, path=db)[0].id == job_id
+        clock.now += jobs.STALE_AFTER_S + 1
+    assert jobs.claim("w3", path=db) is None
+    job = jobs.get(job_id, path=db)
+    assert job.status == jobs.FAILED and job.finished
+    assert "stopped responding" in job.error
+    assert stored_key(db, job_id) is None
+
+
+def test_release_requeues_without_using_an_attempt(db):
+    job_id = jobs.submit("prompt", path=db)
+    jobs.claim("w1", path=db)
+    jobs.release(job_id, path=db)
+    job = jobs.get(job_id, path=db)
+    assert (job.status, job.worker, job.attempts) == (jobs.QUEUED, None, 0)
+    assert jobs.claim("w2", path=db)[0].id == job_id
+
+
+def test_finish_stores_the_result_and_deletes_the_key(db):
+    job_id = jobs.submit("prompt", "key", path=db)
+    jobs.claim("w1", path=db)
+    jobs.finish(job_id, jobs.DONE, {"status": "DONE", "run_id": "project_1"}, path=db)
+    job = jobs.get(job_id, path=db)
+    assert job.finished and job.result == {"status": "DONE", "run_id": "project_1"}
+    assert stored_key(db, job_id) is None
+    assert jobs.claim("w2", path=db) is None
+
+
+def test_unclaimed_job_keys_expire(db, clock):
+    with_key = jobs.submit("prompt", "key", path=db)
+    without_key = jobs.submit("prompt", path=db)
+    clock.now += jobs.KEY_TTL_S + 1
+    job = jobs.get(with_key, path=db)
+    assert job.status == jobs.FAILED and "API key was deleted" in job.error
+    assert stored_key(db, with_key) is None
+    assert jobs.get(without_key, path=db).status == jobs.QUEUED
+
+
+def test_queue_database_is_private(db):
+    jobs.submit("prompt", "key", path=db)
+    assert stat.S_IMODE(db.stat().st_mode) == 0o600
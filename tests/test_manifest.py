@@ -0,0 +1,91 @@
+import os
+import shutil
+
+from agent.manifest import ProjectManifest, is_ignored
+
+
+def changed(path, before: int) -> None:
+    """Make sure `path` shows a new mtime even on filesystems with coarse timestamps."""
+    if path.stat().st_mtime_ns == before:
+        os.utime(path, ns=(before + 1_000_000, before + 1_000_000))
+
+
+def make_project(root):
+    (root / "src" / "lib").mkdir(parents=True)
+    (root / "index.html").write_text("")
+    (root / "src" / "app.js").write_text("")
+    (root / "src" / "lib" / "util.js").write_text("")
+    (root / "node_modules" / "pkg").mkdir(parents=True)
+    (root / "node_modules" / "pkg" / "index.js").write_text("")
+
+
+def test_first_listing_scans_the_tree_without_ignored_dirs(tmp_path):
+    make_project(tmp_path)
+    manifest = ProjectManifest(tmp_path)
+    assert manifest.list() == ["index.html", "src/app.js", "src/lib/util.js"]
+    assert manifest.list("src/lib/") == ["src/lib/util.js"]
+    assert manifest.list("sr") == []
+    assert "src/app.js" in manifest and "node_modules/pkg/index.js" not in manifest
+
+
+def test_added_files_are_listed_without_a_rescan(tmp_path):
+    make_project(tmp_path)
+    manifest = ProjectManifest(tmp_path)
+    manifest.list()
+    (tmp_path / "new" / "deep").mkdir(parents=True)
+    (tmp_path / "new" / "deep" / "a.py").write_text("")
+    manifest.add("new/deep/a.py")
+    manifest.add("node_modules/x.js")
+    assert manifest.list("new") == ["new/deep/a.py"]
+    assert "node_modules/x.js" not in manifest
+
+
+def test_external_changes_are_picked_up_from_directory_mtimes(tmp_path):
+    make_project(tmp_path)
+    manifest = ProjectManifest(tmp_path)
+    manifest.list()
+
+    src = tmp_path / "src"
+    before = src.stat().st_mtime_ns
+    (src / "extra.js").write_text("")
+    (src / "app.js").unlink()
+    (src / "components").mkdir()
+    (src / "components" / "Button.jsx").write_text("")
+    changed(src, before)
+
+    before = tmp_path.stat().st_mtime_ns
+    (tmp_path / "node_modules" / "other.js").write_text("")
+    (tmp_path / "dist").mkdir()
+    changed(tmp_path, before)
+
+    assert manifest.list() == ["index.html", "src/components/Button.jsx", "src/extra.js", "src/lib/util.js"]
+
+
+def test_removed_directories_drop_their_files(tmp_path):
+    make_project(tmp_path)
+    manifest = ProjectManifest(tmp_path)
+    manifest.list()
+    before = tmp_path.stat().st_mtime_ns
+    shutil.rmtree(tmp_path / "src")
+    changed(tmp_path, before)
+    assert manifest.list() == ["index.html"]
+
+
+def test_mark_dirty_forces_a_full_rescan(tmp_path):
+    make_project(tmp_path)
+    manifest = ProjectManifest(tmp_path)
+    manifest.list()
+    lib = tmp_path / "src" / "lib"
+    stat = lib.stat()
+    (lib / "hidden.js").write_text("")
+    # a change the directory mtimes do not show
+    os.utime(lib, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert "src/lib/hidden.js" not in manifest
+    manifest.mark_dirty()
+    assert "src/lib/hidden.js" in manifest
+
+
+def test_is_ignored_checks_every_path_part():
+    assert is_ignored("node_modules/react/index.js")
+    assert is_ignored("app/__pycache__/main.cpython-312.pyc")
+    assert not is_ignored("src/node_modules_helper.js")
@@ -0,0 +1,104 @@
+import hashlib
+import io
+import os
+import stat
+import time
+import zipfile
+
+from agent import packaging, tools
+from agent.objects import get_object_store
+
+
+def unzip(data: bytes) -> dict[str, bytes]:
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        return {name: zf.read(name) for name in zf.namelist()}
+
+
+def make_project(root):
+    (root / "src").mkdir()
+    (root / "index.html").write_text("<!doctype html><title>café</title>\n" * 50, encoding="utf-8")
+    (root / "src" / "app.js").write_text("console.log('hi');\n")
+    (root / "src" / "ünïcode.txt").write_text("names are stored as UTF-8\n", encoding="utf-8")
+    (root / "empty.txt").write_bytes(b"")
+
+
+def expected_files(root) -> dict[str, bytes]:
+    return {
+        "index.html": (root / "index.html").read_bytes(),
+        "src/app.js": (root / "src" / "app.js").read_bytes(),
+        "src/ünïcode.txt": (root / "src" / "ünïcode.txt").read_bytes(),
+        "empty.txt": b"",
+    }
+
+
+def test_zip_of_untracked_project_is_readable(tmp_path):
+    make_project(tmp_path)
+    assert unzip(packaging.build_project_zip(tmp_path)) == expected_files(tmp_path)
+
+
+def test_zip_skips_dependencies_but_keeps_build_output(tmp_path):
+    for rel in ("node_modules/pkg/index.js", ".venv/bin/python", "src/__pycache__/app.cpython-312.pyc",
+                ".git/HEAD", "dist/bundle.js", "build/index.html", ".env.example"):
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_text(rel)
+    assert sorted(unzip(packaging.build_project_zip(tmp_path))) == [".env.example", "build/index.html", "dist/bundle.js"]
+
+
+def test_zip_reuses_entries_compressed_on_write_and_sees_later_changes(tmp_path):
+    packaging.track_project(tmp_path)
+    try:
+        with tools.project_context(tmp_path):
+            tools.write_file.invoke({"path": "main.py", "content": "print('v1')\n" * 100})
+            tools.write_file.invoke({"path": "lib/util.py", "content": "X = 1\n"})
+        # changed behind the tools' back, e.g. by a command the agent ran
+        (tmp_path / "lib" / "util.py").write_text("X = 2\n")
+        files = unzip(packaging.build_project_zip(tmp_path))
+    finally:
+        packaging.untrack_project(tmp_path)
+    assert files == {"main.py": b"print('v1')\n" * 100, "lib/util.py": b"X = 2\n"}
+
+
+def test_entries_survive_linking_into_the_object_store(tmp_path, monkeypatch):
+    store = get_object_store(tmp_path)
+    os.makedirs(tmp_path / "older")
+    store.write(tmp_path / "older" / "main.py", b"print('shared')\n")  # the blob already exists
+    os.utime(store.object_path(hashlib.sha256(b"print('shared')\n").hexdigest()), (0, 0))
+    root = tmp_path / "project"
+    packaging.track_project(root)
+    try:
+        with tools.project_context(root):
+            tools.write_file.invoke({"path": "main.py", "content": "print('shared')\n"})
+            tools.write_file.invoke({"path": "new.py", "content": "print('new')\n" * 20})
+        written = {name: (root / name).stat().st_mtime for name in ("main.py", "new.py")}
+        assert store.link_tree(root, ["main.py", "new.py"]) == 2
+
+        monkeypatch.setattr(packaging, "_deflate", None)  # nothing is compressed again
+        data = packaging.build_project_zip(root)
+    finally:
+        packaging.untrack_project(root)
+    assert unzip(data) == {"main.py": b"print('shared')\n", "new.py": b"print('new')\n" * 20}
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        for name, mtime in written.items():
+            # the files' own dates, not the blobs'
+            assert abs(time.mktime(zf.getinfo(name).date_time + (0, 0, -1)) - mtime) <= 2
+
+
+def test_read_only_files_extract_writable(tmp_path):
+    path = tmp_path / "blob.txt"
+    path.write_text("shared\n")
+    path.chmod(0o444)
+    with zipfile.ZipFile(io.BytesIO(packaging.build_project_zip(tmp_path))) as zf:
+        mode = zf.getinfo("blob.txt").external_attr >> 16
+    assert stat.S_IMODE(mode) & stat.S_IWUSR
+
+
+def test_zip64_fallback_is_readable(tmp_path, monkeypatch):
+    make_project(tmp_path)
+    monkeypatch.setattr(packaging, "_ZIP32_LIMIT", 64)
+    assert unzip(packaging.build_project_zip(tmp_path)) == expected_files(tmp_path)
+
+
+def test_empty_project(tmp_path):
+    os.makedirs(tmp_path / "empty_dir")
+    assert unzip(packaging.build_project_zip(tmp_path)) == {}
@@ -0,0 +1,39 @@
+import pytest
+
+from agent.patching import PatchConflict, apply_search_replace
+
+
+SOURCE = "def add(a, b):\n    return a + b\n\n\ndef sub(a, b):\n    return a - b\n"
+
+
+def test_hunks_apply_in_order():
+    edits = [
+        {"search": "return a + b", "replace": "return a + b + 0"},
+        {"search": "return a + b + 0", "replace": "return b + a"},
+    ]
+    assert apply_search_replace(SOURCE, edits) == SOURCE.replace("return a + b", "return b + a")
+
+
+def test_missing_replace_deletes_the_match():
+    assert apply_search_replace("a\nb\nc\n", [{"search": "b\n"}]) == "a\nc\n"
+
+
+def test_search_text_not_found_points_at_whitespace_mismatch():
+    with pytest.raises(PatchConflict, match=r"hunk 1: search text not found \(its first line matches line 1"):
+        apply_search_replace(SOURCE, [{"search": "def add(a, b):\n  return a + b", "replace": ""}])
+
+
+def test_ambiguous_search_text_is_rejected():
+    with pytest.raises(PatchConflict, match="matches 2 places"):
+        apply_search_replace(SOURCE, [{"search": "(a, b):", "replace": "(x, y):"}])
+
+
+def test_empty_search_text_is_rejected():
+    with pytest.raises(PatchConflict, match="empty search text"):
+        apply_search_replace(SOURCE, [{"search": "", "replace": "x"}])
+
+
+def test_all_problems_are_reported_together():
+    with pytest.raises(PatchConflict) as info:
+        apply_search_replace(SOURCE, [{"search": "missing"}, {"search": "return"}])
+    assert "hunk 1:" in str(info.value) and "hunk 2:" in str(info.value)
@@ -0,0 +1,168 @@
+import asyncio
+import time
+
+import groq
+import httpx
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_groq.chat_models import ChatGroq
+
+from agent.ratelimit import RateLimitedChatGroq, RateLimiter, parse_rate_limit_headers
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_token_budget_refills_continuously_and_settles_with_real_usage():
+    limiter = RateLimiter(rpm=1000, tpm=600_000)  # 10 000 tokens a second
+
+    async def scenario():
+        assert await limiter.acquire(590_000) < 0.05
+        waited = await limiter.acquire(12_000)  # 2 000 short: about 0.2 s of refill
+        assert 0.1 < waited < 2
+        limiter.release(590_000, 10_000, 0.1)  # used far less than reserved
+        limiter.release(12_000, 12_000, 0.1)
+        assert await limiter.acquire(500_000) < 0.05
+
+    run(scenario())
+
+
+def test_each_call_spends_one_request():
+    limiter = RateLimiter(rpm=120, tpm=1_000_000)
+
+    async def scenario():
+        for _ in range(3):
+            await limiter.acquire(10)
+            limiter.release(10, 10, 0.1)
+
+    run(scenario())
+    assert 116.9 <= limiter.snapshot()["requests_left"] <= 117.5
+
+
+def test_concurrency_bounds_calls_in_flight():
+    limiter = RateLimiter(rpm=1000, tpm=1_000_000, max_concurrency=2)
+
+    async def scenario():
+        await limiter.acquire(10)
+        await limiter.acquire(10)
+        third = asyncio.ensure_future(limiter.acquire(10))
+        await asyncio.sleep(0.1)
+        assert not third.done()
+        limiter.release(10, 10, 0.1)
+        await asyncio.wait_for(third, 1)
+
+    run(scenario())
+
+
+def test_rate_limit_halves_concurrency_and_pauses_every_call():
+    limiter = RateLimiter(rpm=1000, tpm=1_000_000, max_concurrency=8)
+    assert limiter.snapshot()["concurrency"] == 4
+
+    async def scenario():
+        await limiter.acquire(10)
+        limiter.release_failed(rate_limited=True, retry_after=0.3)
+        assert limiter.snapshot()["concurrency"] == 2
+        started = time.monotonic()
+        await limiter.acquire(10)
+        return time.monotonic() - started
+
+    assert 0.25 <= run(scenario()) < 2
+
+
+def test_concurrency_grows_additively_and_backs_off_on_latency_spikes():
+    limiter = RateLimiter(rpm=1000, tpm=1_000_000, max_concurrency=8)
+
+    async def call(latency):
+        await limiter.acquire(10)
+        limiter.release(10, 10, latency)
+
+    async def scenario():
+        for _ in range(60):
+            await call(0.1)
+        grown = limiter.snapshot()["concurrency"]
+        for _ in range(3):
+            await call(1.0)
+        return grown, limiter.snapshot()["concurrency"]
+
+    grown, spiked = run(scenario())
+    assert grown == 8
+    assert spiked < grown
+
+
+def test_waiting_runs_are_served_round_robin():
+    limiter = RateLimiter(rpm=1000, tpm=1_000_000, max_concurrency=1)
+    order = []
+
+    async def call(run_key, name):
+        await limiter.acquire(10, run_key)
+        order.append(name)
+        limiter.release(10, 10, 0.1)
+
+    async def scenario():
+        await limiter.acquire(10, "holder")
+        tasks = [asyncio.ensure_future(call("a", n)) for n in ("a1", "a2", "a3")]
+        tasks.append(asyncio.ensure_future(call("b", "b1")))
+        await asyncio.sleep(0.05)
+        limiter.release(10, 10, 0.1)
+        await asyncio.gather(*tasks)
+
+    run(scenario())
+    assert order == ["a1", "b1", "a2", "a3"]
+
+
+def test_budgets_are_unlimited_until_the_provider_reports_them():
+    limiter = RateLimiter(max_concurrency=8)
+
+    async def scenario():
+        for _ in range(200):
+            await limiter.acquire(100_000)
+            limiter.release(100_000, 100_000, 0.1)
+
+    run(scenario())
+    assert limiter.snapshot()["tokens_left"] is None
+
+
+def test_budgets_follow_rate_limit_headers():
+    assert parse_rate_limit_headers({
+        "x-ratelimit-limit-requests": "1000", "x-ratelimit-remaining-requests": "999",
+        "x-ratelimit-reset-requests": "1m26.4s",
+        "x-ratelimit-limit-tokens": "6000", "x-ratelimit-remaining-tokens": "100", "x-ratelimit-reset-tokens": "590ms",
+    }) == {"requests": (1000.0, 999.0, 86.4), "tokens": (6000.0, 100.0, 0.59)}
+
+    limiter = RateLimiter()
+    limiter.on_response(httpx.Response(200, headers={
+        "x-ratelimit-limit-tokens": "6000", "x-ratelimit-remaining-tokens": "1000", "x-ratelimit-reset-tokens": "0.5s",
+    }))
+    assert 1000 <= limiter.snapshot()["tokens_left"] < 1500
+    assert limiter.snapshot()["requests_left"] is None
+
+    async def scenario():
+        # 2000 tokens with 1000 left; the key refills 5000 in 0.5 s
+        return await limiter.acquire(2000)
+
+    assert 0.05 < run(scenario()) < 1
+
+
+def test_sync_calls_go_through_the_limiter(monkeypatch):
+    calls = []
+
+    def generate(self, messages, stop=None, run_manager=None, **kwargs):
+        calls.append(messages)
+        if len(calls) == 1:
+            request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+            raise groq.RateLimitError("slow down", response=httpx.Response(429, request=request,
+                                      headers={"retry-after": "0.2"}), body=None)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="hi"))])
+
+    monkeypatch.setattr(ChatGroq, "_generate", generate)
+    limiter = RateLimiter(rpm=1000, tpm=1_000_000, max_concurrency=4)
+    llm = RateLimitedChatGroq(model="fake", groq_api_key="gsk_test", max_retries=0, limiter=limiter)
+
+    started = time.monotonic()
+    assert llm.invoke("hello").content == "hi"
+    assert time.monotonic() - started >= 0.15  # waited out the retry-after pause
+    assert len(calls) == 2
+    snapshot = limiter.snapshot()
+    assert snapshot["inflight"] == 0 and snapshot["concurrency"] < 4  # halved, then grew back by one success
+    assert snapshot["requests_left"] < 999
@@ -0,0 +1,63 @@
+import sqlite3
+
+import numpy as np
+
+from agent import retrieval
+from agent.retrieval import SimilarityIndex, embed
+
+
+FILES = {
+    "index.html": "<html><body><div id='board'></div><script src='game.js'></script></body></html>",
+    "game.js": "function checkWinner(board) { return board[0] === board[1] && board[1] === board[2]; }",
+    "todo.js": "function addTodo(list, item) { list.push({ text: item, done: false }); }",
+    "style.css": "body { font-family: sans-serif; } #board { display: grid; }",
+}
+
+
+def reference_scores(index: SimilarityIndex, text: str) -> np.ndarray:
+    """Cosine similarities of the IDF-weighted vectors, computed the direct way."""
+    n = index._size
+    idf = np.log((1 + n) / (1 + index._df)) + 1
+    docs = index._matrix[:n] * idf
+    query = embed(text) * idf
+    return docs @ query / (np.linalg.norm(docs, axis=1) * np.linalg.norm(query))
+
+
+def test_scores_match_idf_weighted_cosine_similarity(tmp_path):
+    index = SimilarityIndex(tmp_path / "retrieval.db")
+    for name, text in FILES.items():
+        index.add("file", "tictactoe", name, text)
+    query = "check the winner on the tic tac toe board"
+    expected = reference_scores(index, query)
+
+    matches = index.search(query, "file", k=len(FILES))
+    assert [m.path for m in matches] == [list(FILES)[i] for i in np.argsort(-expected) if expected[i] > 0]
+    assert np.allclose([m.score for m in matches], sorted(expected[expected > 0], reverse=True), atol=1e-5)
+
+    # adding a document changes the IDF weights, and so the cached norms
+    index.add("file", "todo", "app.js", "function render(list) { list.forEach(draw); }")
+    expected = reference_scores(index, query)
+    assert np.isclose(index.search(query, "file", k=1)[0].score, expected.max(), atol=1e-5)
+    assert [m.path for m in index.search(query, "file", suffix=".css")] == ["style.css"]
+    assert [m.path for m in index.search("render the todo list", "file", exclude_project="tictactoe")] == ["app.js"]
+
+
+def test_each_kind_keeps_its_newest_documents(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "MAX_DOCUMENTS", 10)
+    index = SimilarityIndex(tmp_path / "retrieval.db")
+    index.add("plan", "p", "", "a plan that is never dropped")
+    for i in range(25):
+        index.add("file", f"project{i}", "main.py", f"print('project {i}')")
+
+    with sqlite3.connect(tmp_path / "retrieval.db") as conn:
+        kept = [int(p[len("project"):]) for (p,) in conn.execute("SELECT project FROM documents WHERE kind = 'file'")]
+    assert 9 <= len(kept) <= 10
+    assert sorted(kept) == list(range(25 - len(kept), 25))
+    assert index._size == len(kept) + 1
+    assert index.search("print project 24", "file", k=1)[0].project == "project24"
+    assert index.search("a plan", "plan")[0].project == "p"
+
+    reloaded = SimilarityIndex(tmp_path / "retrieval.db")
+    assert reloaded.search("print project 24", "file", k=1)[0].project == "project24"
+    assert np.array_equal(reloaded._df, index._df)
+    assert reloaded._size == index._size
@@ -0,0 +1,82 @@
+from agent.scheduler import build_task_graph, critical_path_length, ready_nodes
+from agent.states import ImplementationTask, TaskPlan
+
+
+def plan(*steps: tuple) -> TaskPlan:
+    """A TaskPlan from (filepath, description[, depends_on]) tuples."""
+    return TaskPlan(implementation_steps=[
+        ImplementationTask(filepath=step[0], task_description=step[1], depends_on=list(step[2]) if len(step) > 2 else [])
+        for step in steps
+    ])
+
+
+def test_steps_on_one_file_coalesce_into_one_node():
+    nodes = build_task_graph(plan(
+        ("app.js", "create the app shell"),
+        ("app.js", "add the todo list"),
+        ("app.js", "add persistence"),
+    ))
+    assert list(nodes) == [0]
+    assert nodes[0].steps == [0, 1, 2]
+
+
+def test_coalescing_respects_max_tasks_and_keeps_file_order():
+    nodes = build_task_graph(plan(*[("app.js", f"step {i}") for i in range(5)]), max_tasks=2)
+    assert [n.steps for n in nodes.values()] == [[0, 1], [2, 3], [4]]
+    assert nodes[2].deps == {0}
+    assert nodes[4].deps == {2}
+
+
+def test_coalescing_respects_max_chars():
+    nodes = build_task_graph(plan(("a.py", "x" * 60), ("a.py", "y" * 60)), max_chars=100)
+    assert len(nodes) == 2
+
+
+def test_independent_files_run_in_parallel():
+    nodes = build_task_graph(plan(("a.py", "write a"), ("b.py", "write b"), ("c.py", "write c")))
+    assert [n.key for n in ready_nodes(nodes, set())] == [0, 1, 2]
+    assert critical_path_length(nodes) == 1
+
+
+def test_mentions_create_dependencies_on_earlier_files():
+    nodes = build_task_graph(plan(
+        ("utils.py", "helpers"),
+        ("styles/main.css", "page styles"),
+        ("main.py", "from utils import helpers and run them"),
+        ("index.html", "link main.css in the head"),
+    ))
+    assert nodes[2].deps == {0}
+    assert nodes[3].deps == {1}
+    assert [n.key for n in ready_nodes(nodes, {0})] == [1, 2]
+
+
+def test_step_needing_a_new_dependency_starts_a_new_node():
+    nodes = build_task_graph(plan(
+        ("index.html", "create the page skeleton"),
+        ("style.css", "style the page"),
+        ("index.html", "link style.css in the head"),
+    ))
+    assert sorted(nodes) == [0, 1, 2]
+    assert nodes[2].deps == {0, 1}
+    assert [n.key for n in ready_nodes(nodes, set())] == [0, 1]
+    assert critical_path_length(nodes) == 2
+
+
+def test_explicit_forward_dependency_is_honoured():
+    nodes = build_task_graph(plan(
+        ("main.py", "entry point", ["config.py"]),
+        ("config.py", "settings"),
+    ))
+    assert nodes[0].deps == {1}
+    assert [n.key for n in ready_nodes(nodes, set())] == [1]
+
+
+def test_forward_dependency_that_would_form_a_cycle_is_dropped():
+    nodes = build_task_graph(plan(
+        ("a.py", "module a", ["b.py"]),
+        ("b.py", "module b", ["a.py"]),
+    ))
+    # b waits for a (ordered before it); the edge back from a to b is ignored
+    assert nodes[1].deps == {0}
+    assert nodes[0].deps == set()
+    assert critical_path_length(nodes) == 2
@@ -0,0 +1,60 @@
+import os
+
+from agent.symbols import SymbolIndex, estimate_tokens, extract_symbols, pack_context
+
+
+def test_extracts_python_js_html_and_css_symbols():
+    assert extract_symbols("app.py", "import os\nMAX = 3\n\ndef run(a, b=1):\n    pass\n\nclass Store(Base):\n"
+                                     "    def __init__(self, path):\n        pass\n    def _hidden(self):\n        pass\n") == [
+        "MAX = ...", "def run(a, b=1)", "class Store(Base): __init__(self, path)",
+    ]
+    assert extract_symbols("store.js", "export function add(a, b) {}\nexport const total = (xs) => 0;\n") == [
+        "export function add(a, b)", "export const total = (xs) =>",
+    ]
+    assert extract_symbols("index.html", '<div id="app"></div><script src="app.js"></script>') == ["#app", "uses app.js"]
+    assert extract_symbols("style.css", "/* x */ .btn, #app { color: red }\nbody { margin: 0 }") == [".btn", "#app", "body"]
+    assert extract_symbols("README.md", "# Title") == []
+
+
+def write(root, rel, text):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_packs_related_files_in_order_skipping_self_and_missing(tmp_path):
+    write(tmp_path, "utils.py", "def helper(x):\n    pass\n")
+    write(tmp_path, "store.js", "export function save(item) {}\n")
+    write(tmp_path, "notes.txt", "no symbols here")
+    context = pack_context(tmp_path, "main.py", ["store.js", "main.py", "missing.py", "notes.txt", "utils.py", "store.js"])
+    assert context == "store.js:\n  export function save(item)\nutils.py:\n  def helper(x)"
+
+
+def test_packing_stays_within_the_budget_and_truncates_the_last_file(tmp_path):
+    write(tmp_path, "a.py", "".join(f"def function_number_{i}(argument):\n    pass\n" for i in range(50)))
+    write(tmp_path, "b.py", "def later():\n    pass\n")
+    context = pack_context(tmp_path, "main.py", ["a.py", "b.py"], budget_tokens=60)
+    lines = context.splitlines()
+    assert lines[0] == "a.py:"
+    assert 1 < len(lines) < 51
+    assert sum(estimate_tokens(line) for line in lines) <= 60
+    assert "b.py:" not in context
+
+
+def test_a_file_whose_first_symbol_does_not_fit_is_skipped(tmp_path):
+    params = ", ".join(f"parameter_{i}" for i in range(400))
+    write(tmp_path, "big.py", f"def huge({params}):\n    pass\n")
+    write(tmp_path, "small.py", "def helper(a, b):\n    pass\n")
+    context = pack_context(tmp_path, "main.py", ["big.py", "small.py"], budget_tokens=200)
+    assert context == "small.py:\n  def helper(a, b)"
+
+
+def test_index_refreshes_when_a_file_changes(tmp_path):
+    write(tmp_path, "m.py", "def old():\n    pass\n")
+    index = SymbolIndex(tmp_path)
+    assert index.symbols("m.py") == ["def old()"]
+    mtime = (tmp_path / "m.py").stat().st_mtime_ns
+    write(tmp_path, "m.py", "def new():\n    pass\n")
+    os.utime(tmp_path / "m.py", ns=(mtime + 1_000_000, mtime + 1_000_000))
+    assert index.symbols("m.py") == ["def new()"]
+    assert index.symbols("gone.py") == []
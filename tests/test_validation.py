@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from agent import graph, retrieval, validation
+from agent.validation import check_file, validate_files
+from benchmarks.fake_llm import FakeChatGroq
+
+
+@pytest.fixture(autouse=True)
+def in_process(monkeypatch):
+    monkeypatch.setattr(validation, "VALIDATION_WORKERS", 0)
+
+
+def write(root, rel, text):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def test_checks_syntax_and_local_references(tmp_path):
+    write(tmp_path, "ok.py", "def f():\n    return 1\n")
+    write(tmp_path, "bad.py", "def f(:\n    pass\n")
+    write(tmp_path, "data.json", '{"a": 1,}')
+    write(tmp_path, "index.html", '<html><body><script src="app.js"></script><script src="missing.js"></script></body></html>')
+    write(tmp_path, "app.js", "function add(a, b) { return a + b; }\n")
+    write(tmp_path, "broken.js", "function add(a, b) { return [a, b; }\n")
+    write(tmp_path, "notes.txt", "not checked (")
+    files = ["ok.py", "bad.py", "data.json", "index.html", "app.js", "broken.js", "notes.txt"]
+
+    issues = asyncio.run(validate_files(str(tmp_path), files))
+
+    assert set(issues) == {"bad.py", "data.json", "index.html", "broken.js"}
+    assert any("missing.js" in problem for problem in issues["index.html"])
+    assert check_file(str(tmp_path), "app.js", frozenset(files)) == []
+
+
+class BrokenOnce(FakeChatGroq):
+    """Writes `broken` with a syntax error until the coder is asked to fix it."""
+
+    broken: str = ""
+    fix_prompts: list = []
+
+    def _reply(self, messages):
+        reply = super()._reply(messages)
+        for call in reply.tool_calls:
+            if call["args"]["path"] == self.broken:
+                if "Fix these problems" in str(messages[-1].content):
+                    self.fix_prompts.append(str(messages[-1].content))
+                else:
+                    call["args"]["content"] = "function broken( {\n"
+        return reply
+
+
+def test_only_failing_files_are_coded_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "RETRIEVAL_ENABLED", False)
+    llm = BrokenOnce(n_steps=6, file_size=256, broken="src/mod_1.js")
+    agent = graph.compile_agent(llm, max_workers=2, model="fake")
+
+    state = asyncio.run(agent.ainvoke(
+        {"user_prompt": "validation test", "project_root": str(tmp_path), "use_cache": False},
+        {"recursion_limit": 100},
+    ))
+
+    assert state["status"] == "DONE"
+    assert state["validation"] == {}
+    assert state["validation_rounds"] == 1
+    steps = state["coder_state"].task_plan.implementation_steps
+    assert len(steps) == 7
+    assert steps[-1].filepath == "src/mod_1.js"
+    assert len(llm.fix_prompts) == 1
+    assert not (tmp_path / "src" / "mod_1.js").read_text().startswith("function broken")